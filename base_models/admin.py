@@ -1,7 +1,10 @@
 from django.contrib import admin
 
 from core.admin import AvailableModelAdmin, ReadOnlyAdmin
-from .models import Event, AnyItem, BulkItem, SingleItem
+from .models import (
+    Event, AnyItem, BulkItem, SingleItem, DailyYieldRollup, HourlyMachineRollup, SpcChart, SpcViolation,
+    WorkOrderProgress,
+)
 
 
 class EventAdmin(ReadOnlyAdmin):
@@ -43,8 +46,44 @@ class BulkItemAdmin(AvailableModelAdmin):
 
 
 class SingleItemAdmin(AvailableModelAdmin):
-    list_display = ["uid", "sku"]
+    list_display = ["uid", "sku", "manufacture_date"]
     search_fields = ["sku__code", "uid__code"]
+    list_filter = ["uid__manufacture_date"]
+
+    def manufacture_date(self, obj):
+        return obj.uid.manufacture_date
+    manufacture_date.admin_order_field = "uid__manufacture_date"
+
+
+class HourlyMachineRollupAdmin(ReadOnlyAdmin):
+    list_display = ["hour", "machine", "operator", "events_started", "events_completed", "events_failed",
+                    "logged_in_seconds"]
+    list_filter = ["production_step"]
+
+
+class DailyYieldRollupAdmin(ReadOnlyAdmin):
+    list_display = ["day", "sku", "work_order", "production_step", "items", "first_pass_passed", "first_pass_failed",
+                    "final_passed", "retests"]
+    list_filter = ["production_step"]
+    search_fields = ["sku__code", "work_order__code"]
+
+
+class SpcChartAdmin(ReadOnlyAdmin):
+    list_display = ["machine", "sku", "metric", "observations", "ewma", "date_updated"]
+    list_filter = ["metric"]
+    search_fields = ["machine__hostname", "machine__name", "sku__code"]
+
+
+class SpcViolationAdmin(ReadOnlyAdmin):
+    list_display = ["date_created", "chart", "rule", "event", "value", "lower_limit", "upper_limit"]
+    list_filter = ["rule", "chart__metric"]
+    search_fields = ["chart__machine__hostname", "chart__machine__name", "chart__sku__code"]
+
+
+class WorkOrderProgressAdmin(ReadOnlyAdmin):
+    list_display = ["work_order", "sku", "production_step", "started", "passed", "failed", "pending", "date_updated"]
+    list_filter = ["production_step"]
+    search_fields = ["work_order__code", "sku__code"]
 
 
 class ConfigurationAdmin(AvailableModelAdmin):
@@ -56,3 +95,8 @@ admin.site.register(Event, EventAdmin)
 admin.site.register(AnyItem, AnyItemAdmin)
 admin.site.register(BulkItem, BulkItemAdmin)
 admin.site.register(SingleItem, SingleItemAdmin)
+admin.site.register(HourlyMachineRollup, HourlyMachineRollupAdmin)
+admin.site.register(DailyYieldRollup, DailyYieldRollupAdmin)
+admin.site.register(SpcChart, SpcChartAdmin)
+admin.site.register(SpcViolation, SpcViolationAdmin)
+admin.site.register(WorkOrderProgress, WorkOrderProgressAdmin)
@@ -1,11 +1,132 @@
-from django.db.models import Q
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q, prefetch_related_objects
+from django.http import HttpResponse
 from rest_framework import status
 from rest_framework.exceptions import ValidationError
 from rest_framework.generics import CreateAPIView, ListAPIView
+from rest_framework.relations import PrimaryKeyRelatedField
 from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.models import IdempotencyKey
+from core.utils import get_or_create_on_conflict, has_unique_constraint, lock_lookups
+from ..polymorphic_bulk_create import polymorphic_bulk_create
+
 
+class AsyncAPIViewMixin:
+    """
+    Serve a DRF view as an async Django view. Intended for the small endpoints that rigs call all the time - pings,
+    configuration lookups, and starting and finishing events.
+
+    Under ASGI (see web_interface/asgi.py), the view is called straight from the event loop rather than being queued
+    for a thread like a sync view would be. DRF and the ORM are synchronous, so the view's actual work is still done
+    with sync_to_async, but in this request's own thread - so it never waits behind a slow view elsewhere.
+    Under WSGI, and in tests, it behaves just like the sync view.
 
-class GetOrCreateView(CreateAPIView):
+    Heavy views (CSV exports and the like) should stay synchronous.
+    """
+    @classmethod
+    def as_view(cls, **initkwargs):
+        sync_view = super().as_view(**initkwargs)
+
+        def render_view(request, *args, **kwargs):
+            # Render the response in the same trip to the thread, rather than leaving Django to make another.
+            response = sync_view(request, *args, **kwargs)
+            if hasattr(response, "render"):
+                response.render()
+            return response
+
+        # wraps() copies across the attributes DRF and Django look for on views, like `cls` and `csrf_exempt`.
+        @wraps(sync_view)
+        async def view(request, *args, **kwargs):
+            return await sync_to_async(render_view)(request, *args, **kwargs)
+
+        return view
+
+
+class _IdempotentReplay(Exception):
+    """Raised by IdempotentViewMixin.initial() to skip straight to a stored response."""
+    def __init__(self, response):
+        self.response = response
+
+
+class IdempotentViewMixin:
+    """
+    Let API clients safely retry POST, PUT and PATCH requests, by sending an `Idempotency-Key` header - any unique
+    string, like a UUID - with each request.
+
+    The first request with a given key is processed as normal, and its response is stored in an IdempotencyKey,
+    in the same transaction as anything else the request saves. If the key is sent again, the stored response is
+    returned without the request being validated or run; it carries an `Idempotent-Replayed` header. A retry that
+    arrives while the original is still being processed waits for it to finish.
+
+    Server errors aren't stored, and everything the request did is rolled back, so the request can be retried.
+    Requests without the header behave as normal.
+    """
+    idempotent_methods = ["POST", "PUT", "PATCH"]
+
+    def dispatch(self, request, *args, **kwargs):
+        self.idempotency_key = None
+        if request.method not in self.idempotent_methods or "Idempotency-Key" not in request.headers:
+            return super().dispatch(request, *args, **kwargs)
+
+        with transaction.atomic():
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        # Authenticate and check permissions first, so that stored responses only go back to whoever made them.
+        super().initial(request, *args, **kwargs)
+
+        key = request.headers.get("Idempotency-Key")
+        if request.method not in self.idempotent_methods or key is None:
+            return
+        if not key or len(key) > IdempotencyKey._meta.get_field("key").max_length:
+            raise ValidationError({"Idempotency-Key": "Must be between 1 and 255 characters long."})
+
+        user = request.user if request.user.is_authenticated else None
+        stored, created = get_or_create_on_conflict(IdempotencyKey, {"key": key}, defaults={
+            "user": user,
+            "method": request.method,
+            "path": request.path,
+        })
+        if created:
+            self.idempotency_key = stored
+            return
+
+        if (stored.user_id, stored.method, stored.path) != (getattr(user, "pk", None), request.method, request.path):
+            raise ValidationError({"Idempotency-Key": "This key has already been used for a different request."})
+
+        response = HttpResponse(stored.content, status=stored.status_code, content_type=stored.content_type)
+        response["Idempotent-Replayed"] = "true"
+        raise _IdempotentReplay(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, _IdempotentReplay):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+
+        if self.idempotency_key is not None:
+            if response.status_code >= 500:
+                transaction.set_rollback(True)
+            else:
+                if hasattr(response, "render"):
+                    response.render()
+                self.idempotency_key.status_code = response.status_code
+                self.idempotency_key.content_type = response.get("Content-Type", "")
+                self.idempotency_key.content = response.content
+                self.idempotency_key.save(update_fields=["status_code", "content_type", "content"])
+
+        return response
+
+
+class GetOrCreateView(IdempotentViewMixin, CreateAPIView):
     """
     Similar to CreateAPIView, but retrieves an object that matches the identity fields of the input if possible.
 
@@ -20,33 +141,41 @@ class GetOrCreateView(CreateAPIView):
 
     def create(self, request, *args, **kwargs):
         """Implement the get-or-create functionality."""
+        response_serializer, created = self.get_or_create(request.data)
+
+        headers = self.get_success_headers(response_serializer.data)
+        status_code = status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        return Response(response_serializer.data, status_code, headers=headers)
+
+    def get_or_create(self, data):
+        """
+        Get or create an object from the given data, and return a tuple of (serializer, created), where the serializer
+        holds the full object. Raises a ValidationError if the data is invalid.
+        """
         serializers = self.model.generate_get_or_create_serializers(*self.identity_fields, exclude=self.exclude)
         context = self.get_serializer_context()
 
         # Use the `identity` serializer to parse the lookup fields.
-        id_serializer = serializers["identity"](data=request.data, context=context)
+        id_serializer = serializers["identity"](data=data, context=context)
         id_serializer.is_valid(raise_exception=True)
 
         # The `defaults` serializer parses the rest - these will be passed to a new object being created.
-        data_serializer = serializers["defaults"](data=request.data, context=context)
+        data_serializer = serializers["defaults"](data=data, context=context)
         data_serializer.is_valid(raise_exception=True)
 
-        # Use the normal Django get_or_create to perform the operation.
-        # Any failures are raised as ValidationErrors.
+        # Perform the operation with a single INSERT ... ON CONFLICT where possible, so that two rigs scanning the
+        # same code at once both get the same object back. Any failures are raised as ValidationErrors.
         try:
-            obj, created = self.model.objects.get_or_create(
-                **id_serializer.validated_data,
+            obj, created = get_or_create_on_conflict(
+                self.model,
+                id_serializer.validated_data,
                 defaults=data_serializer.validated_data
             )
         except Exception as e:
             raise ValidationError(str(e))
 
         # Use the `result` serializer to return the full data back to the requester.
-        response_serializer = serializers["result"](obj, context=context)
-
-        headers = self.get_success_headers(response_serializer.data)
-        status_code = status.HTTP_201_CREATED if created else status.HTTP_200_OK
-        return Response(response_serializer.data, status_code, headers=headers)
+        return serializers["result"](obj, context=context), created
 
     def get_queryset(self):
         """
@@ -134,3 +263,280 @@ class SearchView(ListAPIView):
         results = list(results)[:length_cutoff]
 
         return results
+
+
+class BatchPrimaryKeyRelatedField(PrimaryKeyRelatedField):
+    """
+    A PrimaryKeyRelatedField that checks the objects prefetched by a BatchView before querying the database.
+    Use it by setting `serializer_related_field = BatchPrimaryKeyRelatedField` on a ModelSerializer.
+    """
+    def to_internal_value(self, data):
+        prefetched = self.context.get("related_objects", {}).get(self.field_name, {})
+        if str(data) in prefetched:
+            return prefetched[str(data)]
+        return super().to_internal_value(data)
+
+
+class BatchView(IdempotentViewMixin, APIView):
+    """
+    Accepts a POST request containing a list of objects, and validates and saves them all together.
+
+    Each object is validated on its own, using `serializer_class`. The valid ones are passed to save_batch() in a
+    single transaction, which subclasses implement to write them in bulk. The response is a list of results in the
+    same order as the input: the output of get_result() for each saved object, or `{"errors": ...}` for each
+    invalid one. Invalid objects don't stop the valid ones from being saved.
+
+    To avoid querying the database separately for every ForeignKey of every object, the related objects referred
+    to across the whole batch are fetched up front. For that to work, `serializer_class` needs to use
+    BatchPrimaryKeyRelatedField.
+
+    Set `model` when updating existing objects: each object in the list must then include the `pk` of the
+    instance to update, and the instances are all fetched in one query.
+    """
+    serializer_class = None
+    model = None
+    success_status = status.HTTP_200_OK
+
+    def post(self, request, *args, **kwargs):
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response({"error": "Expected a list of objects."}, status=400)
+        if len(rows) > settings.MAX_BATCH_SIZE:
+            return Response({"error": F"A batch can contain at most {settings.MAX_BATCH_SIZE} objects."}, status=400)
+
+        context = {
+            "request": request,
+            "view": self,
+            "related_objects": self.prefetch_related_objects(rows),
+        }
+        instances = self.get_instances(rows)
+
+        results = [None] * len(rows)
+        valid = []
+        for i, row in enumerate(rows):
+            if not isinstance(row, dict):
+                results[i] = {"errors": {"non_field_errors": ["Expected an object."]}}
+                continue
+
+            if self.model is not None:
+                instance = instances.get(str(row.get("pk")))
+                if instance is None:
+                    results[i] = {"errors": {"pk": ["No object with this primary key."]}}
+                    continue
+                serializer = self.serializer_class(instance, data=row, context=context)
+            else:
+                serializer = self.serializer_class(data=row, context=context)
+
+            if serializer.is_valid():
+                valid.append((i, serializer))
+            else:
+                results[i] = {"errors": serializer.errors}
+
+        with transaction.atomic():
+            saved = self.save_batch([serializer for _, serializer in valid])
+
+        for (i, serializer), obj in zip(valid, saved):
+            results[i] = self.get_result(obj, serializer)
+
+        return Response(results, status=self.success_status)
+
+
+    def prefetch_related_objects(self, rows):
+        """
+        Fetch every object referred to by the batch's ForeignKey fields, with one query per field.
+        Return a dictionary of {field_name: {str(pk): object}}.
+        """
+        related_objects = {}
+
+        for name, field in self.serializer_class().fields.items():
+            if not isinstance(field, PrimaryKeyRelatedField) or field.read_only:
+                continue
+
+            values = {str(row[name]) for row in rows if isinstance(row, dict) and row.get(name) is not None}
+            try:
+                objects = field.get_queryset().in_bulk(values)
+            except (TypeError, ValueError):
+                # Malformed keys; leave the serializer to report them, one object at a time.
+                objects = {}
+            related_objects[name] = {str(pk): obj for pk, obj in objects.items()}
+
+        return related_objects
+
+
+    def get_instances(self, rows):
+        """When updating, fetch all of the instances referred to by the batch. Return a dictionary of {str(pk): obj}."""
+        if self.model is None:
+            return {}
+
+        pks = [row["pk"] for row in rows if isinstance(row, dict) and isinstance(row.get("pk"), (int, str))]
+        try:
+            instances = self.model.objects.in_bulk(pks)
+        except (TypeError, ValueError):
+            instances = self.model.objects.in_bulk([pk for pk in pks if str(pk).isdigit()])
+        return {str(pk): obj for pk, obj in instances.items()}
+
+
+    def save_batch(self, serializers):
+        """Save the objects from a list of validated serializers, and return them in the same order."""
+        raise NotImplementedError
+
+
+    def get_result(self, obj, serializer):
+        """Return the result reported for a saved object."""
+        serializer.instance = obj
+        return serializer.data
+
+
+class BulkGetOrCreateView(IdempotentViewMixin, APIView):
+    """
+    The list version of GetOrCreateView: accepts a POST request containing a list of objects, and looks up or
+    creates one model instance for each.
+
+    Requires a `model` and its `identity_fields`, all of which must be ForeignKeys (or OneToOneFields). Each object
+    in the list gives the primary key of each identity field. The whole batch is resolved with a few queries:
+      * The related objects are fetched with one query per identity field (see get_related_objects()). The fields
+        are handled in order, and objects that fail on one field aren't passed on to the next, so list any field
+        whose related objects are created on the fly last.
+      * Existing instances are fetched in one query. If no unique constraint covers the identity fields, the keys are
+        locked first (see core.utils.lock_lookups()), so concurrent requests can't both create the same instance.
+      * The missing ones are created with a single bulk insert per table. If that clashes with a row another request
+        has just created, they're created one at a time instead, and any that still clash are reported as errors.
+
+    Other fields in the incoming objects are ignored. The response is a list in the same order as the input,
+    containing the serialized instance for each object, or `{"errors": ...}` if it couldn't be looked up or created.
+    Objects that appear more than once in the list return the same instance.
+    """
+    model = None
+    identity_fields = []
+
+    def post(self, request, *args, **kwargs):
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response({"error": "Expected a list of objects."}, status=400)
+        if len(rows) > settings.MAX_BATCH_SIZE:
+            return Response({"error": F"A batch can contain at most {settings.MAX_BATCH_SIZE} objects."}, status=400)
+
+        results = [None] * len(rows)
+        keys = {}
+        for i, row in enumerate(rows):
+            errors = {
+                name: ["This field is required."]
+                for name in self.identity_fields
+                if not isinstance(row, dict) or not isinstance(row.get(name), (str, int))
+            }
+            if errors:
+                results[i] = {"errors": errors}
+            else:
+                keys[i] = tuple(str(row[name]) for name in self.identity_fields)
+
+        with transaction.atomic():
+            instances, key_errors = self.get_or_create_batch(set(keys.values()))
+
+        # Re-read the instances through get_queryset(), if it's been overridden to add annotations.
+        queryset = self.get_queryset()
+        if queryset is not None:
+            fetched = queryset.in_bulk([obj.pk for obj in instances.values()])
+            instances = {key: fetched[obj.pk] for key, obj in instances.items()}
+
+        # Fetch any ManyToMany fields the serializer will include for every instance at once.
+        prefetch_related_objects(list(instances.values()), *[f.name for f in self.model._meta.many_to_many])
+
+        serializer_class = self.model.generate_serializer_class()
+        context = {"request": request, "view": self}
+        serialized = {key: serializer_class(obj, context=context).data for key, obj in instances.items()}
+
+        for i, key in keys.items():
+            results[i] = serialized[key] if key in serialized else {"errors": key_errors[key]}
+
+        return Response(results)
+
+
+    def get_queryset(self):
+        """
+        Return a queryset that the final instances are re-read from before they're serialized, or None to skip this.
+        Override this to annotate the instances with values their serializer needs, in a single query.
+        """
+        return None
+
+
+    def get_related_objects(self, field_name, values):
+        """
+        Return a dictionary of {str(pk): object} for the given primary keys of the model related by `field_name`,
+        and a dictionary of {str(pk): error message} for any that can't be used. Override this to create related
+        objects that don't exist yet.
+        """
+        related_model = self.model._meta.get_field(field_name).related_model
+        found = {str(pk): obj for pk, obj in related_model.objects.in_bulk(values).items()}
+        errors = {value: F"Invalid pk \"{value}\" - object does not exist." for value in values if value not in found}
+        return found, errors
+
+
+    def get_or_create_batch(self, keys):
+        """
+        Look up or create an instance for each key (a tuple of identity field primary keys).
+        Return a dictionary of {key: instance}, and a dictionary of {key: errors} for the keys that failed.
+        """
+        errors = {}
+
+        # Fetch the related objects, and throw out any keys that refer to missing ones as we go.
+        related = {}
+        for position, name in enumerate(self.identity_fields):
+            related[name], related_errors = self.get_related_objects(name, {key[position] for key in keys})
+            for key in keys:
+                if key[position] in related_errors:
+                    errors[key] = {name: [related_errors[key[position]]]}
+            keys = {key for key in keys if key not in errors}
+
+        def get_lookup(key):
+            return {name: related[name][key[position]] for position, name in enumerate(self.identity_fields)}
+
+        # With no unique constraint to stop two requests creating the same instance at once (e.g. BulkItem's work
+        # order and SKU), lock the keys first, the same way get_or_create_on_conflict() does.
+        if not has_unique_constraint(self.model, self.identity_fields):
+            lock_lookups(self.model, [get_lookup(key) for key in keys])
+
+        # Fetch the instances that already exist. Filtering on each field separately can return a few extra rows,
+        # so match them up against the keys exactly.
+        attnames = [self.model._meta.get_field(name).attname for name in self.identity_fields]
+        existing = self.model.objects.filter(**{
+            F"{attname}__in": {key[position] for key in keys} for position, attname in enumerate(attnames)
+        })
+        instances = {}
+        for obj in existing:
+            key = tuple(str(getattr(obj, attname)) for attname in attnames)
+            if key in keys:
+                instances[key] = obj
+
+        missing = keys - set(instances)
+
+        # A field that's unique on its own, like a SingleItem's UID, can't be reused by a new instance.
+        for position, name in enumerate(self.identity_fields):
+            field = self.model._meta.get_field(name)
+            if not field.unique or not missing:
+                continue
+
+            taken = {
+                str(value)
+                for value in self.model.objects.filter(**{
+                    F"{field.attname}__in": {key[position] for key in missing}
+                }).values_list(field.attname, flat=True)
+            }
+            for key in [key for key in missing if key[position] in taken]:
+                errors[key] = {name: [F"{self.model._meta.verbose_name} with this {name} already exists."]}
+                missing.discard(key)
+
+        new_instances = {key: self.model(**get_lookup(key)) for key in missing}
+        try:
+            polymorphic_bulk_create(self.model, list(new_instances.values()))
+        except IntegrityError:
+            # Another request created a clashing row since the checks above, such as an item with the same UID.
+            # The bulk insert has been rolled back, so go through the keys one at a time instead.
+            new_instances = {}
+            for key in missing:
+                try:
+                    new_instances[key], _ = get_or_create_on_conflict(self.model, get_lookup(key))
+                except IntegrityError as e:
+                    errors[key] = {"non_field_errors": [str(e)]}
+        instances.update(new_instances)
+
+        return instances, errors
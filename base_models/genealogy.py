@@ -0,0 +1,125 @@
+from collections import deque
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+
+from .models import AnyItem, Event, SingleItem
+
+
+def get_genealogy_sql(direction):
+    """
+    Return a recursive CTE that walks the assembly graph from a list of item IDs, either "down" to their components or
+    "up" to the items they're part of. Its parameters are the list of IDs and the most rows to return. It returns
+    one (parent_id, child_id, relation) row per edge it finds.
+
+    There are two kinds of edge, both from an assembly (the parent) to something it was made from (the child):
+      * contains - A SingleItem's `contains`.
+      * from_bulk - A SingleItem's `from_bulk`.
+
+    Each step looks up the next edges with a LATERAL subquery, so only the edges of the items reached so far are
+    read, through the indexes on the join table and `from_bulk`. UNION (rather than UNION ALL) drops edges that have
+    already been found, so shared components are only walked once, and the walk ends even if the graph has a cycle.
+    """
+    contains = SingleItem.contains.through._meta
+    single = SingleItem._meta
+    pk_column = single.pk.column
+    from_bulk_column = single.get_field("from_bulk").column
+    parent_column = contains.get_field("singleitem").column
+    child_column = contains.get_field("anyitem").column
+
+    if direction == "down":
+        # From an item to its components.
+        match_contains, match_from_bulk, next_id = F"c.{parent_column}", F"s.{pk_column}", "child_id"
+    else:
+        # From a component to the items it's part of.
+        match_contains, match_from_bulk, next_id = F"c.{child_column}", F"s.{from_bulk_column}", "parent_id"
+
+    def edges_from(item_id):
+        return F"""
+            SELECT c.{parent_column} AS parent_id, c.{child_column} AS child_id, 'contains'::text AS relation
+            FROM {contains.db_table} c WHERE {match_contains} = {item_id}
+            UNION ALL
+            SELECT s.{pk_column}, s.{from_bulk_column}, 'from_bulk'::text
+            FROM {single.db_table} s WHERE {match_from_bulk} = {item_id} AND s.{from_bulk_column} IS NOT NULL
+        """
+
+    return F"""
+        WITH RECURSIVE genealogy(parent_id, child_id, relation) AS (
+            SELECT edge.* FROM unnest(%s::bigint[]) AS start(id) CROSS JOIN LATERAL ({edges_from("start.id")}) edge
+            UNION
+            SELECT edge.* FROM genealogy g CROSS JOIN LATERAL ({edges_from(F"g.{next_id}")}) edge
+        )
+        SELECT parent_id, child_id, relation FROM genealogy LIMIT %s
+    """
+
+
+def get_genealogy(item_ids, direction):
+    """
+    Walk the assembly graph from the given items, "down" through their components or "up" through everything they're
+    part of, and return a dict of:
+      * nodes - A list with one dict per item reached (including the starting items), each with the item's `pk`,
+        `sku`, `uid` (for SingleItems) or `work_order` (for BulkItems), its `depth` (the fewest steps from a
+        starting item) and an `events` summary, as from Event.summarise_events().
+      * edges - A list of {parent, child, relation} dicts.
+      * truncated - Whether the graph had more than settings.MAX_GENEALOGY_EDGES edges, in which case only that many
+        were followed.
+
+    However deep the graph, this takes three queries: the recursive walk, the items' details, and their Events.
+    """
+    item_ids = list(item_ids)
+    with connection.cursor() as cursor:
+        cursor.execute(get_genealogy_sql(direction), [item_ids, settings.MAX_GENEALOGY_EDGES + 1])
+        rows = cursor.fetchall()
+
+    truncated = len(rows) > settings.MAX_GENEALOGY_EDGES
+    edges = [
+        {"parent": parent, "child": child, "relation": relation}
+        for parent, child, relation in rows[:settings.MAX_GENEALOGY_EDGES]
+    ]
+
+    # Work out each item's depth from the edges, breadth first.
+    neighbours = {}
+    for edge in edges:
+        source, target = (edge["parent"], edge["child"]) if direction == "down" else (edge["child"], edge["parent"])
+        neighbours.setdefault(source, []).append(target)
+    depths = dict.fromkeys(item_ids, 0)
+    queue = deque(item_ids)
+    while queue:
+        item_id = queue.popleft()
+        for neighbour in neighbours.get(item_id, []):
+            if neighbour not in depths:
+                depths[neighbour] = depths[item_id] + 1
+                queue.append(neighbour)
+
+    items = AnyItem.objects.non_polymorphic().filter(pk__in=depths)
+    details = {
+        row["pk"]: row
+        for row in items.order_by().values("pk", "sku", uid=F("singleitem__uid"), work_order=F("bulkitem__work_order"))
+    }
+    summaries = Event.summarise_events(items)
+
+    nodes = []
+    for item_id, depth in sorted(depths.items(), key=lambda pair: (pair[1], pair[0])):
+        if item_id not in details:
+            continue
+        nodes.append({**details[item_id], "depth": depth, "events": summaries.get(item_id)})
+
+    return {"nodes": nodes, "edges": edges, "truncated": truncated}
+
+
+def get_components(item_id):
+    """Return the bill of materials of an item - everything it was made from, all the way down. See get_genealogy()."""
+    return get_genealogy([item_id], "down")
+
+
+def get_where_used(item_ids):
+    """
+    Return everything that the given items are part of, all the way up, as from get_genealogy(). Each node also gets
+    a `finished` flag, set for items that aren't part of anything else themselves - the finished products to recall.
+    """
+    genealogy = get_genealogy(item_ids, "up")
+    has_parents = {edge["child"] for edge in genealogy["edges"]}
+    for node in genealogy["nodes"]:
+        node["finished"] = node["pk"] not in has_parents and node["depth"] > 0
+    return genealogy
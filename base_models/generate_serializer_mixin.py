@@ -1,7 +1,46 @@
 from copy import copy
+from functools import wraps
 
+from django.contrib.postgres.fields import ArrayField
 from rest_framework import serializers, validators
 
+from core.msgpack_api import PackedListField
+
+
+# Generated serializer classes, keyed on the model, the generating method and its arguments.
+_serializer_cache = {}
+
+
+def _freeze(value):
+    """Convert lists and tuples of field names (at any depth) into tuples, so that they can be used as a cache key."""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def memoize_serializer(method):
+    """
+    Decorate a serializer-generating classmethod so that it only builds its result once per model and set of
+    arguments. Later calls return the same class (or dictionary of classes), which also means DRF only has to set
+    up each class once.
+
+    The returned classes are shared, so callers should subclass them rather than modifying them in place.
+    Apply this underneath @classmethod.
+    """
+    @wraps(method)
+    def wrapper(cls, *args, **kwargs):
+        key = (cls, method.__qualname__, _freeze(args), tuple(sorted((k, _freeze(v)) for k, v in kwargs.items())))
+        if key not in _serializer_cache:
+            _serializer_cache[key] = method(cls, *args, **kwargs)
+        return _serializer_cache[key]
+
+    return wrapper
+
+
+def clear_serializer_cache():
+    """Forget every memoized serializer class. Only really useful in tests and benchmarks."""
+    _serializer_cache.clear()
+
 
 class GenerateSerializerMixin:
     """
@@ -9,14 +48,21 @@ class GenerateSerializerMixin:
 
     This is designed to work with ApiFactory and other class methods, dramatically reducing the amount of boilerplate
     required to set up basic views for a production operation.
+
+    The generated serializers are memoized (see memoize_serializer), because GetOrCreateView asks for them on every
+    request. Subclasses that override these methods should decorate their overrides in the same way.
     """
     @classmethod
+    @memoize_serializer
     def generate_serializer_class(cls, *, fields="__all__", exclude=None):
         """
         Return a standard serializer for this model.
         Optionally, limit the fields used, by passing `fields` or `exclude` as kwargs. The latter takes precedence.
         """
         class BasicSerializer(serializers.ModelSerializer):
+            # Validate log arrays that arrived packed (see core.msgpack_api) in one go.
+            serializer_field_mapping = {**serializers.ModelSerializer.serializer_field_mapping, ArrayField: PackedListField}
+
             class Meta:
                 model = cls
 
@@ -29,6 +75,7 @@ class GenerateSerializerMixin:
 
 
     @classmethod
+    @memoize_serializer
     def generate_non_unique_serializer(cls, *fields):
         """
         Return a serializer class with all uniqueness and unique_together validation disabled.
@@ -62,6 +109,7 @@ class GenerateSerializerMixin:
 
 
     @classmethod
+    @memoize_serializer
     def generate_get_or_create_serializers(cls, *identity_fields, exclude=[]):
         """
         Return *three* serializer classes suitable for use in a GetOrCreateView.
@@ -0,0 +1,39 @@
+from timeit import timeit
+
+from django.core.management.base import BaseCommand
+
+from base_models.generate_serializer_mixin import clear_serializer_cache
+from core.models import UniqueID
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the serializer work done by a single GetOrCreateView request, with and without memoized serializer "
+        "classes. Doesn't touch the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=2000, help="How many requests to simulate.")
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        data = {"code": "123456789"}
+
+        def request():
+            # The same steps GetOrCreateView.create() takes before it queries the database.
+            serializers = UniqueID.generate_get_or_create_serializers("code", exclude=[])
+            serializers["identity"](data=data).is_valid(raise_exception=True)
+            serializers["defaults"](data=data).is_valid(raise_exception=True)
+
+        def uncached_request():
+            clear_serializer_cache()
+            request()
+
+        results = [
+            ("Rebuilt every request", timeit(uncached_request, number=iterations)),
+            ("Memoized", timeit(request, number=iterations)),
+        ]
+        for name, seconds in results:
+            self.stdout.write(F"{name}: {seconds / iterations * 1e6:.0f}us per request")
+
+        self.stdout.write(F"Speedup: {results[0][1] / results[1][1]:.1f}x")
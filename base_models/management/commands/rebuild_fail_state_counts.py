@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from base_models.models import FailStateCount
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the FailStateCount catalogue from the Events themselves. Only needed if it has drifted - for instance "
+        "after the Event table has been truncated or restored with its triggers disabled."
+    )
+
+    def handle(self, *args, **options):
+        rows = FailStateCount.rebuild()
+        self.stdout.write(F"Counted {rows} fail states")
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from base_models.models import WorkOrderProgress
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount WorkOrderProgress from the Events themselves, and correct any counts that have drifted - for "
+        "instance after Events have been edited in the admin. Intended to be run regularly by a scheduler."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "work_orders", nargs="*", metavar="work_order",
+            help="The codes of the work orders to reconcile. Reconciles every work order if none are given.",
+        )
+
+    def handle(self, *args, **options):
+        corrected = WorkOrderProgress.rebuild(options["work_orders"] or None)
+        for work_order, sku, production_step in corrected:
+            self.stdout.write(F"Corrected {production_step} of {sku} for {work_order}")
+        self.stdout.write(F"Corrected {len(corrected)} work order progress counts")
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from base_models.models import DailyYieldRollup, HourlyMachineRollup
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold any new or changed Events and MachineUsage sessions into the precomputed rollup tables. "
+        "Intended to be run regularly by a scheduler."
+    )
+
+    rollup_classes = [
+        HourlyMachineRollup,
+        DailyYieldRollup,
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full", action="store_true",
+            help="Rebuild every period, rather than just those with changes. Needed after source rows are deleted.",
+        )
+
+    def handle(self, *args, **options):
+        for rollup_class in self.rollup_classes:
+            updated = rollup_class.update_incrementally(full=options["full"])
+            self.stdout.write(F"{rollup_class.__name__}: rebuilt {updated} periods")
@@ -0,0 +1,44 @@
+# Generated by Django 3.2.12 on 2026-10-19 02:37
+
+import core.utils
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_machineusage_date_updated'),
+        ('base_models', '0011_alter_configuration_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('value', models.DateTimeField(default=core.utils.get_past_date)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HourlyMachineRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('production_step', models.CharField(choices=[('Mid-assembly QC', 'Assembly Qc'), ('Curing', 'Curing'), ('Cutting', 'Cutting'), ('Dry assembly', 'Dry Assembly'), ('End-of-line QC', 'Eol Qc'), ('Goods-In QC', 'Goods In Qc'), ('Greasing', 'Greasing'), ('Heater assembly', 'Heater Assembly'), ('Hot tightening', 'Hot Tightening'), ('Inspection', 'Inspection'), ('Packing', 'Packing'), ('Potting', 'Potting'), ('Pressing', 'Pressing'), ('Unique ID setting', 'Uid Setting')], max_length=255)),
+                ('hour', models.DateTimeField(db_index=True)),
+                ('events_started', models.PositiveIntegerField(default=0)),
+                ('events_completed', models.PositiveIntegerField(default=0)),
+                ('events_failed', models.PositiveIntegerField(default=0)),
+                ('logged_in_seconds', models.FloatField(default=0)),
+                ('machine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_rollups', to='core.machine')),
+                ('operator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_rollups', to='core.operator')),
+            ],
+            options={
+                'ordering': ['-hour', 'machine'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='hourlymachinerollup',
+            index=models.Index(fields=['machine', 'hour'], name='base_models_machine_684c1d_idx'),
+        ),
+    ]
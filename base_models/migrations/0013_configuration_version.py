@@ -0,0 +1,25 @@
+# Generated by Django 3.2.12 on 2026-10-19 02:59
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_models', '0012_hourly_machine_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='configuration',
+            name='date_updated',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='configuration',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
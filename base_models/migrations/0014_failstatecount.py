@@ -0,0 +1,106 @@
+# Generated by Django 3.2.12 on 2026-10-19 03:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Keep FailStateCount up to date with one upsert per statement (rather than one per row), using the transition tables
+# of the rows that each statement inserted, updated or deleted. Updates that don't change a fail state (finishing an
+# Event, adding log results, ...) aren't counted at all. Rows are upserted in key order, so that concurrent
+# transactions lock them in the same order.
+CREATE_TRIGGERS = """
+CREATE FUNCTION base_models_count_fail_states() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO base_models_failstatecount AS counts (polymorphic_ctype_id, fail_state, count)
+        SELECT polymorphic_ctype_id, fail_state, COUNT(*) FROM new_rows
+        WHERE polymorphic_ctype_id IS NOT NULL
+        GROUP BY polymorphic_ctype_id, fail_state
+        ORDER BY polymorphic_ctype_id, fail_state
+        ON CONFLICT (polymorphic_ctype_id, fail_state) DO UPDATE SET count = counts.count + EXCLUDED.count;
+
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO base_models_failstatecount AS counts (polymorphic_ctype_id, fail_state, count)
+        SELECT polymorphic_ctype_id, fail_state, -COUNT(*) FROM old_rows
+        WHERE polymorphic_ctype_id IS NOT NULL
+        GROUP BY polymorphic_ctype_id, fail_state
+        ORDER BY polymorphic_ctype_id, fail_state
+        ON CONFLICT (polymorphic_ctype_id, fail_state) DO UPDATE SET count = counts.count + EXCLUDED.count;
+
+    ELSE
+        WITH changed AS (
+            SELECT
+                old_rows.polymorphic_ctype_id AS old_ctype_id, old_rows.fail_state AS old_fail_state,
+                new_rows.polymorphic_ctype_id AS new_ctype_id, new_rows.fail_state AS new_fail_state
+            FROM old_rows JOIN new_rows USING (id)
+            WHERE (old_rows.polymorphic_ctype_id, old_rows.fail_state)
+                IS DISTINCT FROM (new_rows.polymorphic_ctype_id, new_rows.fail_state)
+        )
+        INSERT INTO base_models_failstatecount AS counts (polymorphic_ctype_id, fail_state, count)
+        SELECT polymorphic_ctype_id, fail_state, SUM(change) FROM (
+            SELECT old_ctype_id, old_fail_state, -1 FROM changed
+            UNION ALL
+            SELECT new_ctype_id, new_fail_state, 1 FROM changed
+        ) AS changes (polymorphic_ctype_id, fail_state, change)
+        WHERE polymorphic_ctype_id IS NOT NULL
+        GROUP BY polymorphic_ctype_id, fail_state
+        HAVING SUM(change) <> 0
+        ORDER BY polymorphic_ctype_id, fail_state
+        ON CONFLICT (polymorphic_ctype_id, fail_state) DO UPDATE SET count = counts.count + EXCLUDED.count;
+    END IF;
+
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER base_models_event_count_inserted_fail_states
+AFTER INSERT ON base_models_event REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION base_models_count_fail_states();
+
+CREATE TRIGGER base_models_event_count_updated_fail_states
+AFTER UPDATE ON base_models_event REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION base_models_count_fail_states();
+
+CREATE TRIGGER base_models_event_count_deleted_fail_states
+AFTER DELETE ON base_models_event REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION base_models_count_fail_states();
+
+INSERT INTO base_models_failstatecount (polymorphic_ctype_id, fail_state, count)
+SELECT polymorphic_ctype_id, fail_state, COUNT(*) FROM base_models_event
+WHERE polymorphic_ctype_id IS NOT NULL
+GROUP BY polymorphic_ctype_id, fail_state;
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER base_models_event_count_inserted_fail_states ON base_models_event;
+DROP TRIGGER base_models_event_count_updated_fail_states ON base_models_event;
+DROP TRIGGER base_models_event_count_deleted_fail_states ON base_models_event;
+DROP FUNCTION base_models_count_fail_states();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('base_models', '0013_configuration_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FailStateCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fail_state', models.CharField(max_length=255)),
+                ('count', models.BigIntegerField(default=0)),
+                ('polymorphic_ctype', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='failstatecount',
+            constraint=models.UniqueConstraint(fields=('polymorphic_ctype', 'fail_state'), name='unique_fail_state_count'),
+        ),
+        # Creating the triggers locks the Event table until the migration commits, so the initial counts can't miss
+        # or double-count any Events written in the meantime.
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+    ]
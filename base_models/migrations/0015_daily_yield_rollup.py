@@ -0,0 +1,42 @@
+# Generated by Django 3.2.12 on 2026-10-19 03:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_idempotencykey'),
+        ('base_models', '0014_failstatecount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyYieldRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('production_step', models.CharField(choices=[('Mid-assembly QC', 'Assembly Qc'), ('Curing', 'Curing'), ('Cutting', 'Cutting'), ('Dry assembly', 'Dry Assembly'), ('End-of-line QC', 'Eol Qc'), ('Goods-In QC', 'Goods In Qc'), ('Greasing', 'Greasing'), ('Heater assembly', 'Heater Assembly'), ('Hot tightening', 'Hot Tightening'), ('Inspection', 'Inspection'), ('Packing', 'Packing'), ('Potting', 'Potting'), ('Pressing', 'Pressing'), ('Unique ID setting', 'Uid Setting')], max_length=255)),
+                ('day', models.DateField(db_index=True)),
+                ('items', models.PositiveIntegerField(default=0)),
+                ('first_pass_passed', models.PositiveIntegerField(default=0)),
+                ('first_pass_failed', models.PositiveIntegerField(default=0)),
+                ('final_passed', models.PositiveIntegerField(default=0)),
+                ('retests', models.PositiveIntegerField(default=0)),
+                ('fail_states', models.JSONField(default=dict)),
+                ('sku', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_yield_rollups', to='core.sku')),
+                ('work_order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_yield_rollups', to='core.workorder')),
+            ],
+            options={
+                'ordering': ['-day', 'sku', 'work_order'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='dailyyieldrollup',
+            index=models.Index(fields=['sku', 'day'], name='base_models_sku_id_234687_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyyieldrollup',
+            index=models.Index(fields=['work_order', 'day'], name='base_models_work_or_9d7238_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.12 on 2026-10-19 03:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_models', '0015_daily_yield_rollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['date_created'], name='base_models_date_cr_e5af41_idx'),
+        ),
+    ]
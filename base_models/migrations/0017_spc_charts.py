@@ -0,0 +1,57 @@
+# Generated by Django 3.2.12 on 2026-10-19 03:34
+
+import datetime
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_idempotencykey'),
+        ('base_models', '0016_event_date_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpcChart',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(max_length=255)),
+                ('pending', django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), default=list, size=None)),
+                ('means', django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), default=list, size=None)),
+                ('ranges', django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), default=list, size=None)),
+                ('ewma', models.FloatField(null=True)),
+                ('observations', models.PositiveIntegerField(default=0)),
+                ('date_updated', models.DateTimeField(auto_now=True)),
+                ('machine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='spc_charts', to='core.machine')),
+                ('sku', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='spc_charts', to='core.sku')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SpcViolation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rule', models.CharField(choices=[('beyond_3_sigma', 'One subgroup mean beyond 3σ'), ('two_of_three_beyond_2_sigma', 'Two of three subgroup means beyond 2σ'), ('four_of_five_beyond_1_sigma', 'Four of five subgroup means beyond 1σ'), ('eight_on_one_side', 'Eight subgroup means on one side of the centre line'), ('range_above_limit', "Subgroup range above the R chart's upper limit"), ('ewma_beyond_limits', 'EWMA beyond its control limits')], max_length=255)),
+                ('value', models.FloatField()),
+                ('centre_line', models.FloatField()),
+                ('lower_limit', models.FloatField()),
+                ('upper_limit', models.FloatField()),
+                ('date_created', models.DateTimeField(default=datetime.datetime.now)),
+                ('chart', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='violations', to='base_models.spcchart')),
+                ('event', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='spc_violations', to='base_models.event')),
+            ],
+            options={
+                'ordering': ['-date_created'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='spcchart',
+            constraint=models.UniqueConstraint(fields=('machine', 'sku', 'metric'), name='unique_spc_chart'),
+        ),
+        migrations.AddConstraint(
+            model_name='spcchart',
+            constraint=models.UniqueConstraint(condition=models.Q(('sku', None)), fields=('machine', 'metric'), name='unique_spc_chart_without_sku'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.12 on 2026-10-19 03:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_idempotencykey'),
+        ('base_models', '0017_spc_charts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkOrderProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('production_step', models.CharField(choices=[('Mid-assembly QC', 'Assembly Qc'), ('Curing', 'Curing'), ('Cutting', 'Cutting'), ('Dry assembly', 'Dry Assembly'), ('End-of-line QC', 'Eol Qc'), ('Goods-In QC', 'Goods In Qc'), ('Greasing', 'Greasing'), ('Heater assembly', 'Heater Assembly'), ('Hot tightening', 'Hot Tightening'), ('Inspection', 'Inspection'), ('Packing', 'Packing'), ('Potting', 'Potting'), ('Pressing', 'Pressing'), ('Unique ID setting', 'Uid Setting')], max_length=255)),
+                ('started', models.IntegerField(default=0)),
+                ('passed', models.IntegerField(default=0)),
+                ('failed', models.IntegerField(default=0)),
+                ('pending', models.IntegerField(default=0)),
+                ('date_updated', models.DateTimeField(auto_now=True)),
+                ('sku', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='work_order_progress', to='core.sku')),
+                ('work_order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress', to='core.workorder')),
+            ],
+            options={
+                'ordering': ['work_order', 'sku', 'production_step'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='workorderprogress',
+            constraint=models.UniqueConstraint(fields=('work_order', 'sku', 'production_step'), name='unique_work_order_progress'),
+        ),
+    ]
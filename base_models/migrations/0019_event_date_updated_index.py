@@ -0,0 +1,17 @@
+# Generated by Django 3.2.12 on 2026-10-19 04:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_models', '0018_work_order_progress'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['date_updated'], name='base_models_date_up_187e59_idx'),
+        ),
+    ]
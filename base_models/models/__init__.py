@@ -1,3 +1,7 @@
 from .configuration import Configuration
 from .event import Event
+from .fail_state import FailStateCount
 from .item import AnyItem, BulkItem, SingleItem
+from .progress import WorkOrderProgress
+from .rollup import DailyYieldRollup, HourlyMachineRollup, RollupWatermark
+from .spc import SpcChart, SpcRule, SpcViolation
@@ -1,14 +1,19 @@
 from django import forms
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 from django.db.models import Q
 from django.http import Http404
 from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from polymorphic.models import PolymorphicModel
 from rest_framework.authentication import SessionAuthentication, TokenAuthentication
 from rest_framework.generics import RetrieveAPIView, get_object_or_404
 from rest_framework.response import Response
 
 from base_models.base_view_classes.ajax import AjaxCreateFormView, AjaxUpdateFormView
+from base_models.base_view_classes.api import AsyncAPIViewMixin
 from base_models.non_polymorphic_cascade import NON_POLYMORPHIC_CASCADE
 from base_models.generate_serializer_mixin import GenerateSerializerMixin
 from base_models.unique_together_mixin import UniqueTogetherMixin
@@ -33,12 +38,17 @@ class Configuration(UniqueTogetherMixin, GenerateSerializerMixin, PolymorphicMod
       * production_step_field - The operation these settings apply to. This is an uneditable field, set to mirror
         cls._production_step during __init__().
       * sku - The SKU these settings apply to.
+      * version, date_updated - Bumped every time the configuration is saved. Used to cache the lookup view's
+        responses, and to let rigs skip downloading a configuration they already have (see generate_lookup_view()).
     """
     _production_step = None  # Override this in subclasses
 
     production_step_field = models.CharField(max_length=255, choices=PRODUCTION_STEPS.choices, editable=False)
     sku = models.ForeignKey(Sku, related_name="configurations", on_delete=NON_POLYMORPHIC_CASCADE)
 
+    version = models.PositiveIntegerField(default=1, editable=False)
+    date_updated = models.DateTimeField(auto_now=True)
+
     _unique_together = (
         ("production_step_field", "sku"),
     )
@@ -61,16 +71,95 @@ class Configuration(UniqueTogetherMixin, GenerateSerializerMixin, PolymorphicMod
             )
             self.production_step_field = self._production_step
 
+    def save(self, *args, **kwargs):
+        """Bump the version on every save, and throw away any cached lookup response."""
+        if not self._state.adding:
+            self.version = models.F("version") + 1
+
+        super().save(*args, **kwargs)
+
+        if isinstance(self.version, models.expressions.Combinable):
+            self.refresh_from_db(fields=["version"])
+        cache.delete(self.get_cache_key(self.sku_id))
+
+    def delete(self, *args, **kwargs):
+        cache.delete(self.get_cache_key(self.sku_id))
+        return super().delete(*args, **kwargs)
+
+
+    @classmethod
+    def get_cache_key(cls, sku):
+        """Return the key that the lookup view's response for the given SKU is cached under."""
+        return F"configuration:{cls._meta.label_lower}:{sku}"
+
+
+    @classmethod
+    def get_current_version(cls, sku):
+        """
+        Return the `pk`, `version`, `date_updated` and `etag` of the given SKU's configuration, or None if it doesn't
+        have one. This is a single query on the base Configuration table.
+        """
+        current = Configuration.objects.non_polymorphic().filter(
+            sku=sku,
+            production_step_field=cls._production_step,
+        ).values("pk", "version", "date_updated").first()
+
+        if current is not None:
+            current["etag"] = F'"{current["pk"]}-{current["version"]}"'
+        return current
+
+
+    @classmethod
+    def get_cached_data(cls, sku, current):
+        """
+        Return the serialized configuration for the given SKU, whose current version is given by
+        get_current_version(). It's only serialized if the cached copy is missing or out of date.
+        """
+        cache_key = cls.get_cache_key(sku)
+        cached = cache.get(cache_key)
+        if cached is None or cached["etag"] != current["etag"]:
+            instance = cls.objects.get(pk=current["pk"])
+            cached = {"etag": current["etag"], "data": cls.generate_serializer_class()(instance).data}
+            cache.set(cache_key, cached, settings.CONFIGURATION_CACHE_TIMEOUT)
+
+        return cached["data"]
+
 
     @classmethod
     def generate_lookup_view(cls):
-        class Get(RetrieveAPIView):
+        """
+        Return a view that retrieves the configuration for a given SKU. Rigs call this at the start of every cycle,
+        but configurations rarely change, so:
+          * The serialized configuration is cached, and only rebuilt when its pk or `version` changes. Checking
+            those is a single query on the base Configuration table.
+          * Responses carry an ETag and Last-Modified header. A rig that sends them back in If-None-Match or
+            If-Modified-Since gets an empty 304 response if the configuration hasn't changed.
+        """
+        class Get(AsyncAPIViewMixin, RetrieveAPIView):
             # This endpoint is used by both the label generator and the production API.
             authentication_classes = [SessionAuthentication, TokenAuthentication]
 
             queryset = cls.objects.all()
             serializer_class = cls.generate_serializer_class()
 
+            def retrieve(self, request, *args, **kwargs):
+                current = cls.get_current_version(self.kwargs["sku"])
+                if current is None:
+                    raise Http404
+
+                etag = current["etag"]
+                last_modified = int(current["date_updated"].timestamp())
+
+                not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+                if not_modified is not None:
+                    response = not_modified
+                else:
+                    response = Response(cls.get_cached_data(self.kwargs["sku"], current))
+
+                response["ETag"] = etag
+                response["Last-Modified"] = http_date(last_modified)
+                return response
+
             def get_object(self):
                 queryset = self.filter_queryset(self.get_queryset())
 
@@ -1,21 +1,32 @@
 import pandas as pd
 from datetime import datetime
 
+from django.contrib.contenttypes.models import ContentType
 from django.contrib.postgres.fields import ArrayField
 from django.core.validators import MinValueValidator
-from django.db import models, IntegrityError
+from django.db import models, IntegrityError, transaction
+from django.db.models import Count, Q
 from django import forms
 from django.forms import model_to_dict
 from polymorphic.models import PolymorphicModel
+from rest_framework import status
 from rest_framework.authentication import SessionAuthentication
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import DateTimeField
 from rest_framework.generics import CreateAPIView, UpdateAPIView, RetrieveAPIView
 from rest_framework.response import Response as RestFrameworkResponse
+from rest_framework.views import APIView
 
 from core.models import Machine, Operator, WorkOrder, MachineUsage
 from core.utils import readable_field_name
+from .fail_state import FailStateCount
 from .item import AnyItem
+from .progress import WorkOrderProgress
+from .spc import SpcChart
+from ..base_view_classes.api import AsyncAPIViewMixin, BatchPrimaryKeyRelatedField, BatchView, IdempotentViewMixin
 from ..generate_serializer_mixin import GenerateSerializerMixin
 from ..non_polymorphic_cascade import NON_POLYMORPHIC_CASCADE
+from ..polymorphic_bulk_create import polymorphic_bulk_create
 
 
 
@@ -47,6 +58,10 @@ class Event(GenerateSerializerMixin, PolymorphicModel):
 
     When subclassing Event and adding logging result fields, set _log_fields to a list of all log result fields,
     excluding log_timepoints.
+
+    Scalar results can be tracked on SPC control charts (see models/spc.py), per machine and SKU, as each Event is
+    completed. List them in _spc_metrics, which subclasses can extend. The start and finish views likewise keep
+    WorkOrderProgress up to date as Events are started and completed.
     """
     item = models.ForeignKey(AnyItem, related_name="events", on_delete=NON_POLYMORPHIC_CASCADE)
 
@@ -76,17 +91,44 @@ class Event(GenerateSerializerMixin, PolymorphicModel):
     # This needs to be set (manually) in order for logs to be processed correctly.
     _log_fields = []
 
+    # The scalar results tracked on SPC charts, as {metric name: attribute name}. The attribute can be a field or
+    # a method; either way, its value should be a number, or None if the Event has no value for that metric.
+    _spc_metrics = {"duration": "get_duration"}
+
     class Meta:
         ordering = ["-date_created"]
+        indexes = [
+            models.Index(fields=["date_created"]),
+            models.Index(fields=["date_updated"]),
+        ]
 
     def __str__(self):
         return F"{self.machine.production_step} of {self.item} as part of {self.work_order}, {self.date_created}"
 
     def save(self, *args, **kwargs):
+        self.update_fail_state()
+        return super().save(*args, **kwargs)
+
+    def update_fail_state(self):
+        """A failed Event with no fail state recorded has failed for an unknown reason."""
         if self.failed is True:
             if self.fail_state == "None":
                 self.fail_state = "Unknown"
-        return super().save(*args, **kwargs)
+
+    def get_duration(self):
+        """Return how long the Event took in seconds, from its creation to when it was last saved."""
+        return (self.date_updated - self.date_created).total_seconds()
+
+    def get_spc_metrics(self):
+        """Return a dict of {metric name: value} for each of this Event's SPC metrics that has a value."""
+        metrics = {}
+        for metric, attribute in self._spc_metrics.items():
+            value = getattr(self, attribute)
+            if callable(value):
+                value = value()
+            if value is not None:
+                metrics[metric] = float(value)
+        return metrics
 
     def get_log_results(self):
         """
@@ -250,17 +292,103 @@ class Event(GenerateSerializerMixin, PolymorphicModel):
 
         return df
 
+    @classmethod
+    def get_polymorphic_ctype_ids(cls):
+        """Return the IDs of the content types of this class and all its subclasses."""
+        models_to_count = [cls]
+        for model in models_to_count:
+            models_to_count.extend(model.__subclasses__())
+        ctypes = ContentType.objects.get_for_models(*models_to_count, for_concrete_models=False)
+        return [ctype.pk for ctype in ctypes.values()]
+
+    @classmethod
+    def get_fail_state_counts(cls):
+        """
+        Return a dict of {fail state: number of Events} for this class (and its subclasses), most common first.
+        Read from the FailStateCount catalogue, rather than the Events themselves.
+        """
+        return FailStateCount.get_counts(cls.get_polymorphic_ctype_ids())
+
     @classmethod
     def get_fail_states(cls):
-        values = set(cls.objects.values_list('fail_state', flat=True))
+        values = sorted(cls.get_fail_state_counts())
         return zip(values, values)
 
+    @classmethod
+    def summarise_events(cls, items, production_step=None, key="pk"):
+        """
+        Count the Events of this class on each of a queryset of items - in total, and broken down by completion,
+        failure and fail state - all in a single query. Rigs use these counts to enforce retest limits.
+
+        Returns a dictionary of summaries, keyed on the given field of each item:
+
+        {
+            events: ..., completed: ..., incompleted: ..., passed: ..., failed: ...,
+            fail_state: {fail_state: number of events, ...},
+        }
+
+        Optionally, only count Events on machines from the given production step.
+        """
+        # Count through the items' `events` relation, so that items without any Events still get a row.
+        events = Q()
+        if cls is not Event:
+            events &= Q(events__polymorphic_ctype__in=cls.get_polymorphic_ctype_ids())
+        if production_step is not None:
+            events &= Q(events__machine__production_step=production_step)
+
+        rows = items.order_by().values(key, "events__fail_state").annotate(
+            events_count=Count("events", filter=events),
+            completed=Count("events", filter=events & Q(events__completed=True)),
+            passed=Count("events", filter=events & Q(events__completed=True, events__failed=False)),
+            failed=Count("events", filter=events & Q(events__failed=True)),
+        )
+
+        summaries = {}
+        for row in rows:
+            summary = summaries.setdefault(row[key], {
+                "events": 0, "completed": 0, "incompleted": 0, "passed": 0, "failed": 0, "fail_state": {},
+            })
+            if not row["events_count"]:
+                continue
+
+            summary["events"] += row["events_count"]
+            summary["completed"] += row["completed"]
+            summary["incompleted"] += row["events_count"] - row["completed"]
+            summary["passed"] += row["passed"]
+            summary["failed"] += row["failed"]
+            summary["fail_state"][row["events__fail_state"]] = row["events_count"]
+
+        return summaries
+
+    @staticmethod
+    def lock_for_update(events):
+        """
+        Lock the rows of a list of Events until the end of the current transaction, and refresh their `completed` and
+        `failed` flags from the locked rows. Returns a dict of {pk: (completed, failed)}, as they were before the
+        update.
+
+        Finishing an Event depends on whether it was already completed, so the views read that with the row locked.
+        If a rig re-sends a finish while the first one is still running, the second waits, and then sees the Event
+        as already completed. The rows are locked in pk order, so that overlapping batches can't deadlock.
+        """
+        rows = (
+            Event.objects.non_polymorphic().select_for_update()
+            .filter(pk__in=[event.pk for event in events])
+            .order_by("pk")
+            .values_list("pk", "completed", "failed")
+        )
+        previous = {pk: (completed, failed) for pk, completed, failed in rows}
+        for event in events:
+            event.completed, event.failed = previous[event.pk]
+        return previous
+
+
     @classmethod
     def generate_start_view(cls):
         """
         Return a view that instantiates an Event with information on when and how it occurred.
         """
-        class Create(CreateAPIView):
+        class Create(AsyncAPIViewMixin, IdempotentViewMixin, CreateAPIView):
             queryset = cls.objects.all()
             serializer_class = cls.generate_serializer_class(
                 fields=["pk", "item", "machine", "operator", "work_order"]
@@ -272,29 +400,187 @@ class Event(GenerateSerializerMixin, PolymorphicModel):
                 operator = Operator.objects.filter(code=operator_id).first()
 
                 # track machine usage
-                last_login = MachineUsage.objects.filter(machine=machine).first()
-                if last_login is None:
-                    MachineUsage.log_in(machine, operator)
-                else:
-                    last_login.ping(operator)
-                return super().perform_create(serializer)
+                MachineUsage.ping_machine(machine, operator)
+                with transaction.atomic():
+                    super().perform_create(serializer)
+                    WorkOrderProgress.record_events([serializer.instance])
 
         return Create
 
     @classmethod
     def generate_finish_view(cls):
         """
-        Return a view that allows an Event to be filled in with completion data.
+        Return a view that allows an Event to be filled in with completion data. When this completes the Event,
+        its SPC metrics are recorded too (see SpcChart).
         """
-        class Update(UpdateAPIView):
+        class Update(AsyncAPIViewMixin, IdempotentViewMixin, UpdateAPIView):
             lookup_url_kwarg = "pk"
             queryset = cls.objects.all()
             serializer_class = cls.generate_serializer_class(
                 exclude=["item", "machine", "operator", "work_order"]
             )
 
+            def perform_update(self, serializer):
+                event = serializer.instance
+                with transaction.atomic():
+                    previous = Event.lock_for_update([event])
+                    super().perform_update(serializer)
+                    # Only count each Event on the SPC charts once, when it's first completed.
+                    if event.completed and not previous[event.pk][0]:
+                        SpcChart.record_events([event])
+                    WorkOrderProgress.record_events([event], previous)
+
         return Update
 
+    @classmethod
+    def generate_batch_start_view(cls):
+        """
+        Return a view that starts a list of Events in one request - for multi-station rigs, or rigs uploading
+        a backlog of work recorded while offline. See BatchView for the format of the response.
+
+        Accepts the same fields as the start view, plus an optional `date_created` for Events that were started
+        earlier. The Events are inserted in bulk, and each machine's usage is updated once per batch, using the
+        operator of its last Event.
+        """
+        Base = cls.generate_serializer_class(fields=["pk", "item", "machine", "operator", "work_order", "date_created"])
+
+        class BatchSerializer(Base):
+            serializer_related_field = BatchPrimaryKeyRelatedField
+            date_created = DateTimeField(required=False)
+
+        class BatchStart(BatchView):
+            serializer_class = BatchSerializer
+            success_status = status.HTTP_201_CREATED
+
+            def save_batch(self, serializers):
+                events = [cls(**serializer.validated_data) for serializer in serializers]
+                for event in events:
+                    event.update_fail_state()
+                polymorphic_bulk_create(cls, events)
+                WorkOrderProgress.record_events(events)
+
+                last_operators = {event.machine_id: event.operator for event in events}
+                for machine, operator in last_operators.items():
+                    MachineUsage.ping_machine(machine, operator)
+
+                return events
+
+        return BatchStart
+
+    @classmethod
+    def generate_batch_finish_view(cls):
+        """
+        Return a view that fills in the completion data of a list of Events in one request. Each object in the list
+        needs the `pk` of its Event, alongside the same fields as the finish view. All of the Events are updated
+        with a single query per table, and the SPC metrics of the newly-completed ones are recorded together. Successful
+        results only contain the Event's `pk`, to keep the response short.
+        """
+        Base = cls.generate_serializer_class(exclude=["item", "machine", "operator", "work_order"])
+
+        class BatchSerializer(Base):
+            serializer_related_field = BatchPrimaryKeyRelatedField
+
+        class BatchFinish(BatchView):
+            serializer_class = BatchSerializer
+            model = cls
+
+            def save_batch(self, serializers):
+                events = []
+                newly_completed = []
+                fields = {"fail_state", "date_updated"}
+                now = datetime.now()
+
+                previous = Event.lock_for_update([serializer.instance for serializer in serializers])
+                for serializer in serializers:
+                    event = serializer.instance
+                    for field, value in serializer.validated_data.items():
+                        setattr(event, field, value)
+                    event.update_fail_state()
+                    event.date_updated = now
+
+                    events.append(event)
+                    fields.update(serializer.validated_data)
+                    if event.completed and not previous[event.pk][0]:
+                        newly_completed.append(event)
+
+                cls.objects.bulk_update(events, sorted(fields))
+                SpcChart.record_events(newly_completed)
+                WorkOrderProgress.record_events(events, previous)
+                return events
+
+            def get_result(self, obj, serializer):
+                return {"pk": obj.pk}
+
+        return BatchFinish
+
+    @classmethod
+    def generate_begin_view(cls, item_class, configuration_class=None):
+        """
+        Return a view that does everything a rig needs at the start of a cycle in one request, rather than calling
+        the work order, item, configuration and start views in turn.
+
+        Accepts the item's identity fields (as for the item lookup view, e.g. `uid` and `sku`) along with the
+        `work_order`, `machine` and `operator`. In a single transaction, it gets or creates the work order and
+        the item, looks up the item's configuration (if a configuration_class is given), and starts an Event.
+        Returns the Event's `pk` alongside the full `item` and `configuration`.
+
+        If any step fails, nothing is saved, and the errors are returned under the name of the step.
+        """
+        # Imported here to avoid a circular import, since core.views.api depends on the base view classes.
+        from core.views.api import GetOrCreateWorkOrder
+
+        start_serializer_class = cls.generate_serializer_class(
+            fields=["pk", "item", "machine", "operator", "work_order"]
+        )
+
+        class Begin(AsyncAPIViewMixin, IdempotentViewMixin, APIView):
+            def post(self, request, *args, **kwargs):
+                with transaction.atomic():
+                    work_order = self.get_or_create(
+                        "work_order", GetOrCreateWorkOrder, {"code": request.data.get("work_order")}
+                    ).instance
+                    item_serializer = self.get_or_create("item", item_class.generate_lookup_view(), request.data)
+                    item = item_serializer.instance
+
+                    configuration = None
+                    if configuration_class is not None:
+                        current = configuration_class.get_current_version(item.sku_id)
+                        if current is None:
+                            raise ValidationError(
+                                {"configuration": F"SKU {item.sku_id} has no {configuration_class.__name__}."}
+                            )
+                        configuration = configuration_class.get_cached_data(item.sku_id, current)
+
+                    serializer = start_serializer_class(data={
+                        "item": item.pk,
+                        "machine": request.data.get("machine"),
+                        "operator": request.data.get("operator"),
+                        "work_order": work_order.pk,
+                    })
+                    if not serializer.is_valid():
+                        raise ValidationError({"event": serializer.errors})
+
+                    MachineUsage.ping_machine(serializer.validated_data["machine"], serializer.validated_data["operator"])
+                    event = serializer.save()
+                    WorkOrderProgress.record_events([event])
+
+                return RestFrameworkResponse({
+                    "pk": event.pk,
+                    "item": item_serializer.data,
+                    "configuration": configuration,
+                }, status=status.HTTP_201_CREATED)
+
+            def get_or_create(self, step, view_class, data):
+                """Run one of the GetOrCreateViews on the data, and return the serializer holding the result."""
+                view = view_class(request=self.request, format_kwarg=self.format_kwarg, args=(), kwargs={})
+                try:
+                    serializer, _ = view.get_or_create(data)
+                except ValidationError as e:
+                    raise ValidationError({step: e.detail})
+                return serializer
+
+        return Begin
+
     @classmethod
     def generate_retrieve_view(cls):
         """
@@ -334,6 +620,18 @@ class Event(GenerateSerializerMixin, PolymorphicModel):
 
         return Search
 
+    @classmethod
+    def generate_cube_view(cls, _project_name):
+        """Return an AJAX view that counts Events grouped by a chosen set of dimensions, for charts."""
+        from base_models.views.event_cube_view import EventCubeView
+
+        class Cube(EventCubeView):
+            queryset = cls.objects.all()
+            form_class = cls.generate_search_form()
+            project_name = _project_name
+
+        return Cube
+
     @classmethod
     def generate_log_lookup_view(cls):
         class Logs(RetrieveAPIView):
@@ -0,0 +1,67 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, models, transaction
+from django.db.models import Count, Sum
+
+
+class FailStateCount(models.Model):
+    """
+    A catalogue of the fail states recorded against each Event class, with how many Events currently have each one.
+
+    This saves scanning the whole Event table whenever the list of fail states is needed (search forms, Pareto charts
+    and the like). It's kept up to date by statement-level triggers on the Event table - see migration
+    0014_failstatecount - so every way of writing Events is counted: save(), bulk_create(), bulk_update(), and
+    queryset updates and deletes alike. TRUNCATE doesn't fire the triggers; use rebuild() after one.
+
+    Rows aren't removed when their count drops to zero.
+    """
+    polymorphic_ctype = models.ForeignKey(ContentType, related_name="+", on_delete=models.CASCADE)
+    fail_state = models.CharField(max_length=255)
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["polymorphic_ctype", "fail_state"], name="unique_fail_state_count"),
+        ]
+
+    def __str__(self):
+        return F"{self.fail_state} ({self.polymorphic_ctype}): {self.count}"
+
+
+    @classmethod
+    def get_counts(cls, ctype_ids):
+        """
+        Return a dict of {fail state: number of Events} across the Event classes with the given content type IDs,
+        ordered from most to least common.
+        """
+        rows = (
+            cls.objects.filter(polymorphic_ctype__in=ctype_ids, count__gt=0)
+            .values("fail_state")
+            .annotate(total=Sum("count"))
+            .order_by("-total", "fail_state")
+        )
+        return {row["fail_state"]: row["total"] for row in rows}
+
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Recount every fail state from scratch, and return the number of catalogue rows.
+
+        Event writes are blocked until the surrounding transaction ends, so that none are missed or counted twice.
+        """
+        from .event import Event
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(F"LOCK TABLE {Event._meta.db_table} IN SHARE MODE")
+            cls.objects.all().delete()
+            cls.objects.bulk_create(
+                cls(polymorphic_ctype_id=row["polymorphic_ctype"], fail_state=row["fail_state"], count=row["count"])
+                for row in (
+                    Event.objects.non_polymorphic()
+                    .exclude(polymorphic_ctype=None)
+                    .order_by()
+                    .values("polymorphic_ctype", "fail_state")
+                    .annotate(count=Count("id"))
+                )
+            )
+            return cls.objects.count()
@@ -1,13 +1,16 @@
 from django.db import models
+from django.db.models import Count, JSONField, Q
+from django.db.models.expressions import RawSQL
 from polymorphic.models import PolymorphicModel
 from rest_framework.fields import SerializerMethodField
 from rest_framework.generics import UpdateAPIView
 
 from base_models.non_polymorphic_cascade import NON_POLYMORPHIC_CASCADE
-from base_models.base_view_classes.api import GetOrCreateView
-from base_models.generate_serializer_mixin import GenerateSerializerMixin
+from base_models.base_view_classes.api import BulkGetOrCreateView, GetOrCreateView, IdempotentViewMixin
+from base_models.generate_serializer_mixin import GenerateSerializerMixin, memoize_serializer
 from base_models.unique_together_mixin import UniqueTogetherMixin
 from core.models import Sku, UniqueID, WorkOrder
+from core.uid_schemas import UID_SCHEMAS
 
 
 class AnyItem(GenerateSerializerMixin, PolymorphicModel):
@@ -46,6 +49,11 @@ class AnyItem(GenerateSerializerMixin, PolymorphicModel):
         """Return an API view that can edit this item."""
         raise NotImplementedError
 
+    @classmethod
+    def generate_bulk_lookup_view(cls):
+        """Return an API view that can look up a list of these items at once, creating any that don't exist."""
+        raise NotImplementedError
+
 
 
 class BulkItem(UniqueTogetherMixin, AnyItem):
@@ -72,16 +80,60 @@ class BulkItem(UniqueTogetherMixin, AnyItem):
 
 
     @classmethod
+    def annotate_event_counts(cls, queryset, fail_states=False):
+        """
+        Annotate a queryset of BulkItems with `quantity_succeeded`: the number of their Events that have completed
+        without failing. This is counted in the same query as the items themselves.
+
+        If `fail_states` is True, also annotate `fail_state_counts`: a dictionary of how many of their Events have
+        failed with each fail state. This is a subquery in the same statement, so it doesn't cost another query.
+        """
+        queryset = queryset.annotate(
+            quantity_succeeded=Count("events", filter=Q(events__failed=False, events__completed=True)),
+        )
+
+        if fail_states:
+            event_meta = cls._meta.get_field("events").related_model._meta
+            queryset = queryset.annotate(fail_state_counts=RawSQL(
+                F"""
+                SELECT COALESCE(jsonb_object_agg(fail_state, total), '{{}}')
+                FROM (
+                    SELECT fail_state, COUNT(*) AS total FROM {event_meta.db_table}
+                    WHERE item_id = {AnyItem._meta.db_table}.{AnyItem._meta.pk.column} AND failed
+                    GROUP BY fail_state
+                ) AS fail_state_totals
+                """,
+                [],
+                output_field=JSONField(),
+            ))
+
+        return queryset
+
+
+    @classmethod
+    @memoize_serializer
     def generate_serializer_class(cls, *, fields="__all__", exclude=None):
-        """When looking up BulkItems, include a value counting how many have already been successfully processed."""
+        """
+        When looking up BulkItems, include a value counting how many have already been successfully processed.
+        This is read from the annotation added by annotate_event_counts() if it's there, or counted separately if
+        not. A `fail_state_counts` annotation is included in the output too, but only when present.
+        """
         BaseClass = super().generate_serializer_class(fields=fields, exclude=exclude)
 
         class BasicSerializer(BaseClass):
             quantity_succeeded = SerializerMethodField()
 
             def get_quantity_succeeded(self, obj):
+                if hasattr(obj, "quantity_succeeded"):
+                    return obj.quantity_succeeded
                 return obj.events.filter(failed=False, completed=True).count()
 
+            def to_representation(self, instance):
+                data = super().to_representation(instance)
+                if hasattr(instance, "fail_state_counts"):
+                    data["fail_state_counts"] = instance.fail_state_counts
+                return data
+
         return BasicSerializer
 
 
@@ -98,12 +150,29 @@ class BulkItem(UniqueTogetherMixin, AnyItem):
         return GetOrCreate
 
 
+    @classmethod
+    def generate_bulk_lookup_view(cls):
+        """
+        Return a view that accepts a POST request with a list of objects, each with a `work_order` and a `sku`,
+        and returns a list of BulkItems. See BulkGetOrCreateView.
+        """
+        class BulkGetOrCreate(BulkGetOrCreateView):
+            model = cls
+            identity_fields = ["work_order", "sku"]
+
+            def get_queryset(self):
+                fail_states = self.request.query_params.get("fail_states", "") in ["1", "true"]
+                return cls.annotate_event_counts(cls.objects.all(), fail_states=fail_states)
+
+        return BulkGetOrCreate
+
+
     @classmethod
     def generate_update_view(cls):
         """Return a basic PUT view that can be used to update an item."""
-        class Update(UpdateAPIView):
+        class Update(IdempotentViewMixin, UpdateAPIView):
             lookup_url_kwarg = "pk"
-            queryset = cls.objects.all()
+            queryset = cls.annotate_event_counts(cls.objects.all())
             serializer_class = cls.generate_serializer_class(exclude=["work_order", "sku"])
 
         return Update
@@ -158,6 +227,41 @@ class SingleItem(AnyItem):
         return GetOrCreate
 
 
+    @classmethod
+    def generate_bulk_lookup_view(cls):
+        """
+        Return a view that accepts a POST request with a list of objects, each with a `uid` and a `sku`, and returns
+        a list of SingleItems. See BulkGetOrCreateView.
+
+        Unlike the single lookup view, UIDs don't need to exist beforehand: any that are missing are created, as long
+        as they match a UID schema. This lets a rig load a whole tray of parts in one request.
+        """
+        class BulkGetOrCreate(BulkGetOrCreateView):
+            model = cls
+            # UIDs go last, so they're only created for items that are otherwise valid.
+            identity_fields = ["sku", "uid"]
+
+            def get_related_objects(self, field_name, values):
+                if field_name != "uid":
+                    return super().get_related_objects(field_name, values)
+
+                found = UniqueID.objects.in_bulk(values)
+                schemas = UID_SCHEMAS.classify([code for code in values if code not in found])
+                errors = {
+                    code: F"UID code {code} doesn't match any known schema."
+                    for code, matched in schemas.items() if not matched
+                }
+
+                new_codes = [code for code, matched in schemas.items() if matched]
+                if new_codes:
+                    UniqueID.bulk_create_codes(new_codes)
+                    found.update(UniqueID.objects.in_bulk(new_codes))
+
+                return found, errors
+
+        return BulkGetOrCreate
+
+
     @classmethod
     def generate_update_view(cls):
         """
@@ -166,7 +270,7 @@ class SingleItem(AnyItem):
         making it unsuitable for a GetOrCreate operation. We also expect items to mostly be created and then assembled
         together later.
         """
-        class Update(UpdateAPIView):
+        class Update(IdempotentViewMixin, UpdateAPIView):
             lookup_url_kwarg = "pk"
             queryset = cls.objects.all()
             serializer_class = cls.generate_serializer_class(exclude=["uid", "sku"])
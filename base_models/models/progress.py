@@ -0,0 +1,259 @@
+from collections import defaultdict
+from datetime import datetime
+
+from django.db import connection, models, transaction
+from django.db.models import Count, F, Q
+from psycopg2.extras import execute_values
+
+from core.models import Sku, WorkOrder
+from core.production_steps import PRODUCTION_STEPS
+from core.utils import advisory_xact_lock
+
+
+class WorkOrderProgress(models.Model):
+    """
+    Running counts of how far each work order's items have got through each production step, per SKU.
+
+    Each item that has any Events at a production step under a work order is counted in `started`, and in exactly
+    one of:
+      * passed - At least one of its Events there was completed without failing.
+      * failed - All of its completed Events there failed.
+      * pending - None of its Events there have been completed yet.
+
+    Reading a work order's progress is then a matter of reading one row per SKU and step, however many Events there
+    are. The counts are kept up to date by record_events(), which the Event start and finish views call whenever
+    they save Events. Events written any other way (the admin, the shell, data migrations) aren't counted until
+    rebuild() is run - see the `reconcile_work_order_progress` management command.
+
+    The production step is the step of the Event's machine.
+
+    Updates and rebuilds are kept apart with advisory locks (see get_lock_key()). record_events() takes an exclusive
+    lock on each item, so concurrent updates to one item see each other's Events, and a shared lock on each work
+    order. rebuild() takes an exclusive lock on one work order at a time, so it only waits for, and holds up,
+    updates to that work order.
+    """
+    work_order = models.ForeignKey(WorkOrder, related_name="progress", on_delete=models.CASCADE)
+    sku = models.ForeignKey(Sku, related_name="work_order_progress", on_delete=models.CASCADE)
+    production_step = models.CharField(max_length=255, choices=PRODUCTION_STEPS.choices)
+
+    started = models.IntegerField(default=0)
+    passed = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    pending = models.IntegerField(default=0)
+    date_updated = models.DateTimeField(auto_now=True)
+
+    count_fields = ["started", "passed", "failed", "pending"]
+
+    class Meta:
+        ordering = ["work_order", "sku", "production_step"]
+        constraints = [
+            models.UniqueConstraint(fields=["work_order", "sku", "production_step"], name="unique_work_order_progress"),
+        ]
+
+    def __str__(self):
+        return F"{self.production_step} of {self.sku} for {self.work_order}: {self.passed}/{self.started} passed"
+
+
+    @staticmethod
+    def get_status(events):
+        """
+        Return an item's status at a step (see the class docstring) from a list of (completed, failed) pairs for
+        its Events there, or None if it has no Events.
+        """
+        if not events:
+            return None
+        if any(completed and not failed for completed, failed in events):
+            return "passed"
+        if any(completed for completed, _ in events):
+            return "failed"
+        return "pending"
+
+
+    @classmethod
+    def get_event_rows(cls, events):
+        """
+        Return the values needed to work out progress for a queryset of Events, with one row per Event.
+        The rows are keyed on the same names as the model's fields.
+        """
+        return (
+            events.non_polymorphic().order_by()
+            .values("pk", "item", "completed", "failed", "work_order")
+            .annotate(sku=F("item__sku"), production_step=F("machine__production_step"))
+        )
+
+
+    @classmethod
+    def get_lock_key(cls, kind, pk):
+        """Return the advisory lock key for a work order or an item (`kind`) with the given primary key."""
+        return F"{cls._meta.db_table}:{kind}:{pk}"
+
+
+    @classmethod
+    def record_events(cls, events, previous=None):
+        """
+        Update the counts for a list of Events that have just been saved. `previous` is a dict of
+        {pk: (completed, failed)} for the Events as they were before; Events missing from it have just been created.
+        The Events' items' other Events are looked up in a single query, to tell how the change moved each item from
+        one status to another.
+
+        This has to be called inside the transaction that saves the Events, so that the locks it takes (see the
+        class docstring) are held until they're committed.
+        """
+        from .event import Event
+
+        if not events:
+            return
+
+        advisory_xact_lock(
+            [cls.get_lock_key("item", event.item_id) for event in events],
+            shared_keys=[cls.get_lock_key("work_order", event.work_order_id) for event in events],
+        )
+
+        previous = previous or {}
+        changed = {event.pk for event in events}
+        rows = cls.get_event_rows(Event.objects.filter(
+            item__in={event.item_id for event in events},
+            work_order__in={event.work_order_id for event in events},
+        ))
+
+        items = defaultdict(list)
+        for row in rows:
+            items[(row["item"], row["work_order"], row["sku"], row["production_step"])].append(row)
+
+        deltas = defaultdict(lambda: dict.fromkeys(cls.count_fields, 0))
+        for (_, work_order, sku, production_step), item_rows in items.items():
+            if not any(row["pk"] in changed for row in item_rows):
+                continue
+
+            before = [
+                previous.get(row["pk"]) if row["pk"] in changed else (row["completed"], row["failed"])
+                for row in item_rows
+            ]
+            old_status = cls.get_status([state for state in before if state is not None])
+            new_status = cls.get_status([(row["completed"], row["failed"]) for row in item_rows])
+            if old_status == new_status:
+                continue
+
+            delta = deltas[(work_order, sku, production_step)]
+            if old_status is None:
+                delta["started"] += 1
+            else:
+                delta[old_status] -= 1
+            if new_status is None:
+                delta["started"] -= 1
+            else:
+                delta[new_status] += 1
+
+        cls.apply_deltas(deltas)
+
+
+    @classmethod
+    def apply_deltas(cls, deltas):
+        """
+        Add a dict of {(work_order, sku, production_step): {count field: change}} to the counts, creating any
+        missing rows, with a single INSERT ... ON CONFLICT DO UPDATE.
+        """
+        if not deltas:
+            return
+
+        table = cls._meta.db_table
+        columns = ["work_order_id", "sku_id", "production_step", *cls.count_fields, "date_updated"]
+        updates = ", ".join(F"{field} = {table}.{field} + EXCLUDED.{field}" for field in cls.count_fields)
+        now = datetime.now()
+        # Sorted, so that concurrent updates lock the rows in the same order and can't deadlock.
+        rows = [(*key, *(deltas[key][field] for field in cls.count_fields), now) for key in sorted(deltas)]
+
+        with connection.cursor() as cursor:
+            execute_values(
+                cursor.cursor,
+                F"INSERT INTO {table} ({', '.join(columns)}) VALUES %s "
+                F"ON CONFLICT (work_order_id, sku_id, production_step) "
+                F"DO UPDATE SET {updates}, date_updated = EXCLUDED.date_updated",
+                rows,
+                page_size=len(rows),
+            )
+
+
+    @classmethod
+    def count_events(cls, events):
+        """
+        Count progress from scratch for a queryset of Events. Returns a dict of
+        {(work_order, sku, production_step): {count field: value}}.
+        """
+        counts = defaultdict(lambda: dict.fromkeys(cls.count_fields, 0))
+        item_statuses = (
+            cls.get_event_rows(events)
+            .values("item", "work_order", "sku", "production_step")
+            .annotate(
+                passes=Count("id", filter=Q(completed=True, failed=False)),
+                completions=Count("id", filter=Q(completed=True)),
+            )
+        )
+        for row in item_statuses:
+            count = counts[(row["work_order"], row["sku"], row["production_step"])]
+            count["started"] += 1
+            if row["passes"]:
+                count["passed"] += 1
+            elif row["completions"]:
+                count["failed"] += 1
+            else:
+                count["pending"] += 1
+        return counts
+
+
+    @classmethod
+    def rebuild(cls, work_orders=None):
+        """
+        Recount progress from the Events themselves, for the given work order codes or all of them. Returns a list
+        of the (work_order, sku, production_step) keys whose counts had drifted and were corrected.
+
+        Each work order is recounted in its own transaction, holding its lock exclusively (see the class docstring),
+        so no updates to it are lost or counted twice, and updates to every other work order carry on.
+        """
+        from .event import Event
+
+        if work_orders is None:
+            work_orders = WorkOrder.objects.order_by("code").values_list("code", flat=True)
+
+        corrected = []
+        for work_order in list(work_orders):
+            with transaction.atomic():
+                advisory_xact_lock([cls.get_lock_key("work_order", work_order)])
+
+                counts = cls.count_events(Event.objects.filter(work_order=work_order))
+                stored = {
+                    (row.work_order_id, row.sku_id, row.production_step): row
+                    for row in cls.objects.filter(work_order=work_order)
+                }
+
+                for key in sorted(set(counts) | set(stored)):
+                    count = counts.get(key, dict.fromkeys(cls.count_fields, 0))
+                    row = stored.get(key)
+                    if row is None:
+                        row = cls(**dict(zip(["work_order_id", "sku_id", "production_step"], key)))
+                    elif all(getattr(row, field) == value for field, value in count.items()):
+                        continue
+
+                    for field, value in count.items():
+                        setattr(row, field, value)
+                    row.save()
+                    corrected.append(key)
+
+        return corrected
+
+
+    @classmethod
+    def get_progress(cls, work_order):
+        """
+        Return the progress of a work order as a list of dicts, one per SKU and production step, in the order of
+        PRODUCTION_STEPS. Each includes the counts, and `pass_rate`: the fraction of finished items that passed.
+        """
+        step_order = {step: i for i, step in enumerate(PRODUCTION_STEPS.values)}
+        rows = cls.objects.filter(work_order=work_order, started__gt=0).values(
+            "sku", "production_step", *cls.count_fields
+        )
+        progress = sorted(rows, key=lambda row: (row["sku"], step_order.get(row["production_step"], len(step_order))))
+        for row in progress:
+            finished = row["passed"] + row["failed"]
+            row["pass_rate"] = row["passed"] / finished if finished else None
+        return progress
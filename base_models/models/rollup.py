@@ -0,0 +1,441 @@
+from datetime import datetime, time, timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import models, transaction
+from django.db.models import Count, Min, Q
+from django.db.models.functions import TruncDate, TruncHour
+
+from core.models import Machine, MachineUsage, Operator, Sku, WorkOrder
+from core.production_steps import PRODUCTION_STEPS
+from core.utils import get_past_date
+from .event import Event
+
+
+def contiguous_ranges(periods, length):
+    """
+    Collapse a collection of period start times, each period being `length` long, into a sorted list of contiguous
+    (start, end) ranges.
+    """
+    ranges = []
+    for start in sorted(set(periods)):
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = start + length
+        else:
+            ranges.append([start, start + length])
+    return [tuple(r) for r in ranges]
+
+
+def update_rollup(rollup_class, get_affected_periods, rebuild_periods, full=False):
+    """
+    Fold every source change since a rollup's watermark into it, by rebuilding every period that the changes could
+    affect. This is the shared implementation of each rollup's update_incrementally().
+
+    The rollup class provides `period_field` and `period_length` (the field holding the start of each period, and how
+    long a period is), along with `watermark_overlap` and `rebuild_batch_size`. `get_affected_periods(since)` returns
+    the periods touched by source rows updated after `since`, and `rebuild_periods(ranges)` recomputes the rows in a
+    list of contiguous (start, end) ranges of periods.
+
+    The ranges are rebuilt in batches of `rebuild_batch_size`, each in its own transaction. Each transaction holds the
+    watermark's lock while it rebuilds its batch, and moves the watermark up to the end of the batch. A source row
+    can't be updated before the period it's in has started, so everything up to there has been folded in, and a long
+    catch-up (such as the first run, which starts from the beginning of the data) can be interrupted and resumed.
+
+    A `date_updated` watermark can't see source rows that have been deleted, so their periods keep counting them.
+    Passing `full=True` ignores the watermark and rebuilds every period, including any left in the rollup table
+    with no source rows.
+
+    Returns the number of periods rebuilt.
+    """
+    name = rollup_class.__name__
+    now = datetime.now()
+
+    if full:
+        since = get_past_date()
+    else:
+        since = RollupWatermark.objects.get_or_create(name=name)[0].value - rollup_class.watermark_overlap
+
+    periods = get_affected_periods(since)
+    if full:
+        periods.update(rollup_class.objects.order_by().values_list(rollup_class.period_field, flat=True).distinct())
+    ranges = contiguous_ranges(periods, rollup_class.period_length)
+
+    batch_size = rollup_class.rebuild_batch_size
+    batches = [ranges[i:i + batch_size] for i in range(0, len(ranges), batch_size)] or [[]]
+    for i, batch in enumerate(batches):
+        if i == len(batches) - 1:
+            value = now
+        else:
+            end = batch[-1][1]
+            value = min(end if isinstance(end, datetime) else datetime.combine(end, time()), now)
+
+        with transaction.atomic():
+            watermark = RollupWatermark.lock(name)
+            if batch:
+                rebuild_periods(batch)
+            # Another update may have got further in the meantime.
+            watermark.value = max(watermark.value, value)
+            watermark.save()
+
+    return len(periods)
+
+
+class RollupWatermark(models.Model):
+    """
+    Records how far an incrementally-maintained rollup table has got through its source data.
+
+    Each rollup stores a single row here, under its own `name`. The `value` is the `date_updated` timestamp
+    up to which all source rows have been folded into the rollup.
+    """
+    name = models.CharField(max_length=255, primary_key=True)
+    value = models.DateTimeField(default=get_past_date)
+
+    def __str__(self):
+        return F"{self.name} up to {self.value}"
+
+    @classmethod
+    def lock(cls, name):
+        """
+        Return the watermark for the given rollup, creating it if necessary, and lock its row until the end of
+        the current transaction. This stops two updates of the same rollup from running over the top of each other.
+        """
+        cls.objects.get_or_create(name=name)
+        return cls.objects.select_for_update().get(name=name)
+
+
+class HourlyMachineRollup(models.Model):
+    """
+    Precomputed utilisation and throughput figures per machine, operator and hour.
+
+    Answering "events per hour per machine" or "minutes logged in per hour" from the raw Event and MachineUsage
+    tables means scanning them on every request. Instead, this table is kept up to date by
+    update_incrementally(), which is run periodically by the `update_rollups` management command.
+
+    Events are counted in the hour they were started (their `date_created`). Logged-in time is split across every
+    hour that a MachineUsage session overlaps; open sessions are counted up to their last ping.
+
+    Changes are found by their `date_updated`, which can't show that an Event or MachineUsage session has been
+    deleted, so the hours they were in keep counting them until they're rebuilt with update_incrementally(full=True).
+
+    Provides the following fields:
+      * machine, operator, production_step, hour - The key of each row. The production step is copied from the
+        machine at the time the hour was last rebuilt.
+      * events_started, events_completed, events_failed - Event counts for the hour.
+      * logged_in_seconds - How long the operator was logged in to the machine during the hour.
+    """
+    machine = models.ForeignKey(Machine, related_name="hourly_rollups", on_delete=models.CASCADE)
+    operator = models.ForeignKey(Operator, related_name="hourly_rollups", on_delete=models.CASCADE)
+    production_step = models.CharField(max_length=255, choices=PRODUCTION_STEPS.choices)
+    hour = models.DateTimeField(db_index=True)
+
+    events_started = models.PositiveIntegerField(default=0)
+    events_completed = models.PositiveIntegerField(default=0)
+    events_failed = models.PositiveIntegerField(default=0)
+    logged_in_seconds = models.FloatField(default=0)
+
+    # Source rows updated this long before the stored watermark are processed again on the next run. Rebuilding
+    # an hour is idempotent, so the overlap is harmless, and it catches rows from transactions that committed late.
+    watermark_overlap = timedelta(minutes=5)
+
+    # The number of contiguous runs of hours rebuilt in each transaction. See update_rollup().
+    rebuild_batch_size = 100
+
+    period_field = "hour"
+    period_length = timedelta(hours=1)
+
+    class Meta:
+        ordering = ["-hour", "machine"]
+        indexes = [
+            models.Index(fields=["machine", "hour"]),
+        ]
+
+    def __str__(self):
+        return F"{self.machine} ({self.operator}) at {self.hour}"
+
+
+    @staticmethod
+    def hours_between(start, end):
+        """Return the start of every hour that overlaps the period from `start` to `end`."""
+        hours = [start.replace(minute=0, second=0, microsecond=0)]
+        while hours[-1] + timedelta(hours=1) < end:
+            hours.append(hours[-1] + timedelta(hours=1))
+        return hours
+
+
+    @classmethod
+    def get_affected_hours(cls, since):
+        """Return every hour containing an Event or MachineUsage session that has changed since the given time."""
+        hours = set(
+            Event.objects.non_polymorphic()
+            .filter(date_updated__gt=since)
+            .annotate(hour=TruncHour("date_created"))
+            .order_by()
+            .values_list("hour", flat=True)
+            .distinct()
+        )
+
+        sessions = MachineUsage.objects.filter(date_updated__gt=since).values_list(
+            "logged_in_at", "logged_out_at", "last_ping"
+        )
+        for logged_in_at, logged_out_at, last_ping in sessions:
+            hours.update(cls.hours_between(logged_in_at, logged_out_at or last_ping))
+
+        return hours
+
+
+    @classmethod
+    def rebuild_hours(cls, ranges):
+        """Throw away and recompute every rollup row inside the given (start, end) hour ranges."""
+        event_filter = Q()
+        session_filter = Q()
+        for start, end in ranges:
+            event_filter |= Q(date_created__gte=start, date_created__lt=end)
+            session_filter |= Q(logged_in_at__lt=end) & (
+                Q(logged_out_at__gt=start) | Q(logged_out_at=None, last_ping__gt=start)
+            )
+
+        rows = {}
+
+        def get_row(machine, operator, production_step, hour):
+            key = (machine, operator, hour)
+            if key not in rows:
+                rows[key] = cls(
+                    machine_id=machine,
+                    operator_id=operator,
+                    production_step=production_step,
+                    hour=hour,
+                )
+            return rows[key]
+
+        event_counts = (
+            Event.objects.non_polymorphic()
+            .filter(event_filter)
+            .annotate(hour=TruncHour("date_created"))
+            .order_by()
+            .values("machine", "operator", "machine__production_step", "hour")
+            .annotate(
+                started=Count("id"),
+                completed=Count("id", filter=Q(completed=True)),
+                failed=Count("id", filter=Q(failed=True)),
+            )
+        )
+        for counts in event_counts:
+            row = get_row(counts["machine"], counts["operator"], counts["machine__production_step"], counts["hour"])
+            row.events_started = counts["started"]
+            row.events_completed = counts["completed"]
+            row.events_failed = counts["failed"]
+
+        sessions = MachineUsage.objects.filter(session_filter).values(
+            "machine", "operator", "machine__production_step", "logged_in_at", "logged_out_at", "last_ping"
+        )
+        for session in sessions:
+            session_start = session["logged_in_at"]
+            session_end = session["logged_out_at"] or session["last_ping"]
+
+            for hour in cls.hours_between(session_start, session_end):
+                if not any(start <= hour < end for start, end in ranges):
+                    continue
+
+                overlap = min(session_end, hour + timedelta(hours=1)) - max(session_start, hour)
+                if overlap.total_seconds() <= 0:
+                    continue
+
+                row = get_row(session["machine"], session["operator"], session["machine__production_step"], hour)
+                row.logged_in_seconds += overlap.total_seconds()
+
+        hour_filter = Q()
+        for start, end in ranges:
+            hour_filter |= Q(hour__gte=start, hour__lt=end)
+
+        cls.objects.filter(hour_filter).delete()
+        cls.objects.bulk_create(rows.values())
+
+
+    @classmethod
+    def update_incrementally(cls, full=False):
+        """
+        Fold every Event and MachineUsage change since the last run into the rollup table, or rebuild all of it if
+        `full` is set, as described in update_rollup().
+
+        Rather than trying to adjust counts in place (which would double-count Events that are saved more than once),
+        every hour touched by a changed row is rebuilt from scratch. Returns the number of hours rebuilt.
+        """
+        return update_rollup(cls, cls.get_affected_hours, cls.rebuild_hours, full=full)
+
+
+class DailyYieldRollup(models.Model):
+    """
+    Precomputed first-pass yield figures per SKU, work order, production step and day.
+
+    Working out first-pass yield from the raw Events means finding every item's first attempt at each production step,
+    across the whole Event history. Instead, this table is kept up to date by update_incrementally(), which is run
+    periodically by the `update_rollups` management command.
+
+    Each item is counted once per production step, in the row for its *first* attempt at that step: under that
+    attempt's work order, on the day it was started. Retests are counted in the same row, however much later they
+    happen, so a day's figures can keep changing until all of its items have passed.
+
+    Deleting an Event doesn't change anything that the watermark can see, so the days it counted towards (including
+    the day its item's first attempt moves to, if it was the first attempt) aren't corrected until they're rebuilt
+    with update_incrementally(full=True).
+
+    Provides the following fields:
+      * sku, work_order, production_step, day - The key of each row.
+      * items - How many items had their first attempt at the production step.
+      * first_pass_passed, first_pass_failed - How many of those first attempts were completed without failing, and
+        how many failed. First attempts that are still running (or were abandoned) are neither.
+      * final_passed - How many of the items' latest attempts were completed without failing.
+      * retests - How many attempts there were after the first, across all the items.
+      * fail_states - How many first attempts failed with each fail state, as {fail state: count}.
+    """
+    sku = models.ForeignKey(Sku, related_name="daily_yield_rollups", on_delete=models.CASCADE)
+    work_order = models.ForeignKey(WorkOrder, related_name="daily_yield_rollups", on_delete=models.CASCADE)
+    production_step = models.CharField(max_length=255, choices=PRODUCTION_STEPS.choices)
+    day = models.DateField(db_index=True)
+
+    items = models.PositiveIntegerField(default=0)
+    first_pass_passed = models.PositiveIntegerField(default=0)
+    first_pass_failed = models.PositiveIntegerField(default=0)
+    final_passed = models.PositiveIntegerField(default=0)
+    retests = models.PositiveIntegerField(default=0)
+    fail_states = models.JSONField(default=dict)
+
+    # See HourlyMachineRollup.
+    watermark_overlap = timedelta(minutes=5)
+
+    # The number of contiguous runs of days rebuilt in each transaction. See update_rollup().
+    rebuild_batch_size = 30
+
+    period_field = "day"
+    period_length = timedelta(days=1)
+
+    # The fields that summarise() can group by, and the counts it adds up.
+    group_fields = ["sku", "work_order", "production_step", "day"]
+    count_fields = ["items", "first_pass_passed", "first_pass_failed", "final_passed", "retests"]
+
+    class Meta:
+        ordering = ["-day", "sku", "work_order"]
+        indexes = [
+            models.Index(fields=["sku", "day"]),
+            models.Index(fields=["work_order", "day"]),
+        ]
+
+    def __str__(self):
+        return F"{self.production_step} of {self.sku} ({self.work_order}) on {self.day}"
+
+
+    @classmethod
+    def get_affected_days(cls, since):
+        """
+        Return the day of the first attempt at each production step, for every item with an Event that has changed
+        since the given time.
+        """
+        changed_items = Event.objects.non_polymorphic().filter(date_updated__gt=since).values("item")
+        return set(
+            Event.objects.non_polymorphic()
+            .filter(item__in=changed_items)
+            .order_by()
+            .values("item", "machine__production_step")
+            .annotate(day=TruncDate(Min("date_created")))
+            .values_list("day", flat=True)
+            .distinct()
+        )
+
+
+    @classmethod
+    def rebuild_days(cls, ranges):
+        """Throw away and recompute every rollup row inside the given (start, end) day ranges."""
+        event_filter = Q()
+        for start, end in ranges:
+            event_filter |= Q(
+                date_created__gte=datetime.combine(start, time()),
+                date_created__lt=datetime.combine(end, time()),
+            )
+
+        def in_ranges(day):
+            return any(start <= day < end for start, end in ranges)
+
+        # Any item with a first attempt on one of the days must have had an Event on that day, so only those items'
+        # Events need looking at. Going through them in order puts each item's attempts at each step together.
+        attempts = (
+            Event.objects.non_polymorphic()
+            .filter(item__in=Event.objects.non_polymorphic().filter(event_filter).values("item"))
+            .order_by("item", "machine__production_step", "date_created", "id")
+            .values(
+                "item", "item__sku", "machine__production_step", "work_order", "date_created",
+                "completed", "failed", "fail_state",
+            )
+        )
+
+        rows = {}
+        for _, item_attempts in groupby(attempts.iterator(), key=itemgetter("item", "machine__production_step")):
+            first, *retests = item_attempts
+            last = retests[-1] if retests else first
+
+            day = first["date_created"].date()
+            if not in_ranges(day):
+                continue
+
+            key = (first["item__sku"], first["work_order"], first["machine__production_step"], day)
+            if key not in rows:
+                rows[key] = cls(sku_id=key[0], work_order_id=key[1], production_step=key[2], day=day)
+            row = rows[key]
+
+            row.items += 1
+            row.retests += len(retests)
+            if first["failed"]:
+                row.first_pass_failed += 1
+                row.fail_states[first["fail_state"]] = row.fail_states.get(first["fail_state"], 0) + 1
+            elif first["completed"]:
+                row.first_pass_passed += 1
+            if last["completed"] and not last["failed"]:
+                row.final_passed += 1
+
+        day_filter = Q()
+        for start, end in ranges:
+            day_filter |= Q(day__gte=start, day__lt=end)
+
+        cls.objects.filter(day_filter).delete()
+        cls.objects.bulk_create(rows.values())
+
+
+    @classmethod
+    def update_incrementally(cls, full=False):
+        """
+        Fold every Event change since the last run into the rollup table, by rebuilding every day that the changes
+        could affect, or rebuild all of it if `full` is set. See update_rollup(). Returns the number of days rebuilt.
+        """
+        return update_rollup(cls, cls.get_affected_days, cls.rebuild_days, full=full)
+
+
+    @classmethod
+    def summarise(cls, queryset, group_by=None):
+        """
+        Add up a queryset of rollup rows, grouped by the given subset of `group_fields` (all of them by default),
+        and return a list of dicts. Each one also has a `first_pass_yield` and `final_yield`, as fractions of its
+        `items` (or None, if there aren't any).
+        """
+        group_by = cls.group_fields if group_by is None else group_by
+
+        summaries = {}
+        for row in queryset.order_by(*group_by).values(*group_by, *cls.count_fields, "fail_states"):
+            key = tuple(row[field] for field in group_by)
+            if key not in summaries:
+                summaries[key] = {
+                    **{field: row[field] for field in group_by},
+                    **dict.fromkeys(cls.count_fields, 0),
+                    "fail_states": {},
+                }
+            summary = summaries[key]
+
+            for field in cls.count_fields:
+                summary[field] += row[field]
+            for fail_state, count in row["fail_states"].items():
+                summary["fail_states"][fail_state] = summary["fail_states"].get(fail_state, 0) + count
+
+        for summary in summaries.values():
+            items = summary["items"]
+            summary["first_pass_yield"] = summary["first_pass_passed"] / items if items else None
+            summary["final_yield"] = summary["final_passed"] / items if items else None
+
+        return list(summaries.values())
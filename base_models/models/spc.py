@@ -0,0 +1,291 @@
+from collections import defaultdict
+from datetime import datetime
+from math import sqrt
+
+from django.contrib.postgres.fields import ArrayField
+from django.db import models, transaction
+from django.db.models import Q
+
+from core.models import Machine, Sku
+from .item import AnyItem
+
+
+# Shewhart control chart constants for subgroups of n observations, as {n: (A2, D3, D4, d2)}.
+CONTROL_CHART_CONSTANTS = {
+    2: (1.880, 0.0, 3.267, 1.128),
+    3: (1.023, 0.0, 2.574, 1.693),
+    4: (0.729, 0.0, 2.282, 2.059),
+    5: (0.577, 0.0, 2.114, 2.326),
+    6: (0.483, 0.0, 2.004, 2.534),
+    7: (0.419, 0.076, 1.924, 2.704),
+    8: (0.373, 0.136, 1.864, 2.847),
+    9: (0.337, 0.184, 1.816, 2.970),
+    10: (0.308, 0.223, 1.777, 3.078),
+}
+
+
+class SpcRule(models.TextChoices):
+    """The out-of-control signals that SpcChart looks for."""
+    # The Western Electric rules, applied to the X̄ chart.
+    BEYOND_3_SIGMA = "beyond_3_sigma", "One subgroup mean beyond 3σ"
+    TWO_OF_THREE_BEYOND_2_SIGMA = "two_of_three_beyond_2_sigma", "Two of three subgroup means beyond 2σ"
+    FOUR_OF_FIVE_BEYOND_1_SIGMA = "four_of_five_beyond_1_sigma", "Four of five subgroup means beyond 1σ"
+    EIGHT_ON_ONE_SIDE = "eight_on_one_side", "Eight subgroup means on one side of the centre line"
+    # A subgroup's spread, and single observations, out of their limits.
+    RANGE_ABOVE_LIMIT = "range_above_limit", "Subgroup range above the R chart's upper limit"
+    EWMA_BEYOND_LIMITS = "ewma_beyond_limits", "EWMA beyond its control limits"
+
+
+class SpcChart(models.Model):
+    """
+    Statistical process control for one scalar metric of one SKU's production on one machine - the duration of its
+    Events, say, or the heat-up time of a curing QC rig.
+
+    Rather than recomputing limits over the whole history, each chart keeps just enough state to update them as
+    every new observation arrives (see record_observations()):
+      * pending - The observations of the subgroup being filled. Every `subgroup_size` consecutive observations make
+        a subgroup.
+      * means, ranges - The means and ranges of the last `window` subgroups, oldest first. The X̄ and R chart
+        limits are calculated from these, so they follow the process as it drifts slowly over time.
+      * ewma, observations - The exponentially-weighted moving average of the individual observations, and how many
+        there have been in total.
+
+    When a subgroup is completed, its mean is checked against the Western Electric rules, and its range against the
+    R chart, using the limits from the subgroups before it. Every observation updates the EWMA, which is checked
+    against its own limits. Each signal is saved as an SpcViolation. No signals are raised until the chart has at
+    least `min_subgroups` subgroups to calculate limits from.
+
+    Charts are keyed on (machine, sku, metric). `sku` is null for metrics that don't belong to an item, like the
+    resistance recorded by each ZeroingLog.
+    """
+    machine = models.ForeignKey(Machine, related_name="spc_charts", on_delete=models.CASCADE)
+    sku = models.ForeignKey(Sku, related_name="spc_charts", null=True, on_delete=models.CASCADE)
+    metric = models.CharField(max_length=255)
+
+    pending = ArrayField(models.FloatField(), default=list)
+    means = ArrayField(models.FloatField(), default=list)
+    ranges = ArrayField(models.FloatField(), default=list)
+    ewma = models.FloatField(null=True)
+    observations = models.PositiveIntegerField(default=0)
+    date_updated = models.DateTimeField(auto_now=True)
+
+    subgroup_size = 5
+    window = 25
+    min_subgroups = 5
+    ewma_lambda = 0.2
+    ewma_width = 3
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["machine", "sku", "metric"], name="unique_spc_chart"),
+            models.UniqueConstraint(
+                fields=["machine", "metric"], condition=Q(sku=None), name="unique_spc_chart_without_sku"
+            ),
+        ]
+
+    def __str__(self):
+        return F"SPC chart of {self.metric} for {self.sku or 'all SKUs'} on {self.machine}"
+
+    @property
+    def is_established(self):
+        """Whether there are enough subgroups to calculate meaningful control limits from."""
+        return len(self.means) >= self.min_subgroups
+
+    def get_limits(self):
+        """
+        Return the current control limits, as a dict of:
+          * centre_line, sigma - The grand mean of the subgroup means, and the estimated standard deviation of an
+            individual observation (R̄ / d2).
+          * xbar - The (lower, upper) 3σ limits of the X̄ chart.
+          * range - The (lower, upper) limits of the R chart, and `mean_range` its centre line.
+          * ewma - The (lower, upper) limits of the EWMA after the observations so far.
+        Returns None if the chart isn't established yet.
+        """
+        if not self.is_established:
+            return None
+
+        a2, d3, d4, d2 = CONTROL_CHART_CONSTANTS[self.subgroup_size]
+        centre_line = sum(self.means) / len(self.means)
+        mean_range = sum(self.ranges) / len(self.ranges)
+        sigma = mean_range / d2
+
+        # The EWMA's limits widen towards their asymptote as it accumulates observations.
+        smoothing = self.ewma_lambda / (2 - self.ewma_lambda) * (1 - (1 - self.ewma_lambda) ** (2 * self.observations))
+        ewma_width = self.ewma_width * sigma * sqrt(smoothing)
+
+        return {
+            "centre_line": centre_line,
+            "sigma": sigma,
+            "xbar": (centre_line - a2 * mean_range, centre_line + a2 * mean_range),
+            "mean_range": mean_range,
+            "range": (d3 * mean_range, d4 * mean_range),
+            "ewma": (centre_line - ewma_width, centre_line + ewma_width),
+        }
+
+    def add_observation(self, value, event=None):
+        """
+        Fold a new observation into the chart, and return a list of unsaved SpcViolations for any signals it
+        raises. Doesn't save the chart itself.
+        """
+        violations = []
+        limits = self.get_limits()
+
+        def violation(rule, value, lower, upper):
+            return SpcViolation(
+                chart=self, rule=rule, event=event, value=value, centre_line=limits["centre_line"],
+                lower_limit=lower, upper_limit=upper,
+            )
+
+        self.observations += 1
+        self.ewma = value if self.ewma is None else self.ewma_lambda * value + (1 - self.ewma_lambda) * self.ewma
+        if limits is not None:
+            # Recalculated with this observation counted, so that the limits match the EWMA's number of steps.
+            lower, upper = self.get_limits()["ewma"]
+            if not lower <= self.ewma <= upper:
+                violations.append(violation(SpcRule.EWMA_BEYOND_LIMITS, self.ewma, lower, upper))
+
+        self.pending = [*self.pending, value]
+        if len(self.pending) < self.subgroup_size:
+            return violations
+
+        mean = sum(self.pending) / len(self.pending)
+        spread = max(self.pending) - min(self.pending)
+        self.pending = []
+
+        if limits is not None:
+            lower, upper = limits["range"]
+            if spread > upper:
+                violations.append(violation(SpcRule.RANGE_ABOVE_LIMIT, spread, lower, upper))
+
+            lower, upper = limits["xbar"]
+            for rule in self.check_western_electric_rules([*self.means, mean], limits):
+                violations.append(violation(rule, mean, lower, upper))
+
+        self.means = [*self.means, mean][-self.window:]
+        self.ranges = [*self.ranges, spread][-self.window:]
+        return violations
+
+    @staticmethod
+    def check_western_electric_rules(means, limits):
+        """
+        Return the Western Electric rules that are broken by the last of a list of subgroup means, given the limits
+        calculated from the ones before it. Each rule only counts patterns that include the latest mean.
+        """
+        centre_line = limits["centre_line"]
+        # The standard deviation of a subgroup mean; the X̄ chart's limits are 3 of these from the centre line.
+        zone = (limits["xbar"][1] - centre_line) / 3
+        latest = means[-1] - centre_line
+
+        rules = []
+        if abs(latest) > 3 * zone:
+            rules.append(SpcRule.BEYOND_3_SIGMA)
+
+        side = 1 if latest > 0 else -1
+        beyond = [side * (mean - centre_line) for mean in means]
+        if side * latest > 2 * zone and sum(distance > 2 * zone for distance in beyond[-3:]) >= 2:
+            rules.append(SpcRule.TWO_OF_THREE_BEYOND_2_SIGMA)
+        if side * latest > zone and sum(distance > zone for distance in beyond[-5:]) >= 4:
+            rules.append(SpcRule.FOUR_OF_FIVE_BEYOND_1_SIGMA)
+        if len(beyond) >= 8 and all(distance > 0 for distance in beyond[-8:]):
+            rules.append(SpcRule.EIGHT_ON_ONE_SIDE)
+        return rules
+
+    @classmethod
+    def record_observations(cls, observations):
+        """
+        Add a list of observations to their charts, creating charts as needed, and save any violations. Each
+        observation is a tuple of (machine ID, SKU ID or None, metric, value, Event or None), in the order they
+        were made. Each chart is locked while it's updated, so concurrent requests are applied one after another.
+        Returns the saved SpcViolations.
+        """
+        by_chart = defaultdict(list)
+        for machine, sku, metric, value, event in observations:
+            by_chart[(machine, sku, metric)].append((value, event))
+
+        violations = []
+        with transaction.atomic():
+            # Always lock charts in the same order, so that two batches can't deadlock on each other's charts.
+            for machine, sku, metric in sorted(by_chart, key=lambda key: (key[0], key[1] or "", key[2])):
+                cls.objects.get_or_create(machine_id=machine, sku_id=sku, metric=metric)
+                chart = cls.objects.select_for_update().get(machine_id=machine, sku_id=sku, metric=metric)
+                for value, event in by_chart[(machine, sku, metric)]:
+                    violations.extend(chart.add_observation(value, event))
+                chart.save()
+            SpcViolation.objects.bulk_create(violations)
+
+        return violations
+
+    @classmethod
+    def record_events(cls, events):
+        """
+        Record every SPC metric of a list of newly-completed Events (see Event._spc_metrics), in the order they
+        were completed. Looks up the Events' SKUs with a single query.
+        """
+        skus = dict(AnyItem.objects.non_polymorphic().filter(
+            pk__in={event.item_id for event in events}
+        ).values_list("pk", "sku"))
+
+        observations = []
+        for event in sorted(events, key=lambda e: (e.date_updated, e.pk)):
+            for metric, value in event.get_spc_metrics().items():
+                observations.append((event.machine_id, skus[event.item_id], metric, value, event))
+
+        return cls.record_observations(observations)
+
+    def to_dict(self):
+        """Return the chart's current state and limits, for the API."""
+        limits = self.get_limits()
+        return {
+            "machine": self.machine_id,
+            "sku": self.sku_id,
+            "metric": self.metric,
+            "observations": self.observations,
+            "subgroup_size": self.subgroup_size,
+            "established": self.is_established,
+            "centre_line": limits and limits["centre_line"],
+            "sigma": limits and limits["sigma"],
+            "xbar_limits": limits and limits["xbar"],
+            "mean_range": limits and limits["mean_range"],
+            "range_limits": limits and limits["range"],
+            "ewma": self.ewma,
+            "ewma_limits": limits and limits["ewma"],
+            "means": self.means,
+            "ranges": self.ranges,
+            "date_updated": self.date_updated,
+        }
+
+
+class SpcViolation(models.Model):
+    """
+    A signal raised by an SpcChart: the rule that was broken, the value that broke it (a subgroup mean or range, or
+    the EWMA), and the limits it was checked against. `event` is the Event whose observation raised it, if any.
+    """
+    chart = models.ForeignKey(SpcChart, related_name="violations", on_delete=models.CASCADE)
+    rule = models.CharField(max_length=255, choices=SpcRule.choices)
+    event = models.ForeignKey("Event", related_name="spc_violations", null=True, on_delete=models.SET_NULL)
+    value = models.FloatField()
+    centre_line = models.FloatField()
+    lower_limit = models.FloatField()
+    upper_limit = models.FloatField()
+    date_created = models.DateTimeField(default=datetime.now)
+
+    class Meta:
+        ordering = ["-date_created"]
+
+    def __str__(self):
+        return F"{self.get_rule_display()} on {self.chart}"
+
+    def to_dict(self):
+        return {
+            "machine": self.chart.machine_id,
+            "sku": self.chart.sku_id,
+            "metric": self.chart.metric,
+            "rule": self.rule,
+            "description": self.get_rule_display(),
+            "event": self.event_id,
+            "value": self.value,
+            "centre_line": self.centre_line,
+            "lower_limit": self.lower_limit,
+            "upper_limit": self.upper_limit,
+            "date_created": self.date_created,
+        }
@@ -0,0 +1,50 @@
+from django.db import connection, transaction
+
+
+def polymorphic_bulk_create(model, objs, batch_size=500):
+    """
+    Insert a list of unsaved instances of a multi-table-inherited (e.g. polymorphic) model, with one INSERT per table
+    per batch rather than one per object, and return the objects with their primary keys set.
+
+    Django's own bulk_create() refuses to handle models with concrete parents, because it can't get the parent
+    rows' primary keys back on every database. Postgres can, so insert the root table first, then each child table
+    in turn, filling in each parent link from the row above. Everything else that save() would do - setting
+    `polymorphic_ctype`, auto_now fields and the like - is done too, but save() itself and signals aren't run.
+    """
+    if not objs:
+        return objs
+
+    # Ancestors come back closest-first, so reverse them to insert from the root table down.
+    chain = [*reversed(model._meta.get_parent_list()), model]
+
+    for obj in objs:
+        if hasattr(obj, "pre_save_polymorphic"):
+            obj.pre_save_polymorphic()
+
+    with transaction.atomic():
+        for table_model in chain:
+            opts = table_model._meta
+            fields = [f for f in opts.local_concrete_fields if not f.primary_key or f.remote_field is not None]
+
+            # Fill in the links to the parent rows that were inserted in the previous step.
+            for parent, link in opts.parents.items():
+                for obj in objs:
+                    setattr(obj, link.attname, getattr(obj, parent._meta.pk.attname))
+
+            for i in range(0, len(objs), batch_size):
+                batch = objs[i:i + batch_size]
+                returned = table_model._base_manager._insert(
+                    batch,
+                    fields=fields,
+                    returning_fields=[] if opts.pk.remote_field else [opts.pk],
+                    using=connection.alias,
+                )
+
+                for obj, row in zip(batch, returned or []):
+                    setattr(obj, opts.pk.attname, row[0])
+
+    for obj in objs:
+        obj._state.adding = False
+        obj._state.db = connection.alias
+
+    return objs
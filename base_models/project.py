@@ -42,6 +42,16 @@ class Project:
         self._additional_api_urls = additional_api_urls or []
 
 
+    @property
+    def name(self):
+        return self._name
+
+
+    @property
+    def event_class(self):
+        return self._event_class
+
+
     def generate_basic_api(self):
         """
         Produce API views and URLs that support data lookup and logging for the rig.
@@ -54,12 +64,18 @@ class Project:
         Creates the following endpoints, depending on which classes were supplied to the Project constructor:
           * POST item/ - Item get-or-create endpoint (requires item_class)
           * PUT item/<int:pk>/ - Item update endpoint (requires item_class)
+          * POST item/bulk/ - Item get-or-create endpoint for a list of items at once (requires item_class)
           * GET config/<str:sku>/ - Configuration lookup (requires configuration_class)
           * GET config_search/<str:search_terms>/ - Configuration search (requires configuration_class). Intended
             for use only by the frontend.
           * GET event/<int:pk> - Retrieve an event instance
           * POST start/ - Start the process and create an event instance (requires item_class, event_class)
           * PUT finish/<int:pk>/ - End the process and store the final report (requires item_class, event_class)
+          * POST begin/ - Get or create the work order and item, look up the configuration and start an event, all
+            in one request (requires item_class, event_class)
+          * POST start/batch/ - Start a list of events at once (requires item_class, event_class)
+          * POST finish/batch/ - Store the final reports of a list of events at once (requires item_class,
+            event_class)
           * GET logs/<int:pk>/ - Retrieve all log entries for this event (always included). Inteded for use only
             by the frontend.
 
@@ -99,6 +115,13 @@ class Project:
                 name=F"{self._name}_item_update"
             ))
 
+            # POST item/bulk/ - Get or create a list of items in one request, e.g. a whole tray of parts.
+            urls.append(path(
+                "item/bulk/",
+                self._item_class.generate_bulk_lookup_view().as_view(),
+                name=F"{self._name}_item_bulk"
+            ))
+
             if self._event_class is not None:
                 # GET event/pk/ - A RetrieveView for an event.
                 # Accepts an event pk and returns all fields.
@@ -125,6 +148,27 @@ class Project:
                     name=F"{self._name}_finish"
                 ))
 
+                # POST begin/ - The work order, item, configuration and start endpoints rolled into one, so that
+                # a rig can start a cycle with a single round trip.
+                urls.append(path(
+                    "begin/",
+                    self._event_class.generate_begin_view(self._item_class, self._configuration_class).as_view(),
+                    name=F"{self._name}_begin"
+                ))
+
+                # POST start/batch/ and finish/batch/ - Batch versions of the above, for rigs that test several
+                # items at once or upload a backlog of events in one go. Each returns a list of per-event results.
+                urls.append(path(
+                    "start/batch/",
+                    self._event_class.generate_batch_start_view().as_view(),
+                    name=F"{self._name}_start_batch"
+                ))
+                urls.append(path(
+                    "finish/batch/",
+                    self._event_class.generate_batch_finish_view().as_view(),
+                    name=F"{self._name}_finish_batch"
+                ))
+
         # GET logs/pk/ - An internal endpoint that returns all the log entries for a given Event.
         urls.append(path(
             "logs/<int:pk>/",
@@ -196,6 +240,12 @@ class Project:
                 name=f"{self._name}_multi_event_details_csv"
             ))
 
+            urls.append(path(
+                "event/cube/",
+                self._event_class.generate_cube_view(self._name).as_view(),
+                name=F"{self._name}_event_cube"
+            ))
+
             urls.append(path(
                 "event/search/<int:page>/",
                 self._event_class.generate_search_view(self._name).as_view(),
@@ -0,0 +1,127 @@
+from datetime import datetime
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from core.models import Machine, MachineUsage, Operator, Sku, UniqueID, WorkOrder
+from core.tests.api_test_case import APITestCase
+from core.utils import reverse
+from projects.hemera.models import HemeraGreaseEvent
+from .. import models
+from ..polymorphic_bulk_create import polymorphic_bulk_create
+
+
+class TestBatchEvents(APITestCase):
+    def setUp(self):
+        self.machine = Machine.objects.create(hostname="123", name="machine")
+        self.operator = Operator.objects.create(code="123", name="operator")
+        self.work_order = WorkOrder.objects.create(code="E3D-WO-123")
+        self.sku = Sku.objects.create(code="123")
+        self.items = [
+            models.SingleItem.objects.create(sku=self.sku, uid=UniqueID.objects.create(code=F"12345678{i}"))
+            for i in range(3)
+        ]
+
+    def event_data(self, item, **kwargs):
+        return {
+            "machine": self.machine.hostname,
+            "operator": self.operator.code,
+            "work_order": self.work_order.code,
+            "item": item.pk,
+            **kwargs
+        }
+
+
+    def test_polymorphic_bulk_create(self):
+        events = polymorphic_bulk_create(HemeraGreaseEvent, [
+            HemeraGreaseEvent(machine=self.machine, operator=self.operator, work_order=self.work_order, item=item)
+            for item in self.items
+        ])
+
+        self.assertTrue(all(event.pk for event in events))
+        self.assertEqual(HemeraGreaseEvent.objects.count(), 3)
+
+        # Looking the Events up through the base class should still give the subclass.
+        self.assertEqual({type(event) for event in models.Event.objects.all()}, {HemeraGreaseEvent})
+        self.assertEqual(
+            sorted(models.Event.objects.values_list("pk", flat=True)),
+            sorted(event.pk for event in events),
+        )
+
+
+    def test_batch_start(self):
+        url = reverse("test:basic_single_start_batch")
+        data = [
+            self.event_data(self.items[0]),
+            self.event_data(self.items[1], date_created="2022-09-01T10:00:00"),
+            self.event_data(self.items[2], machine="not a machine"),
+        ]
+
+        results = self.postData(url, data, status_code_check=201)
+
+        self.assertEqual(models.Event.objects.count(), 2)
+        self.assertEqual(results[0]["pk"], models.Event.objects.get(item=self.items[0]).pk)
+        self.assertEqual(models.Event.objects.get(pk=results[1]["pk"]).date_created, datetime(2022, 9, 1, 10))
+        self.assertIn("machine", results[2]["errors"])
+
+        # Machine usage is tracked, as with the single start endpoint.
+        self.assertEqual(MachineUsage.objects.filter(machine=self.machine, logged_out_at=None).count(), 1)
+
+
+    def test_batch_start_query_count(self):
+        """The number of queries doesn't depend on the size of the batch."""
+        url = reverse("test:basic_single_start_batch")
+        MachineUsage.log_in(self.machine, self.operator)
+
+        query_counts = []
+        for batch in [self.items[:1], self.items]:
+            with CaptureQueriesContext(connection) as queries:
+                self.postData(url, [self.event_data(item) for item in batch], status_code_check=201)
+            query_counts.append(len(queries))
+
+        self.assertEqual(query_counts[0], query_counts[1])
+
+
+    def test_batch_finish(self):
+        events = [
+            models.Event.objects.create(
+                machine=self.machine, operator=self.operator, work_order=self.work_order, item=item
+            )
+            for item in self.items[:2]
+        ]
+
+        url = reverse("test:basic_single_finish_batch")
+        data = [
+            {"pk": events[0].pk, "completed": True},
+            {"pk": events[1].pk, "completed": True, "failed": True},
+            {"pk": 0, "completed": True},
+        ]
+        results = self.postData(url, data, status_code_check=200)
+
+        self.assertEqual(results[:2], [{"pk": events[0].pk}, {"pk": events[1].pk}])
+        self.assertIn("pk", results[2]["errors"])
+
+        for event in events:
+            event.refresh_from_db()
+            self.assertTrue(event.completed)
+        self.assertEqual([event.fail_state for event in events], ["None", "Unknown"])
+
+
+    def test_batch_must_be_a_list(self):
+        url = reverse("test:basic_single_start_batch")
+        self.postData(url, self.event_data(self.items[0]), status_code_check=400)
+
+
+    def test_batch_finish_subclass(self):
+        """Updating an Event subclass writes to the base Event table as well."""
+        event = HemeraGreaseEvent.objects.create(
+            machine=self.machine, operator=self.operator, work_order=self.work_order, item=self.items[0]
+        )
+
+        view = HemeraGreaseEvent.generate_batch_finish_view().as_view()
+        request = APIRequestFactory().post("/", [{"pk": event.pk, "completed": True}], format="json")
+        self.assertEqual(view(request).data, [{"pk": event.pk}])
+
+        event.refresh_from_db()
+        self.assertTrue(event.completed)
@@ -0,0 +1,91 @@
+from core.models import Machine, MachineUsage, Operator, Sku, UniqueID, WorkOrder
+from core.tests.api_test_case import APITestCase
+from core.utils import reverse
+from projects.hemera.models import HemeraGreaseConfig
+from .. import models
+
+
+class TestBeginCycle(APITestCase):
+    def setUp(self):
+        self.machine = Machine.objects.create(hostname="123", name="machine")
+        self.operator = Operator.objects.create(code="123", name="operator")
+        self.sku = Sku.objects.create(code="123")
+        self.uid = UniqueID.objects.create(code="123456789")
+        self.config = HemeraGreaseConfig.objects.create(sku=self.sku)
+
+    def begin_data(self, **kwargs):
+        return {
+            "uid": self.uid.code,
+            "sku": self.sku.code,
+            "work_order": "E3D-WO-123",
+            "machine": self.machine.hostname,
+            "operator": self.operator.code,
+            **kwargs
+        }
+
+
+    def test_begin_single(self):
+        url = reverse("test:basic_single_begin")
+        response_data = self.postData(url, self.begin_data(), status_code_check=201)
+
+        event = models.Event.objects.get()
+        item = models.SingleItem.objects.get()
+        self.assertEqual(response_data["pk"], event.pk)
+        self.assertEqual(response_data["item"]["id"], item.pk)
+        self.assertEqual(response_data["configuration"]["id"], self.config.pk)
+
+        self.assertEqual(event.item_id, item.pk)
+        self.assertEqual(event.machine, self.machine)
+        self.assertEqual(event.operator, self.operator)
+        self.assertEqual(event.work_order_id, "E3D-WO-123")
+        self.assertTrue(MachineUsage.objects.filter(machine=self.machine, operator=self.operator).exists())
+
+
+    def test_begin_reuses_existing_objects(self):
+        url = reverse("test:basic_single_begin")
+        first = self.postData(url, self.begin_data(), status_code_check=201)
+        second = self.postData(url, self.begin_data(), status_code_check=201)
+
+        self.assertEqual(first["item"], second["item"])
+        self.assertNotEqual(first["pk"], second["pk"])
+        self.assertEqual(models.SingleItem.objects.count(), 1)
+        self.assertEqual(WorkOrder.objects.count(), 1)
+        self.assertEqual(models.Event.objects.count(), 2)
+
+
+    def test_begin_bulk(self):
+        url = reverse("test:basic_bulk_begin")
+        data = self.begin_data()
+        del data["uid"]
+        response_data = self.postData(url, data, status_code_check=201)
+
+        item = models.BulkItem.objects.get()
+        self.assertEqual(item.work_order_id, "E3D-WO-123")
+        self.assertEqual(response_data["item"]["id"], item.pk)
+        self.assertEqual(models.Event.objects.get().item_id, item.pk)
+
+
+    def test_begin_rolls_back_on_error(self):
+        url = reverse("test:basic_single_begin")
+        response = self.postData(url, self.begin_data(machine="not a machine"), status_code_check=400)
+        self.assertIn("machine", response.data["event"])
+
+        # The work order and item were created before the Event failed, but they shouldn't have been kept.
+        self.assertEqual(WorkOrder.objects.count(), 0)
+        self.assertEqual(models.SingleItem.objects.count(), 0)
+        self.assertEqual(models.Event.objects.count(), 0)
+
+
+    def test_begin_errors_by_step(self):
+        url = reverse("test:basic_single_begin")
+
+        response = self.postData(url, self.begin_data(work_order="not a work order"), status_code_check=400)
+        self.assertIn("work_order", response.data)
+
+        response = self.postData(url, self.begin_data(uid="not a uid"), status_code_check=400)
+        self.assertIn("item", response.data)
+
+        self.config.delete()
+        response = self.postData(url, self.begin_data(), status_code_check=400)
+        self.assertIn("configuration", response.data)
+        self.assertEqual(models.Event.objects.count(), 0)
@@ -0,0 +1,110 @@
+from unittest.mock import patch
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Sku, UniqueID, WorkOrder
+from core.tests.api_test_case import APITestCase
+from core.utils import reverse
+from .. import models
+from ..polymorphic_bulk_create import polymorphic_bulk_create
+
+
+class TestBulkItemLookup(APITestCase):
+    def setUp(self):
+        self.sku = Sku.objects.create(code="123")
+        self.other_sku = Sku.objects.create(code="456")
+
+
+    def test_single_items(self):
+        existing = models.SingleItem.objects.create(sku=self.sku, uid=UniqueID.objects.create(code="123456789"))
+        models.SingleItem.objects.create(sku=self.other_sku, uid=UniqueID.objects.create(code="987654321"))
+
+        data = [
+            {"uid": "020122-AC12", "sku": "123"},
+            {"uid": "123456789", "sku": "123"},
+            {"uid": "not a code", "sku": "123"},
+            {"uid": "987654321", "sku": "123"},
+            {"uid": "030122-AC12", "sku": "not a sku"},
+            {"uid": "020122-AC12", "sku": "123"},
+            {"sku": "123"},
+        ]
+        results = self.postData(reverse("test:basic_single_item_bulk"), data, status_code_check=200)
+
+        # New UIDs and items are created; existing ones are returned.
+        created = models.SingleItem.objects.get(uid="020122-AC12")
+        self.assertEqual(results[0]["id"], created.pk)
+        self.assertEqual(results[0]["sku"], "123")
+        self.assertEqual(results[1]["id"], existing.pk)
+        self.assertEqual(results[5], results[0])
+        self.assertEqual(UniqueID.objects.get(code="020122-AC12").manufacture_date.year, 2022)
+
+        # Everything else is reported per item.
+        self.assertIn("uid", results[2]["errors"])
+        self.assertIn("already exists", results[3]["errors"]["uid"][0])
+        self.assertIn("sku", results[4]["errors"])
+        self.assertIn("uid", results[6]["errors"])
+
+        self.assertEqual(models.SingleItem.objects.count(), 3)
+        self.assertFalse(UniqueID.objects.filter(code="030122-AC12").exists())
+
+
+    def test_query_count(self):
+        """The number of queries doesn't depend on the number of items."""
+        query_counts = []
+        for codes in [["123456789"], ["223456789", "323456789", "423456789"]]:
+            data = [{"uid": code, "sku": "123"} for code in codes]
+            with CaptureQueriesContext(connection) as queries:
+                self.postData(reverse("test:basic_single_item_bulk"), data, status_code_check=200)
+            query_counts.append(len(queries))
+
+        self.assertEqual(query_counts[0], query_counts[1])
+
+
+    def test_bulk_items(self):
+        WorkOrder.objects.create(code="E3D-WO-123")
+        existing = models.BulkItem.objects.create(sku=self.sku, work_order_id="E3D-WO-123")
+
+        data = [
+            {"work_order": "E3D-WO-123", "sku": "123"},
+            {"work_order": "E3D-WO-123", "sku": "456"},
+            {"work_order": "E3D-WO-456", "sku": "456"},
+        ]
+        results = self.postData(reverse("test:basic_bulk_item_bulk"), data, status_code_check=200)
+
+        self.assertEqual(results[0]["id"], existing.pk)
+        self.assertEqual(results[1]["id"], models.BulkItem.objects.get(sku=self.other_sku).pk)
+        self.assertIn("work_order", results[2]["errors"])
+
+
+    def test_bulk_items_are_locked(self):
+        WorkOrder.objects.create(code="E3D-WO-123")
+        data = [{"work_order": "E3D-WO-123", "sku": "123"}, {"work_order": "E3D-WO-123", "sku": "456"}]
+
+        # There's no unique constraint on a BulkItem's work order and SKU, so concurrent requests are kept apart
+        # with advisory locks, all taken in one query.
+        with CaptureQueriesContext(connection) as queries:
+            self.postData(reverse("test:basic_bulk_item_bulk"), data, status_code_check=200)
+        self.assertEqual(len([query for query in queries if "pg_advisory_xact_lock" in query["sql"]]), 1)
+
+
+    def test_concurrent_creation(self):
+        # Another request creates an item with one of the same UIDs, and one with the same UID and SKU, just before
+        # this one inserts its items.
+        UniqueID.objects.create(code="123456789")
+        UniqueID.objects.create(code="223456789")
+
+        def create_concurrently(model, objs):
+            models.SingleItem.objects.create(sku=self.other_sku, uid_id="123456789")
+            concurrent = models.SingleItem.objects.create(sku=self.sku, uid_id="223456789")
+            created.append(concurrent)
+            return polymorphic_bulk_create(model, objs)
+
+        created = []
+        data = [{"uid": code, "sku": "123"} for code in ["123456789", "223456789", "323456789"]]
+        with patch("base_models.base_view_classes.api.polymorphic_bulk_create", create_concurrently):
+            results = self.postData(reverse("test:basic_single_item_bulk"), data, status_code_check=200)
+
+        self.assertIn("non_field_errors", results[0]["errors"])
+        self.assertEqual(results[1]["id"], created[0].pk)
+        self.assertEqual(results[2]["id"], models.SingleItem.objects.get(uid="323456789").pk)
@@ -0,0 +1,112 @@
+import json
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import RequestFactory
+
+from core.models import Machine, Operator, Sku, UniqueID, WorkOrder
+from core.tests.api_test_case import APITestCase
+from projects.hemera.models import HemeraGreaseEvent
+from .. import models
+
+
+class TestEventCube(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.curing = Machine.objects.create(hostname="curing", name="curing", production_step="Curing")
+        self.greasing = Machine.objects.create(hostname="greasing", name="greasing", production_step="Greasing")
+        self.operator = Operator.objects.create(code="123", name="operator")
+        self.work_order = WorkOrder.objects.create(code="E3D-WO-123")
+        self.item = models.SingleItem.objects.create(
+            sku=Sku.objects.create(code="V7-24V"),
+            uid=UniqueID.objects.create(code="123456789"),
+        )
+        self.start = datetime(2022, 9, 1, 10)
+        self.user = User.objects.create_user("user")
+
+    def create_event(self, machine, minutes, seconds_taken=None, event_class=models.Event, **kwargs):
+        event = event_class.objects.create(
+            item=self.item, machine=machine, operator=self.operator, work_order=self.work_order,
+            date_created=self.start + timedelta(minutes=minutes), completed=seconds_taken is not None, **kwargs
+        )
+        if seconds_taken is not None:
+            finished = event.date_created + timedelta(seconds=seconds_taken)
+            event_class.objects.filter(pk=event.pk).update(date_updated=finished)
+        return event
+
+    def get_cube(self, params, event_class=models.Event):
+        request = RequestFactory().get("/", params)
+        request.user = self.user
+        response = event_class.generate_cube_view("test").as_view()(request)
+        return response.status_code, json.loads(response.content)
+
+
+    def test_dimensions_and_measures(self):
+        self.create_event(self.curing, 0, seconds_taken=10)
+        self.create_event(self.curing, 5, seconds_taken=30, failed=True, fail_state="Too hot")
+        self.create_event(self.curing, 70)
+        self.create_event(self.greasing, 0, seconds_taken=20, event_class=HemeraGreaseEvent)
+
+        with self.assertNumQueries(1):
+            status, cube = self.get_cube({"dimensions": ["machine", "production_step"]})
+
+        self.assertEqual(status, 200)
+        # Dimensions come back in a fixed order.
+        self.assertEqual(cube["dimensions"], ["production_step", "machine"])
+        curing, greasing = cube["rows"]
+        self.assertEqual(curing["machine"], "curing")
+        self.assertEqual(curing["events"], 3)
+        self.assertEqual(curing["completed"], 2)
+        self.assertEqual(curing["failed"], 1)
+        self.assertEqual(curing["failure_rate"], 1 / 3)
+        self.assertEqual(curing["duration_p50"], 20)
+        self.assertEqual(greasing["events"], 1)
+        self.assertEqual(greasing["duration_p99"], 20)
+        self.assertFalse(cube["truncated"])
+
+
+    def test_buckets_and_projects(self):
+        self.create_event(self.curing, 0)
+        self.create_event(self.curing, 70)
+        self.create_event(self.greasing, 0, event_class=HemeraGreaseEvent)
+
+        _, cube = self.get_cube({"dimensions": "project", "bucket": "hour"})
+        self.assertEqual(
+            [(row["project"], row["period"], row["events"]) for row in cube["rows"]],
+            [
+                ("event", "2022-09-01T10:00:00", 1),
+                ("event", "2022-09-01T11:00:00", 1),
+                ("hemera_grease_dispenser", "2022-09-01T10:00:00", 1),
+            ]
+        )
+
+        # Subclasses only count their own Events.
+        _, cube = self.get_cube({}, event_class=HemeraGreaseEvent)
+        self.assertEqual(cube["rows"][0]["events"], 1)
+        self.assertIsNone(cube["rows"][0]["duration_p50"])
+
+
+    def test_search_filters(self):
+        self.create_event(self.curing, 0, seconds_taken=10, failed=True, fail_state="Too hot")
+        self.create_event(self.greasing, 0, seconds_taken=10)
+
+        _, cube = self.get_cube({"production_step": "Curing", "fail_state": "Too hot", "to_date": "01/09/2022"})
+        self.assertEqual(cube["rows"][0]["events"], 1)
+
+        status, cube = self.get_cube({"dimensions": "colour", "bucket": "fortnight"})
+        self.assertEqual(status, 400)
+        self.assertEqual(set(cube["errors"]), {"dimensions", "bucket"})
+
+
+    def test_cached_by_normalised_query(self):
+        self.create_event(self.curing, 0)
+        _, first = self.get_cube({"dimensions": ["sku", "machine"], "item_sku": ""})
+
+        self.create_event(self.curing, 5)
+        with self.assertNumQueries(0):
+            # The same query, written differently.
+            _, second = self.get_cube({"dimensions": ["machine", "sku"]})
+
+        self.assertEqual(second, first)
+        self.assertEqual(second["rows"][0]["events"], 1)
@@ -0,0 +1,93 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count
+
+from core.models import Machine, Operator, Sku, UniqueID, WorkOrder
+from core.tests.api_test_case import APITestCase
+from projects.hemera.models import HemeraGreaseEvent
+from .. import models
+from ..polymorphic_bulk_create import polymorphic_bulk_create
+
+
+class TestFailStateCounts(APITestCase):
+    def setUp(self):
+        self.machine = Machine.objects.create(hostname="123", name="machine")
+        self.operator = Operator.objects.create(code="123", name="operator")
+        self.work_order = WorkOrder.objects.create(code="E3D-WO-123")
+        self.item = models.SingleItem.objects.create(
+            sku=Sku.objects.create(code="123"),
+            uid=UniqueID.objects.create(code="123456789"),
+        )
+
+    def new_event(self, event_class=models.Event, **kwargs):
+        return event_class(
+            item=self.item, machine=self.machine, operator=self.operator, work_order=self.work_order, **kwargs
+        )
+
+    def assertCountsMatchEvents(self):
+        """Check the catalogue against a full count of the Events, ignoring states with no Events left."""
+        expected = {
+            (row["polymorphic_ctype"], row["fail_state"]): row["count"]
+            for row in models.Event.objects.non_polymorphic().order_by()
+            .values("polymorphic_ctype", "fail_state").annotate(count=Count("id"))
+        }
+        actual = {
+            (row.polymorphic_ctype_id, row.fail_state): row.count
+            for row in models.FailStateCount.objects.filter(count__gt=0)
+        }
+        self.assertEqual(actual, expected)
+
+
+    def test_every_kind_of_write_is_counted(self):
+        event = self.new_event(failed=True, fail_state="Too hot")
+        event.save()
+        self.assertEqual(models.Event.get_fail_state_counts(), {"Too hot": 1})
+
+        events = polymorphic_bulk_create(models.Event, [self.new_event() for _ in range(3)])
+        polymorphic_bulk_create(HemeraGreaseEvent, [self.new_event(HemeraGreaseEvent, failed=True)])
+        self.assertCountsMatchEvents()
+
+        events[0].fail_state = "Too cold"
+        models.Event.objects.bulk_update(events[:2], ["fail_state"])
+        self.assertCountsMatchEvents()
+
+        models.Event.objects.filter(pk=events[1].pk).update(fail_state="Too hot")
+        # Updates that don't change the fail state leave the counts alone.
+        models.Event.objects.update(completed=True)
+        self.assertCountsMatchEvents()
+
+        event.delete()
+        models.Event.objects.filter(pk=events[2].pk).delete()
+        self.assertCountsMatchEvents()
+        self.assertEqual(models.Event.get_fail_state_counts(), {"None": 1, "Too cold": 1, "Too hot": 1})
+
+
+    def test_fail_states_per_class(self):
+        self.new_event(failed=True, fail_state="Too hot").save()
+        self.new_event(HemeraGreaseEvent, failed=True).save()
+        self.new_event(HemeraGreaseEvent, failed=True).save()
+
+        # The base class includes every subclass, but subclasses only get their own.
+        self.assertEqual(models.Event.get_fail_state_counts(), {"Unknown": 2, "Too hot": 1})
+        self.assertEqual(HemeraGreaseEvent.get_fail_state_counts(), {"Unknown": 2})
+
+        # Warm up the ContentType cache, so only the catalogue query is counted.
+        HemeraGreaseEvent.get_polymorphic_ctype_ids()
+        with self.assertNumQueries(1):
+            self.assertEqual(list(HemeraGreaseEvent.get_fail_states()), [("Unknown", "Unknown")])
+
+
+    def test_search_form_choices(self):
+        self.new_event(failed=True, fail_state="Too hot").save()
+        form = models.Event.generate_search_form()()
+        self.assertEqual(list(form.fields["fail_state"].choices), [("Too hot", "Too hot")])
+
+
+    def test_rebuild(self):
+        self.new_event(failed=True, fail_state="Too hot").save()
+        models.FailStateCount.objects.update(count=100)
+        models.FailStateCount.objects.create(
+            polymorphic_ctype=ContentType.objects.get_for_model(models.Event), fail_state="Stale", count=5
+        )
+
+        self.assertEqual(models.FailStateCount.rebuild(), 1)
+        self.assertCountsMatchEvents()
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from rest_framework.test import APIRequestFactory
+
+from core.models import Machine, Operator, Sku, UniqueID, WorkOrder
+from core.tests.api_test_case import APITestCase
+from .. import models
+from ..views.api import GetFailStatePareto
+
+
+class TestFailStatePareto(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.machines = [
+            Machine.objects.create(hostname=F"machine-{i}", name=F"machine {i}", production_step="Curing")
+            for i in range(2)
+        ]
+        self.operator = Operator.objects.create(code="123", name="operator")
+        self.work_order = WorkOrder.objects.create(code="E3D-WO-123")
+        self.item = models.SingleItem.objects.create(
+            sku=Sku.objects.create(code="V7-24V"),
+            uid=UniqueID.objects.create(code="123456789"),
+        )
+        # An eight hour shift, and the shift before it.
+        self.shift = {"start": "2022-09-01T06:00:00", "end": "2022-09-01T14:00:00"}
+        self.factory = APIRequestFactory()
+
+    def create_event(self, hours, fail_state=None, machine=0):
+        return models.Event.objects.create(
+            item=self.item, machine=self.machines[machine], operator=self.operator, work_order=self.work_order,
+            date_created=datetime(2022, 9, 1, 6) + timedelta(hours=hours),
+            failed=fail_state is not None, fail_state=fail_state or "None", completed=True,
+        )
+
+    def get_pareto(self, params):
+        return GetFailStatePareto.as_view()(self.factory.get("/", params))
+
+
+    def test_ranking(self):
+        for fail_state in ["Too hot", "Too hot", "Too hot", "Leak", None]:
+            self.create_event(1, fail_state)
+        # The previous shift.
+        for fail_state in ["Leak", "Leak", "Too cold"]:
+            self.create_event(-2, fail_state)
+        # Outside both shifts, and on another machine.
+        self.create_event(-9, "Too hot")
+        self.create_event(1, "Leak", machine=1)
+
+        response = self.get_pareto({**self.shift, "machine": "machine-0"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["compare_window"]["start"], datetime(2022, 8, 31, 22))
+        self.assertEqual(response.data["total"], 4)
+        self.assertEqual(response.data["compare_total"], 3)
+        self.assertEqual(
+            [
+                (row["fail_state"], row["count"], row["cumulative_percentage"], row["compare_count"], row["compare_rank"])
+                for row in response.data["fail_states"]
+            ],
+            [
+                ("Too hot", 3, 75, 0, None),
+                ("Leak", 1, 100, 2, 1),
+                ("Too cold", 0, 100, 1, 2),
+            ]
+        )
+
+
+    def test_explicit_comparison_window(self):
+        self.create_event(1, "Too hot")
+        self.create_event(-24, "Too hot")
+
+        response = self.get_pareto({
+            **self.shift, "compare_start": "2022-08-31T06:00:00", "compare_end": "2022-08-31T14:00:00",
+        })
+        self.assertEqual(response.data["fail_states"][0]["compare_count"], 1)
+
+
+    def test_cached_until_events_change(self):
+        self.create_event(1, "Too hot")
+        # Saved a while ago, so it's clearly older than the Pareto.
+        models.Event.objects.update(date_updated=datetime.now() - timedelta(hours=1))
+        params = {**self.shift, "machine": "machine-0"}
+        self.get_pareto(params)
+
+        # Checking the cached Pareto only takes a look for Events in scope saved since, rather than a count.
+        with self.assertNumQueries(1):
+            response = self.get_pareto(params)
+        self.assertEqual(response.data["total"], 1)
+
+        # New Events outside the scope don't affect it.
+        self.create_event(2, "Leak", machine=1)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_pareto(params).data["total"], 1)
+
+        # A new Event in scope is picked up straight away.
+        self.create_event(2, "Leak")
+        self.assertEqual(self.get_pareto(params).data["total"], 2)
+
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.get_pareto({}).status_code, 400)
+        self.assertEqual(self.get_pareto({"start": "yesterday", "end": "2022-09-01"}).status_code, 400)
+        self.assertEqual(self.get_pareto({"start": "2022-09-02", "end": "2022-09-01"}).status_code, 400)
+        self.assertEqual(self.get_pareto({**self.shift, "compare_start": "2022-08-31"}).status_code, 400)
+
+        # Dates are midnight at the start of the day.
+        response = self.get_pareto({"start": "2022-09-01", "end": "2022-09-02"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["compare_window"]["start"], datetime(2022, 8, 31))
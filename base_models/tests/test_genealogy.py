@@ -0,0 +1,119 @@
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+
+from core.models import Machine, Operator, Sku, UniqueID, WorkOrder
+from core.tests.api_test_case import APITestCase
+from .. import models
+from ..genealogy import get_components, get_where_used
+from ..views.api import GetItemComponents, GetItemWhereUsed
+
+
+class TestGenealogy(APITestCase):
+    def setUp(self):
+        self.machine = Machine.objects.create(hostname="123", name="machine", production_step="Curing")
+        self.operator = Operator.objects.create(code="123", name="operator")
+        self.work_order = WorkOrder.objects.create(code="E3D-WO-123")
+        self.sku = Sku.objects.create(code="V7-24V")
+
+        # A BulkItem of heaters goes into a heater core and straight into a hotend, and has a nozzle made from it.
+        # The heater core goes into another hotend, as does the nozzle.
+        self.heaters = models.BulkItem.objects.create(sku=self.sku, work_order=self.work_order)
+        self.sensor = self.create_single("123456780")
+        self.core = self.create_single("123456781", contains=[self.heaters, self.sensor])
+        self.hotend = self.create_single("123456782", contains=[self.core])
+        self.other_hotend = self.create_single("123456783", contains=[self.heaters])
+        self.nozzle = self.create_single("123456784", from_bulk=self.heaters)
+        self.nozzle_hotend = self.create_single("123456785", contains=[self.nozzle])
+        self.factory = APIRequestFactory()
+
+    def create_single(self, uid, contains=(), **kwargs):
+        item = models.SingleItem.objects.create(sku=self.sku, uid=UniqueID.objects.create(code=uid), **kwargs)
+        item.contains.set(contains)
+        return item
+
+    def create_event(self, item, **kwargs):
+        return models.Event.objects.create(
+            item=item, machine=self.machine, operator=self.operator, work_order=self.work_order, **kwargs
+        )
+
+    def get_nodes(self, genealogy):
+        return {node["pk"]: node for node in genealogy["nodes"]}
+
+
+    def test_components(self):
+        self.create_event(self.heaters, completed=True, failed=True, fail_state="Too hot")
+        self.create_event(self.heaters, completed=True)
+
+        with self.assertNumQueries(3):
+            genealogy = get_components(self.hotend.pk)
+
+        nodes = self.get_nodes(genealogy)
+        self.assertEqual(
+            {pk: node["depth"] for pk, node in nodes.items()},
+            {self.hotend.pk: 0, self.core.pk: 1, self.heaters.pk: 2, self.sensor.pk: 2},
+        )
+        self.assertEqual(nodes[self.sensor.pk]["uid"], "123456780")
+        self.assertEqual(nodes[self.heaters.pk]["work_order"], "E3D-WO-123")
+        self.assertEqual(nodes[self.heaters.pk]["events"]["fail_state"], {"Too hot": 1, "None": 1})
+        self.assertEqual(nodes[self.sensor.pk]["events"]["events"], 0)
+        self.assertIn({"parent": self.core.pk, "child": self.heaters.pk, "relation": "contains"}, genealogy["edges"])
+        self.assertFalse(genealogy["truncated"])
+
+        # Items made from a BulkItem are traced back to it.
+        nodes = self.get_nodes(get_components(self.nozzle_hotend.pk))
+        self.assertEqual(nodes[self.heaters.pk]["depth"], 2)
+
+
+    def test_where_used(self):
+        with self.assertNumQueries(3):
+            genealogy = get_where_used([self.heaters.pk])
+
+        nodes = self.get_nodes(genealogy)
+        self.assertEqual(
+            {pk: node["depth"] for pk, node in nodes.items()},
+            {
+                self.heaters.pk: 0,
+                self.core.pk: 1, self.other_hotend.pk: 1, self.nozzle.pk: 1,
+                self.hotend.pk: 2, self.nozzle_hotend.pk: 2,
+            },
+        )
+        self.assertEqual(
+            {pk for pk, node in nodes.items() if node["finished"]},
+            {self.hotend.pk, self.other_hotend.pk, self.nozzle_hotend.pk},
+        )
+        self.assertIn(
+            {"parent": self.nozzle.pk, "child": self.heaters.pk, "relation": "from_bulk"}, genealogy["edges"]
+        )
+
+
+    def test_cycles_and_limits(self):
+        # Shouldn't happen, but mustn't hang either.
+        self.core.contains.add(self.hotend)
+        nodes = self.get_nodes(get_components(self.hotend.pk))
+        self.assertEqual(nodes[self.core.pk]["depth"], 1)
+        self.assertEqual(nodes[self.hotend.pk]["depth"], 0)
+
+        with override_settings(MAX_GENEALOGY_EDGES=2):
+            genealogy = get_where_used([self.heaters.pk])
+        self.assertTrue(genealogy["truncated"])
+        self.assertEqual(len(genealogy["edges"]), 2)
+
+
+    def test_api(self):
+        response = GetItemComponents.as_view()(self.factory.get("/", {"uid": "123456781"}))
+        self.assertEqual(len(response.data["nodes"]), 3)
+
+        view = GetItemWhereUsed.as_view()
+        response = view(self.factory.get("/", {"item": self.sensor.pk}))
+        self.assertEqual([node["pk"] for node in response.data["nodes"]], [self.sensor.pk, self.core.pk, self.hotend.pk])
+
+        # Everything made under a work order: its BulkItems, and items with Events in it.
+        self.create_event(self.sensor)
+        response = view(self.factory.get("/", {"work_order": "E3D-WO-123"}))
+        finished = {node["pk"] for node in response.data["nodes"] if node["finished"]}
+        self.assertEqual(finished, {self.hotend.pk, self.other_hotend.pk, self.nozzle_hotend.pk})
+
+        self.assertEqual(view(self.factory.get("/")).status_code, 400)
+        self.assertEqual(view(self.factory.get("/", {"uid": "999999999"})).status_code, 400)
+        self.assertEqual(view(self.factory.get("/", {"item": "abc"})).status_code, 400)
+        self.assertEqual(view(self.factory.get("/", {"work_order": "E3D-WO-999"})).status_code, 400)
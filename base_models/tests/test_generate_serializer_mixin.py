@@ -0,0 +1,31 @@
+from django.test import SimpleTestCase
+
+from core.models import UniqueID, WorkOrder
+from ..models import BulkItem
+
+
+class TestGenerateSerializerMixin(SimpleTestCase):
+    def test_serializers_are_memoized(self):
+        self.assertIs(UniqueID.generate_serializer_class(), UniqueID.generate_serializer_class())
+        self.assertIs(
+            UniqueID.generate_serializer_class(exclude=["code"]),
+            UniqueID.generate_serializer_class(exclude=("code",)),
+        )
+        self.assertIs(UniqueID.generate_non_unique_serializer("code"), UniqueID.generate_non_unique_serializer("code"))
+        self.assertIs(
+            UniqueID.generate_get_or_create_serializers("code"),
+            UniqueID.generate_get_or_create_serializers("code"),
+        )
+        self.assertIs(BulkItem.generate_serializer_class(), BulkItem.generate_serializer_class())
+
+
+    def test_memoized_per_model_and_arguments(self):
+        self.assertIsNot(UniqueID.generate_serializer_class(), WorkOrder.generate_serializer_class())
+        self.assertIsNot(UniqueID.generate_serializer_class(), UniqueID.generate_serializer_class(exclude=["code"]))
+        self.assertEqual(UniqueID.generate_serializer_class(exclude=["code"]).Meta.exclude, ["code"])
+
+
+    def test_subclass_override_is_kept(self):
+        """BulkItem's override adds a field on top of the base serializer; both are cached separately."""
+        self.assertIn("quantity_succeeded", BulkItem.generate_serializer_class()().fields)
+        self.assertIn("quantity_succeeded", BulkItem.generate_serializer_class()().fields)
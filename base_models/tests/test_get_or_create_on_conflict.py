@@ -0,0 +1,115 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+
+from django.db import DataError, IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIRequestFactory
+
+from core.models import IdempotencyKey, Sku, UniqueID, WorkOrder
+from core.utils import get_or_create_on_conflict
+from core.views.api import GetOrCreateUniqueID, GetOrCreateWorkOrder
+from .. import models
+
+
+class TestGetOrCreateOnConflict(TestCase):
+    def setUp(self):
+        self.sku = Sku.objects.create(code="123")
+        self.uid = UniqueID.objects.create(code="123456789")
+
+
+    def test_single_table(self):
+        work_order, created = get_or_create_on_conflict(WorkOrder, {"code": "E3D-WO-123"})
+        self.assertTrue(created)
+        self.assertIsNotNone(WorkOrder.objects.get(code="E3D-WO-123").date_created)
+
+        same, created = get_or_create_on_conflict(WorkOrder, {"code": "E3D-WO-123"}, defaults={"is_test_data": True})
+        self.assertFalse(created)
+        self.assertEqual(same.pk, work_order.pk)
+        self.assertFalse(same.is_test_data)
+
+
+    def test_unique_id_schemas_filled_in(self):
+        uid, created = get_or_create_on_conflict(UniqueID, {"code": "020122-AC12"})
+        self.assertTrue(created)
+        self.assertEqual(UniqueID.objects.get(code="020122-AC12").matches_schemas, ["V7_SERIAL"])
+
+
+    def test_inherited_model(self):
+        item, created = get_or_create_on_conflict(models.SingleItem, {"uid": self.uid, "sku": self.sku})
+        self.assertTrue(created)
+        self.assertEqual(models.AnyItem.objects.get().pk, item.pk)
+        self.assertEqual(models.SingleItem.objects.get().pk, item.pk)
+
+        same, created = get_or_create_on_conflict(models.SingleItem, {"uid": self.uid, "sku": self.sku})
+        self.assertFalse(created)
+        self.assertEqual(same.pk, item.pk)
+
+
+    def test_inherited_model_clash(self):
+        """A clash on the child table leaves no orphaned parent row behind."""
+        models.SingleItem.objects.create(uid=self.uid, sku=self.sku)
+        other_sku = Sku.objects.create(code="456")
+
+        with self.assertRaises(IntegrityError):
+            get_or_create_on_conflict(models.SingleItem, {"uid": self.uid, "sku": other_sku})
+        self.assertEqual(models.AnyItem.objects.count(), 1)
+
+
+    def test_failed_insert_leaves_transaction_usable(self):
+        """A failed INSERT only rolls back its own savepoint, so a surrounding transaction can still be used."""
+        with transaction.atomic():
+            with self.assertRaises(DataError):
+                get_or_create_on_conflict(IdempotencyKey, {"key": "key"}, defaults={"status_code": 100000})
+            self.assertEqual(IdempotencyKey.objects.count(), 0)
+
+
+class TestConcurrentGetOrCreate(TransactionTestCase):
+    thread_count = 8
+
+    def setUp(self):
+        Sku.objects.create(code="123")
+        WorkOrder.objects.create(code="E3D-WO-123")
+        UniqueID.objects.create(code="123456789")
+
+    def run_concurrently(self, view, data):
+        """Send the same get-or-create request from several threads at once, and return the responses."""
+        barrier = Barrier(self.thread_count)
+        factory = APIRequestFactory()
+
+        def post(_):
+            try:
+                request = factory.post("/", data, format="json")
+                barrier.wait()
+                return view(request)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.thread_count) as executor:
+            responses = list(executor.map(post, range(self.thread_count)))
+
+        self.assertEqual(sorted(r.status_code for r in responses), [200] * (self.thread_count - 1) + [201])
+        self.assertEqual(len({str(r.data) for r in responses}), 1)
+        return responses
+
+
+    def test_work_order(self):
+        self.run_concurrently(GetOrCreateWorkOrder.as_view(), {"code": "E3D-WO-456"})
+        self.assertEqual(WorkOrder.objects.filter(code="E3D-WO-456").count(), 1)
+
+
+    def test_unique_id(self):
+        self.run_concurrently(GetOrCreateUniqueID.as_view(), {"code": "020122-AC12"})
+        self.assertEqual(UniqueID.objects.filter(code="020122-AC12").count(), 1)
+
+
+    def test_single_item(self):
+        view = models.SingleItem.generate_lookup_view().as_view()
+        self.run_concurrently(view, {"uid": "123456789", "sku": "123"})
+        self.assertEqual(models.SingleItem.objects.count(), 1)
+        self.assertEqual(models.AnyItem.objects.count(), 1)
+
+
+    def test_bulk_item(self):
+        view = models.BulkItem.generate_lookup_view().as_view()
+        self.run_concurrently(view, {"work_order": "E3D-WO-123", "sku": "123"})
+        self.assertEqual(models.BulkItem.objects.count(), 1)
@@ -0,0 +1,140 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from threading import Barrier
+
+from django.conf import settings
+from django.db import connection
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient
+
+from core.models import IdempotencyKey, Machine, Operator, Sku, UniqueID, WorkOrder
+from core.tests.api_test_case import APITestCase
+from core.utils import reverse
+from .. import models
+
+
+class TestIdempotencyKeys(APITestCase):
+    def setUp(self):
+        self.machine = Machine.objects.create(hostname="123", name="machine")
+        self.operator = Operator.objects.create(code="123", name="operator")
+        self.work_order = WorkOrder.objects.create(code="E3D-WO-123")
+        self.item = models.SingleItem.objects.create(
+            sku=Sku.objects.create(code="123"),
+            uid=UniqueID.objects.create(code="123456789"),
+        )
+        self.start_data = {
+            "machine": self.machine.hostname,
+            "operator": self.operator.code,
+            "work_order": self.work_order.code,
+            "item": self.item.pk,
+        }
+
+    def post_with_key(self, url, data, key):
+        return self.api.post(url, data, format="json", HTTP_IDEMPOTENCY_KEY=key)
+
+
+    def test_repeated_start_is_replayed(self):
+        url = reverse("test:basic_single_start")
+        first = self.post_with_key(url, self.start_data, "key-1")
+        second = self.post_with_key(url, self.start_data, "key-1")
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertFalse(first.has_header("Idempotent-Replayed"))
+        self.assertEqual(models.Event.objects.count(), 1)
+
+        # A different key is a different request.
+        self.post_with_key(url, self.start_data, "key-2")
+        self.assertEqual(models.Event.objects.count(), 2)
+
+
+    def test_repeated_finish_is_replayed(self):
+        event = models.Event.objects.create(
+            machine=self.machine, operator=self.operator, work_order=self.work_order, item=self.item
+        )
+        url = reverse("test:basic_single_finish", pk=event.pk)
+
+        first = self.api.put(url, {"log_timepoints": [0, 1, 2]}, format="json", HTTP_IDEMPOTENCY_KEY="finish")
+        # The replay doesn't look at the data at all - not even to validate it.
+        second = self.api.put(url, {"log_timepoints": "invalid"}, format="json", HTTP_IDEMPOTENCY_KEY="finish")
+
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.content, first.content)
+        event.refresh_from_db()
+        self.assertEqual(event.log_timepoints, [0, 1, 2])
+
+
+    def test_client_errors_are_stored(self):
+        url = reverse("test:basic_single_start")
+        first = self.post_with_key(url, {}, "key")
+        second = self.post_with_key(url, self.start_data, "key")
+
+        self.assertEqual(first.status_code, 400)
+        self.assertEqual(second.status_code, 400)
+        self.assertEqual(models.Event.objects.count(), 0)
+
+
+    def test_key_reused_for_a_different_request(self):
+        self.post_with_key(reverse("test:basic_single_start"), self.start_data, "key")
+
+        response = self.post_with_key(reverse("test:basic_bulk_start"), self.start_data, "key")
+        self.assertEqual(response.status_code, 400)
+        self.assertErrorResponseContains(response, "already been used")
+        self.assertEqual(models.Event.objects.count(), 1)
+
+
+    def test_requests_without_a_key(self):
+        url = reverse("test:basic_single_start")
+        self.postData(url, self.start_data, status_code_check=201)
+        self.postData(url, self.start_data, status_code_check=201)
+
+        self.assertEqual(models.Event.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 0)
+
+
+    def test_delete_expired(self):
+        old, new = [
+            IdempotencyKey.objects.create(key=key, method="POST", path="/", status_code=201)
+            for key in ["old", "new"]
+        ]
+        IdempotencyKey.objects.filter(pk=old.pk).update(
+            date_created=datetime.now() - settings.IDEMPOTENCY_KEY_TTL - timedelta(minutes=1)
+        )
+
+        self.assertEqual(IdempotencyKey.delete_expired(batch_size=1), 1)
+        self.assertEqual(list(IdempotencyKey.objects.all()), [new])
+
+
+class TestConcurrentIdempotencyKeys(TransactionTestCase):
+    def test_concurrent_retries(self):
+        """Send the same request several times at once, and check it's only processed once."""
+        machine = Machine.objects.create(hostname="123", name="machine")
+        operator = Operator.objects.create(code="123", name="operator")
+        work_order = WorkOrder.objects.create(code="E3D-WO-123")
+        item = models.SingleItem.objects.create(
+            sku=Sku.objects.create(code="123"),
+            uid=UniqueID.objects.create(code="123456789"),
+        )
+        data = {"machine": machine.hostname, "operator": operator.code, "work_order": work_order.code, "item": item.pk}
+
+        thread_count = 5
+        barrier = Barrier(thread_count)
+        url = reverse("test:basic_single_start")
+
+        def start(_):
+            try:
+                client = APIClient()
+                barrier.wait()
+                response = client.post(url, data, format="json", HTTP_IDEMPOTENCY_KEY="key")
+                return response.status_code, response.content
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=thread_count) as executor:
+            responses = list(executor.map(start, range(thread_count)))
+
+        self.assertEqual(len(set(responses)), 1)
+        self.assertEqual(responses[0][0], 201)
+        self.assertEqual(models.Event.objects.count(), 1)
@@ -91,3 +91,51 @@ class TestBulkItem(APITestCase):
 
         self.assertEqual(models.BulkItem.objects.count(), 1)
         self.assertEqual(response_data["quantity_succeeded"], 1)
+
+
+    def test_annotate_event_counts(self):
+        items = [
+            models.BulkItem.objects.create(work_order=self.work_order, sku=Sku.objects.create(code=code))
+            for code in ["456", "789"]
+        ]
+        for completed, failed, fail_state in [(True, False, "None"), (True, True, "Leak"), (True, True, "Leak"),
+                                              (False, True, "Open circuit")]:
+            models.Event.objects.create(
+                machine=self.machine,
+                operator=self.operator,
+                work_order=self.work_order,
+                item=items[0],
+                completed=completed,
+                failed=failed,
+                fail_state=fail_state,
+            )
+
+        with self.assertNumQueries(1):
+            annotated = list(models.BulkItem.annotate_event_counts(
+                models.BulkItem.objects.filter(pk__in=[item.pk for item in items]).order_by("pk"),
+                fail_states=True,
+            ))
+            data = models.BulkItem.generate_serializer_class()(annotated, many=True).data
+
+        self.assertEqual([d["quantity_succeeded"] for d in data], [1, 0])
+        self.assertEqual([d["fail_state_counts"] for d in data], [{"Leak": 2, "Open circuit": 1}, {}])
+
+
+    def test_bulk_lookup_fail_states(self):
+        item = models.BulkItem.objects.create(work_order=self.work_order, sku=self.sku)
+        models.Event.objects.create(
+            machine=self.machine,
+            operator=self.operator,
+            work_order=self.work_order,
+            item=item,
+            completed=True,
+            failed=True,
+            fail_state="Leak",
+        )
+
+        url = reverse("test:basic_bulk_item_bulk") + "?fail_states=true"
+        data = [{"work_order": "E3D-WO-123", "sku": "123"}]
+        response_data = self.postData(url, data, status_code_check=200)
+
+        self.assertEqual(response_data[0]["quantity_succeeded"], 0)
+        self.assertEqual(response_data[0]["fail_state_counts"], {"Leak": 1})
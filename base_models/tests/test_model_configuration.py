@@ -58,3 +58,44 @@ class TestConfiguration(APITestCase):
                 "has_configuration": False,
             },
         ])
+
+
+    def test_conditional_get(self):
+        config = HemeraGreaseConfig.objects.create(sku=self.sku)
+
+        response = self.api.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        # The same version gets an empty 304, using only the version lookup query.
+        with self.assertNumQueries(1):
+            response = self.api.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+        # Saving the configuration changes its ETag.
+        config.save()
+        response = self.api.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.data["version"], 2)
+
+
+    def test_cached_response(self):
+        HemeraGreaseConfig.objects.create(sku=self.sku)
+        self.getData(self.url, status_code_check=200)
+
+        # Only the version is checked; the configuration itself comes from the cache.
+        with self.assertNumQueries(1):
+            response_data = self.getData(self.url, status_code_check=200)
+        self.assertEqual(response_data["sku"], "123")
+
+
+    def test_cache_not_reused_after_delete(self):
+        config = HemeraGreaseConfig.objects.create(sku=self.sku)
+        self.getData(self.url, status_code_check=200)
+        config.delete()
+        self.getData(self.url, status_code_check=404)
+
+        new_config = HemeraGreaseConfig.objects.create(sku=self.sku)
+        self.assertEqual(self.getData(self.url, status_code_check=200)["id"], new_config.pk)
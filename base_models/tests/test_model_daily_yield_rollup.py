@@ -0,0 +1,142 @@
+from datetime import date, datetime, timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+
+from core.models import Machine, Operator, Sku, UniqueID, WorkOrder
+from core.tests.api_test_case import APITestCase
+from core.utils import reverse
+from .. import models
+from ..views.api import GetDailyYieldRollup
+
+
+class TestDailyYieldRollup(APITestCase):
+    def setUp(self):
+        self.machine = Machine.objects.create(hostname="123", name="machine", production_step="Curing")
+        self.operator = Operator.objects.create(code="123", name="operator")
+        self.work_orders = [WorkOrder.objects.create(code=F"E3D-WO-12{i}") for i in range(2)]
+        self.sku = Sku.objects.create(code="V7-24V")
+        self.items = [
+            models.SingleItem.objects.create(sku=self.sku, uid=UniqueID.objects.create(code=F"12345678{i}"))
+            for i in range(3)
+        ]
+        self.day = datetime(2022, 9, 1, 10)
+
+    def create_event(self, item, days, work_order=0, **kwargs):
+        return models.Event.objects.create(
+            machine=self.machine,
+            operator=self.operator,
+            work_order=self.work_orders[work_order],
+            item=self.items[item],
+            date_created=self.day + timedelta(days=days),
+            **kwargs
+        )
+
+    def get_rollup(self, days, work_order=0):
+        return models.DailyYieldRollup.objects.get(
+            day=(self.day + timedelta(days=days)).date(), work_order=self.work_orders[work_order]
+        )
+
+
+    def test_first_attempts(self):
+        # Fails first time, and passes the next day. Both attempts are counted on the first day.
+        self.create_event(0, 0, completed=True, failed=True, fail_state="Too hot")
+        self.create_event(0, 1, completed=True)
+        # Passes first time.
+        self.create_event(1, 0, completed=True)
+        # Starts the next day, on a different work order, and is still running.
+        self.create_event(2, 1, work_order=1)
+
+        self.assertEqual(models.DailyYieldRollup.update_incrementally(), 2)
+
+        first_day = self.get_rollup(0)
+        self.assertEqual(first_day.sku, self.sku)
+        self.assertEqual(first_day.production_step, "Curing")
+        self.assertEqual(first_day.items, 2)
+        self.assertEqual(first_day.first_pass_passed, 1)
+        self.assertEqual(first_day.first_pass_failed, 1)
+        self.assertEqual(first_day.final_passed, 2)
+        self.assertEqual(first_day.retests, 1)
+        self.assertEqual(first_day.fail_states, {"Too hot": 1})
+
+        second_day = self.get_rollup(1, work_order=1)
+        self.assertEqual(second_day.items, 1)
+        self.assertEqual(second_day.first_pass_passed + second_day.first_pass_failed, 0)
+        self.assertEqual(models.DailyYieldRollup.objects.count(), 2)
+
+
+    def test_retests_update_the_first_day(self):
+        self.create_event(0, 0, completed=True, failed=True)
+        models.DailyYieldRollup.update_incrementally()
+        self.assertEqual(self.get_rollup(0).final_passed, 0)
+
+        self.create_event(0, 5, completed=True)
+        models.DailyYieldRollup.update_incrementally()
+
+        self.assertEqual(models.DailyYieldRollup.objects.count(), 1)
+        rollup = self.get_rollup(0)
+        self.assertEqual(rollup.items, 1)
+        self.assertEqual(rollup.final_passed, 1)
+        self.assertEqual(rollup.retests, 1)
+        self.assertEqual(rollup.fail_states, {"Unknown": 1})
+
+
+    def test_full_rebuild_after_deleting_a_first_attempt(self):
+        first = self.create_event(0, 0, completed=True, failed=True)
+        self.create_event(0, 2, completed=True)
+        models.Event.objects.update(date_updated=self.day + timedelta(days=2))
+        models.DailyYieldRollup.update_incrementally()
+
+        # The retest becomes the first attempt, but nothing the watermark can see has changed.
+        first.delete()
+        self.assertEqual(models.DailyYieldRollup.update_incrementally(), 0)
+
+        out = StringIO()
+        call_command("update_rollups", "--full", stdout=out)
+        self.assertIn("DailyYieldRollup: rebuilt 2 periods", out.getvalue())
+        self.assertEqual(models.DailyYieldRollup.objects.get().day, (self.day + timedelta(days=2)).date())
+
+
+    def test_api(self):
+        self.create_event(0, 0, completed=True, failed=True, fail_state="Too hot")
+        self.create_event(1, 0, completed=True)
+        self.create_event(2, 1, work_order=1, completed=True, failed=True, fail_state="Too cold")
+        models.DailyYieldRollup.update_incrementally()
+        view = GetDailyYieldRollup.as_view()
+        factory = APIRequestFactory()
+
+        response = view(factory.get("/", {"group_by": "sku"}))
+        self.assertEqual(response.data, [{
+            "sku": "V7-24V", "items": 3, "first_pass_passed": 1, "first_pass_failed": 2, "final_passed": 1,
+            "retests": 0, "fail_states": {"Too hot": 1, "Too cold": 1},
+            "first_pass_yield": 1 / 3, "final_yield": 1 / 3,
+        }])
+
+        response = view(factory.get("/", {"group_by": "work_order,day", "to_date": "2022-09-01"}))
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]["work_order"], "E3D-WO-120")
+        self.assertEqual(response.data[0]["day"], date(2022, 9, 1))
+        self.assertEqual(response.data[0]["first_pass_yield"], 0.5)
+
+        self.assertEqual(view(factory.get("/", {"group_by": "operator"})).status_code, 400)
+        self.assertEqual(view(factory.get("/", {"from_date": "yesterday"})).status_code, 400)
+
+
+    @override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+    def test_web_page(self):
+        # (The manifest that the production static files storage needs only exists after collectstatic.)
+        self.create_event(0, 0, completed=True)
+        models.DailyYieldRollup.update_incrementally()
+        url = reverse("yield_report")
+
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(User.objects.create_user("user"))
+        response = self.client.get(url, {"sku": "v7", "group_by": ["work_order"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["group_headings"], ["Work order"])
+        self.assertEqual(response.context["rows"][0]["group_values"], ["E3D-WO-120"])
+        self.assertContains(response, "100%")
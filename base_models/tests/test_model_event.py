@@ -1,6 +1,9 @@
+from datetime import date
+
 from core.models import Machine, Operator, Sku, UniqueID, WorkOrder
 from core.tests.api_test_case import APITestCase
 from core.utils import reverse
+from ..views.event_search_view import EventSearchView
 from .. import models
 
 
@@ -116,3 +119,27 @@ class TestEvent(APITestCase):
         # The id field has a nice name.
         self.assertNotIn("id", data)
         self.assertEqual(data["Database primary key"], event.pk)
+
+
+    def test_search_by_build_date(self):
+        v7_item = models.SingleItem.objects.create(
+            sku=self.item.sku,
+            uid=UniqueID.objects.create(code="020122-AC12"),
+        )
+        for item in [self.item, v7_item]:
+            models.Event.objects.create(
+                machine=self.machine,
+                operator=self.operator,
+                work_order=self.work_order,
+                item=item,
+            )
+
+        search_filter = EventSearchView().build_filter({
+            "built_from_date": date(2022, 1, 1),
+            "built_to_date": date(2022, 1, 7),
+        })
+        events = models.Event.objects.filter(search_filter)
+        self.assertEqual([event.item_id for event in events], [v7_item.pk])
+
+        search_filter = EventSearchView().build_filter({"built_from_date": date(2022, 1, 3)})
+        self.assertFalse(models.Event.objects.filter(search_filter).exists())
@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from core.models import Machine, MachineUsage, Operator, Sku, UniqueID, WorkOrder
+from core.tests.api_test_case import APITestCase
+from .. import models
+
+
+class TestHourlyMachineRollup(APITestCase):
+    def setUp(self):
+        self.machine = Machine.objects.create(hostname="123", name="machine", production_step="Curing")
+        self.operator = Operator.objects.create(code="123", name="operator")
+        self.work_order = WorkOrder.objects.create(code="E3D-WO-123")
+        self.item = models.SingleItem.objects.create(
+            sku=Sku.objects.create(code="123"),
+            uid=UniqueID.objects.create(code="123456789"),
+        )
+        self.hour = datetime(2022, 9, 1, 10)
+
+    def create_event(self, minutes, **kwargs):
+        return models.Event.objects.create(
+            machine=self.machine,
+            operator=self.operator,
+            work_order=self.work_order,
+            item=self.item,
+            date_created=self.hour + timedelta(minutes=minutes),
+            **kwargs
+        )
+
+
+    def test_event_counts(self):
+        self.create_event(5, completed=True)
+        self.create_event(10, completed=True, failed=True)
+        self.create_event(70)
+
+        models.HourlyMachineRollup.update_incrementally()
+
+        first_hour = models.HourlyMachineRollup.objects.get(hour=self.hour)
+        self.assertEqual(first_hour.production_step, "Curing")
+        self.assertEqual(first_hour.events_started, 2)
+        self.assertEqual(first_hour.events_completed, 2)
+        self.assertEqual(first_hour.events_failed, 1)
+
+        second_hour = models.HourlyMachineRollup.objects.get(hour=self.hour + timedelta(hours=1))
+        self.assertEqual(second_hour.events_started, 1)
+        self.assertEqual(second_hour.events_completed, 0)
+
+
+    def test_updates_are_not_double_counted(self):
+        event = self.create_event(5)
+        models.HourlyMachineRollup.update_incrementally()
+
+        event.completed = True
+        event.save()
+        models.HourlyMachineRollup.update_incrementally()
+
+        self.assertEqual(models.HourlyMachineRollup.objects.count(), 1)
+        rollup = models.HourlyMachineRollup.objects.get()
+        self.assertEqual(rollup.events_started, 1)
+        self.assertEqual(rollup.events_completed, 1)
+
+
+    def test_logged_in_seconds_split_across_hours(self):
+        MachineUsage.objects.create(
+            machine=self.machine,
+            operator=self.operator,
+            logged_in_at=self.hour + timedelta(minutes=30),
+            logged_out_at=self.hour + timedelta(minutes=75),
+        )
+
+        models.HourlyMachineRollup.update_incrementally()
+
+        rollups = models.HourlyMachineRollup.objects.order_by("hour")
+        self.assertEqual([r.logged_in_seconds for r in rollups], [30 * 60, 15 * 60])
+
+
+    def test_batches_move_the_watermark_forward(self):
+        for hours in [0, 2, 4]:
+            self.create_event(hours * 60)
+
+        # The first batch is kept, and the watermark moved past it, even though the second one fails.
+        rebuild_hours = models.HourlyMachineRollup.rebuild_hours
+        calls = []
+
+        def fail_second_batch(ranges):
+            calls.append(ranges)
+            if len(calls) == 2:
+                raise RuntimeError("Interrupted")
+            rebuild_hours(ranges)
+
+        with patch.object(models.HourlyMachineRollup, "rebuild_batch_size", 1), \
+                patch.object(models.HourlyMachineRollup, "rebuild_hours", fail_second_batch), \
+                self.assertRaises(RuntimeError):
+            models.HourlyMachineRollup.update_incrementally()
+
+        self.assertEqual(list(models.HourlyMachineRollup.objects.values_list("hour", flat=True)), [self.hour])
+        watermark = models.RollupWatermark.objects.get(name="HourlyMachineRollup")
+        self.assertEqual(watermark.value, self.hour + timedelta(hours=1))
+
+        self.assertEqual(models.HourlyMachineRollup.update_incrementally(), 3)
+        self.assertEqual(models.HourlyMachineRollup.objects.count(), 3)
+
+
+    def test_full_rebuild_removes_deleted_events(self):
+        self.create_event(0)
+        models.HourlyMachineRollup.update_incrementally()
+
+        # Deletions can't be seen by the watermark, only by rebuilding everything.
+        models.Event.objects.all().delete()
+        models.HourlyMachineRollup.update_incrementally()
+        self.assertEqual(models.HourlyMachineRollup.objects.count(), 1)
+
+        self.assertEqual(models.HourlyMachineRollup.update_incrementally(full=True), 1)
+        self.assertFalse(models.HourlyMachineRollup.objects.exists())
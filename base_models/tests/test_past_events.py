@@ -0,0 +1,103 @@
+from rest_framework.test import APIRequestFactory
+
+from core.models import Machine, Operator, Sku, UniqueID, WorkOrder
+from core.tests.api_test_case import APITestCase
+from projects.hemera.models import HemeraGreaseEvent
+from projects.hemera.views.api import GetPastEvents as GetHemeraPastEvents
+from projects.hemera.views.api import GetPastEventsBatch as GetHemeraPastEventsBatch
+from .. import models
+from ..views.api import GetPastEvents, GetPastEventsBatch
+
+
+class TestPastEvents(APITestCase):
+    def setUp(self):
+        self.curing = Machine.objects.create(hostname="curing", name="curing", production_step="Curing")
+        self.greasing = Machine.objects.create(hostname="greasing", name="greasing", production_step="Greasing")
+        self.operator = Operator.objects.create(code="123", name="operator")
+        self.work_order = WorkOrder.objects.create(code="E3D-WO-123")
+        sku = Sku.objects.create(code="123")
+        self.items = [
+            models.SingleItem.objects.create(sku=sku, uid=UniqueID.objects.create(code=F"12345678{i}"))
+            for i in range(2)
+        ]
+
+        self.create_event(self.items[0], self.curing, completed=True)
+        self.create_event(self.items[0], self.curing, completed=True, failed=True, fail_state="Too hot")
+        self.create_event(self.items[0], self.greasing, completed=True, failed=True, fail_state="Too hot")
+        self.create_event(self.items[0], self.greasing, event_class=HemeraGreaseEvent, failed=True)
+        self.factory = APIRequestFactory()
+
+    def create_event(self, item, machine, event_class=models.Event, **kwargs):
+        return event_class.objects.create(
+            item=item, machine=machine, operator=self.operator, work_order=self.work_order, **kwargs
+        )
+
+    def post(self, view_class, data):
+        return view_class.as_view()(self.factory.post("/", data, format="json"))
+
+
+    def test_summary(self):
+        # Warm up the ContentType cache, so that only the summary query itself is counted.
+        models.Event.summarise_events(models.AnyItem.objects.none())
+
+        with self.assertNumQueries(1):
+            response = self.post(GetPastEvents, {"item_id": self.items[0].pk})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            "events": 4,
+            "completed": 3,
+            "incompleted": 1,
+            "passed": 1,
+            "failed": 3,
+            "fail_state": {"None": 1, "Too hot": 2, "Unknown": 1},
+        })
+
+
+    def test_summary_for_production_step(self):
+        response = self.post(GetPastEvents, {"item_id": self.items[0].pk, "production_step": "Curing"})
+        self.assertEqual(response.data["events"], 2)
+        self.assertEqual(response.data["failed"], 1)
+        self.assertEqual(response.data["fail_state"], {"None": 1, "Too hot": 1})
+
+
+    def test_summary_without_events(self):
+        response = self.post(GetPastEvents, {"item_id": self.items[1].pk})
+        self.assertEqual(response.data["events"], 0)
+        self.assertEqual(response.data["fail_state"], {})
+
+
+    def test_missing_item(self):
+        response = self.post(GetPastEvents, {"item_id": 0})
+        self.assertEqual(response.status_code, 500)
+
+
+    def test_batch(self):
+        models.Event.summarise_events(models.AnyItem.objects.none())
+        item_ids = [item.pk for item in self.items]
+
+        with self.assertNumQueries(1):
+            response = self.post(GetPastEventsBatch, {"item_ids": item_ids})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[item_ids[0]]["events"], 4)
+        self.assertEqual(response.data[item_ids[1]]["events"], 0)
+
+        response = self.post(GetPastEventsBatch, {"item_ids": [item_ids[0], 0]})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.post(GetPastEventsBatch, {"item_ids": "not a list"})
+        self.assertEqual(response.status_code, 400)
+
+
+    def test_hemera(self):
+        uid = self.items[0].uid_id
+        response = GetHemeraPastEvents.as_view()(self.factory.get("/"), uid=uid)
+
+        # Only the HemeraGreaseEvent is counted.
+        self.assertEqual(response.data, {"events": 1, "completed": 0, "failed": 1, "fail_state": {"Unknown": 1}})
+
+        response = self.post(GetHemeraPastEventsBatch, {"uids": [uid, self.items[1].uid_id, "999999999"]})
+        self.assertEqual(response.data[uid]["events"], 1)
+        self.assertEqual(response.data[self.items[1].uid_id]["events"], 0)
+        self.assertEqual(response.data["999999999"]["events"], 0)
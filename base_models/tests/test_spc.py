@@ -0,0 +1,203 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from threading import Barrier
+
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient
+from rest_framework.test import APIRequestFactory
+
+from core.models import Machine, Operator, Sku, UniqueID, WorkOrder
+from core.tests.api_test_case import APITestCase
+from core.utils import reverse
+from core.views.api import CreateZeroingLog
+from projects.v7_post_curing_qc.models import V7CuringQCEvent
+from .. import models
+from ..views.api import GetSpcCharts, GetSpcViolations
+
+
+# Observations that vary a little, within a stable process.
+STABLE = [10.0, 10.4, 9.8, 10.2, 9.6]
+
+
+class TestSpc(APITestCase):
+    def setUp(self):
+        self.machine = Machine.objects.create(hostname="123", name="machine", production_step="Curing")
+        self.operator = Operator.objects.create(code="123", name="operator")
+        self.work_order = WorkOrder.objects.create(code="E3D-WO-123")
+        self.sku = Sku.objects.create(code="V7-24V")
+        self.item = models.SingleItem.objects.create(sku=self.sku, uid=UniqueID.objects.create(code="123456789"))
+        self.factory = APIRequestFactory()
+
+    def record(self, values, metric="duration"):
+        return models.SpcChart.record_observations(
+            [(self.machine.pk, self.sku.pk, metric, value, None) for value in values]
+        )
+
+    def get_chart(self, metric="duration"):
+        return models.SpcChart.objects.get(machine=self.machine, sku=self.sku, metric=metric)
+
+
+    def test_limits_are_established_incrementally(self):
+        self.assertEqual(self.record(STABLE * 4 + [10.0, 10.4]), [])
+        chart = self.get_chart()
+        self.assertIsNone(chart.get_limits())
+        self.assertEqual(chart.pending, [10.0, 10.4])
+
+        self.assertEqual(self.record([9.8, 10.2, 9.6]), [])
+        chart = self.get_chart()
+        self.assertTrue(chart.is_established)
+        self.assertEqual(chart.observations, 25)
+
+        limits = chart.get_limits()
+        self.assertAlmostEqual(limits["centre_line"], 10.0)
+        self.assertAlmostEqual(limits["mean_range"], 0.8)
+        self.assertAlmostEqual(limits["xbar"][1], 10.0 + 0.577 * 0.8)
+        self.assertAlmostEqual(limits["range"][1], 2.114 * 0.8)
+        self.assertLess(limits["ewma"][1], limits["centre_line"] + 3 * limits["sigma"])
+
+        # The window of subgroups rolls, rather than growing forever.
+        self.record(STABLE * (models.SpcChart.window + 5))
+        self.assertEqual(len(self.get_chart().means), models.SpcChart.window)
+
+
+    def test_violations(self):
+        self.record(STABLE * 5)
+
+        # A sudden shift is caught by the EWMA straight away, and by the X̄ chart once its subgroup is complete.
+        violations = self.record([14.0] * 5)
+        rules = [violation.rule for violation in violations]
+        self.assertEqual(rules[0], models.SpcRule.EWMA_BEYOND_LIMITS)
+        self.assertIn(models.SpcRule.BEYOND_3_SIGMA, rules)
+        self.assertNotIn(models.SpcRule.RANGE_ABOVE_LIMIT, rules)
+
+        beyond = next(violation for violation in violations if violation.rule == models.SpcRule.BEYOND_3_SIGMA)
+        self.assertEqual(beyond.value, 14.0)
+        self.assertAlmostEqual(beyond.centre_line, 10.0)
+        self.assertEqual(models.SpcViolation.objects.count(), len(violations))
+
+        # An erratic subgroup, with a normal mean.
+        rules = [violation.rule for violation in self.record([7.0, 13.0, 10.0, 10.0, 10.0])]
+        self.assertIn(models.SpcRule.RANGE_ABOVE_LIMIT, rules)
+
+
+    def test_western_electric_rules(self):
+        limits = {"centre_line": 0, "xbar": (-3, 3)}
+        check = models.SpcChart.check_western_electric_rules
+
+        self.assertEqual(check([0, 0, 3.5], limits), [models.SpcRule.BEYOND_3_SIGMA])
+        self.assertEqual(check([2.5, 0, 2.5], limits), [models.SpcRule.TWO_OF_THREE_BEYOND_2_SIGMA])
+        # Only patterns on one side count.
+        self.assertEqual(check([-2.5, 0, 2.5], limits), [])
+        self.assertEqual(check([1.5, 1.5, 0, 1.5, 1.5], limits), [models.SpcRule.FOUR_OF_FIVE_BEYOND_1_SIGMA])
+        self.assertEqual(check([-0.5] * 8, limits), [models.SpcRule.EIGHT_ON_ONE_SIDE])
+        self.assertEqual(check([0.5] * 7 + [-0.5], limits), [])
+
+
+    def test_recorded_once_when_events_are_completed(self):
+        event = V7CuringQCEvent.objects.create(
+            item=self.item, machine=self.machine, operator=self.operator, work_order=self.work_order,
+            date_created=datetime.now() - timedelta(seconds=90),
+        )
+        view = async_to_sync(V7CuringQCEvent.generate_finish_view().as_view())
+
+        def finish(data):
+            response = view(self.factory.patch("/", data, format="json"), pk=event.pk)
+            self.assertEqual(response.status_code, 200)
+
+        finish({"log_timepoints": [0, 1], "log_temperatures": [20, 30]})
+        self.assertFalse(models.SpcChart.objects.exists())
+
+        finish({
+            "completed": True, "successful_thermal_cycles": 3, "tested_thermal_cycling": True,
+            "log_timepoints": [0, 10, 20, 30], "log_temperatures": [20, 150, 240, 250],
+        })
+        finish({"completed": True})
+
+        charts = {chart.metric: chart for chart in models.SpcChart.objects.filter(machine=self.machine, sku=self.sku)}
+        self.assertEqual(set(charts), {"duration", "successful_thermal_cycles", "heatup_time"})
+        self.assertEqual(charts["heatup_time"].pending, [20.0])
+        self.assertEqual(charts["successful_thermal_cycles"].observations, 1)
+        self.assertAlmostEqual(charts["duration"].pending[0], 90, delta=5)
+
+
+    def test_batch_finish(self):
+        events = [
+            models.Event.objects.create(
+                item=self.item, machine=self.machine, operator=self.operator, work_order=self.work_order,
+                completed=i == 0,
+            )
+            for i in range(3)
+        ]
+        url = reverse("test:basic_single_finish_batch")
+        self.postData(url, [{"pk": event.pk, "completed": True} for event in events], status_code_check=200)
+
+        # The Event that was already completed isn't counted again.
+        self.assertEqual(self.get_chart().observations, 2)
+
+
+    def test_zeroing_resistance(self):
+        view = CreateZeroingLog.as_view()
+        for resistance in [100.0, 101.0]:
+            request = self.factory.post("/", {
+                "resistance": resistance, "machine": self.machine.pk, "operator": self.operator.pk,
+            }, format="json")
+            self.assertEqual(view(request).status_code, 201)
+
+        chart = models.SpcChart.objects.get(machine=self.machine, metric="zeroing_resistance")
+        self.assertIsNone(chart.sku)
+        self.assertEqual(chart.pending, [100.0, 101.0])
+
+
+    def test_api(self):
+        self.record(STABLE * 5)
+        self.record([14.0] * 5)
+        self.record(STABLE, metric="heatup_time")
+
+        response = GetSpcCharts.as_view()(self.factory.get("/", {"machine": self.machine.pk}))
+        self.assertEqual([chart["metric"] for chart in response.data], ["duration", "heatup_time"])
+        duration, heatup_time = response.data
+        self.assertTrue(duration["established"])
+        self.assertEqual(len(duration["xbar_limits"]), 2)
+        self.assertIsNone(heatup_time["centre_line"])
+
+        view = GetSpcViolations.as_view()
+        response = view(self.factory.get("/", {"sku": self.sku.pk, "rule": "beyond_3_sigma"}))
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]["metric"], "duration")
+        self.assertEqual(response.data[0]["description"], "One subgroup mean beyond 3σ")
+
+        self.assertEqual(len(view(self.factory.get("/", {"metric": "heatup_time"})).data), 0)
+        self.assertEqual(view(self.factory.get("/", {"rule": "made_up"})).status_code, 400)
+        self.assertEqual(view(self.factory.get("/", {"from_date": "yesterday"})).status_code, 400)
+
+
+class TestConcurrentSpc(TransactionTestCase):
+    def test_concurrent_finishes(self):
+        """Finish the same Event several times at once, without an Idempotency-Key, and check it's counted once."""
+        machine = Machine.objects.create(hostname="123", name="machine", production_step="Curing")
+        item = models.SingleItem.objects.create(
+            sku=Sku.objects.create(code="V7-24V"), uid=UniqueID.objects.create(code="123456789")
+        )
+        event = models.Event.objects.create(
+            item=item, machine=machine, operator=Operator.objects.create(code="123", name="operator"),
+            work_order=WorkOrder.objects.create(code="E3D-WO-123"),
+        )
+
+        thread_count = 5
+        barrier = Barrier(thread_count)
+        url = reverse("test:basic_single_finish", pk=event.pk)
+
+        def finish(_):
+            try:
+                client = APIClient()
+                barrier.wait()
+                return client.put(url, {"completed": True}, format="json").status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=thread_count) as executor:
+            self.assertEqual(set(executor.map(finish, range(thread_count))), {200})
+
+        self.assertEqual(models.SpcChart.objects.get(metric="duration").observations, 1)
@@ -0,0 +1,177 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from threading import Barrier
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from rest_framework.test import APIClient, APIRequestFactory
+
+from core.models import Machine, Operator, Sku, UniqueID, WorkOrder
+from core.tests.api_test_case import APITestCase
+from core.utils import reverse
+from .. import models
+from ..views.api import GetWorkOrderProgress
+
+
+class TestWorkOrderProgress(APITestCase):
+    def setUp(self):
+        self.curing = Machine.objects.create(hostname="curing", name="curing", production_step="Curing")
+        self.packing = Machine.objects.create(hostname="packing", name="packing", production_step="Packing")
+        self.operator = Operator.objects.create(code="123", name="operator")
+        self.work_order = WorkOrder.objects.create(code="E3D-WO-123")
+        self.sku = Sku.objects.create(code="V7-24V")
+        self.items = [
+            models.SingleItem.objects.create(sku=self.sku, uid=UniqueID.objects.create(code=F"12345678{i}"))
+            for i in range(3)
+        ]
+        self.factory = APIRequestFactory()
+
+    def start(self, item, machine=None):
+        view = async_to_sync(models.Event.generate_start_view().as_view())
+        response = view(self.factory.post("/", {
+            "item": self.items[item].pk, "machine": (machine or self.curing).pk, "operator": self.operator.pk,
+            "work_order": self.work_order.pk,
+        }, format="json"))
+        self.assertEqual(response.status_code, 201)
+        return response.data["pk"]
+
+    def finish(self, pk, **data):
+        view = async_to_sync(models.Event.generate_finish_view().as_view())
+        response = view(self.factory.patch("/", {"completed": True, **data}, format="json"), pk=pk)
+        self.assertEqual(response.status_code, 200)
+
+    def get_counts(self, production_step="Curing"):
+        progress = models.WorkOrderProgress.objects.get(
+            work_order=self.work_order, sku=self.sku, production_step=production_step
+        )
+        return {field: getattr(progress, field) for field in models.WorkOrderProgress.count_fields}
+
+    def assertMatchesRecount(self):
+        self.assertEqual(models.WorkOrderProgress.rebuild(), [])
+
+
+    def test_counts_follow_each_item(self):
+        first = self.start(0)
+        self.start(1)
+        self.assertEqual(self.get_counts(), {"started": 2, "passed": 0, "failed": 0, "pending": 2})
+
+        self.finish(first, failed=True)
+        self.assertEqual(self.get_counts(), {"started": 2, "passed": 0, "failed": 1, "pending": 1})
+
+        # A retest of the failed item doesn't start it again, and passing it moves it from failed to passed.
+        retest = self.start(0)
+        self.assertEqual(self.get_counts()["started"], 2)
+        self.finish(retest)
+        self.assertEqual(self.get_counts(), {"started": 2, "passed": 1, "failed": 0, "pending": 1})
+
+        # Finishing an Event again with a different result moves the item back.
+        self.finish(retest, failed=True)
+        self.assertEqual(self.get_counts(), {"started": 2, "passed": 0, "failed": 1, "pending": 1})
+
+        self.start(0, machine=self.packing)
+        self.assertEqual(self.get_counts("Packing"), {"started": 1, "passed": 0, "failed": 0, "pending": 1})
+        self.assertMatchesRecount()
+
+
+    def test_batches(self):
+        url = reverse("test:basic_single_start_batch")
+        results = self.postData(url, [
+            {"item": item.pk, "machine": "curing", "operator": "123", "work_order": "E3D-WO-123"}
+            for item in self.items
+        ], status_code_check=201)
+        self.assertEqual(self.get_counts()["pending"], 3)
+
+        url = reverse("test:basic_single_finish_batch")
+        self.postData(url, [
+            {"pk": results[0]["pk"], "completed": True},
+            {"pk": results[1]["pk"], "completed": True, "failed": True},
+        ], status_code_check=200)
+        self.assertEqual(self.get_counts(), {"started": 3, "passed": 1, "failed": 1, "pending": 1})
+        self.assertMatchesRecount()
+
+
+    def test_reconciliation(self):
+        # Events written outside the views aren't counted until the counts are reconciled.
+        models.Event.objects.create(
+            item=self.items[0], machine=self.curing, operator=self.operator, work_order=self.work_order, completed=True
+        )
+        pk = self.start(1)
+        models.Event.objects.filter(pk=pk).update(completed=True, failed=True)
+
+        out = StringIO()
+        call_command("reconcile_work_order_progress", "E3D-WO-123", stdout=out)
+        self.assertIn("Corrected 1 work order progress counts", out.getvalue())
+        self.assertEqual(self.get_counts(), {"started": 2, "passed": 1, "failed": 1, "pending": 0})
+
+        # Counts with no Events left are zeroed.
+        models.Event.objects.all().delete()
+        self.assertEqual(len(models.WorkOrderProgress.rebuild()), 1)
+        self.assertEqual(self.get_counts()["started"], 0)
+
+
+    def test_api(self):
+        self.finish(self.start(0, machine=self.packing))
+        self.start(1)
+
+        view = GetWorkOrderProgress.as_view()
+        with self.assertNumQueries(1):
+            response = view(self.factory.get("/", {"work_order": "E3D-WO-123"}))
+
+        # Steps are in production order.
+        self.assertEqual([row["production_step"] for row in response.data["steps"]], ["Curing", "Packing"])
+        self.assertEqual(response.data["steps"][1]["pass_rate"], 1)
+        self.assertIsNone(response.data["steps"][0]["pass_rate"])
+
+        self.assertEqual(view(self.factory.get("/")).status_code, 400)
+
+
+    @override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+    def test_web_page(self):
+        self.finish(self.start(0))
+        url = reverse("work_order_progress")
+
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(User.objects.create_user("user"))
+        response = self.client.get(url, {"work_order": "E3D-WO-123"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["rows"][0]["passed"], 1)
+        self.assertContains(response, "100%")
+
+
+class TestConcurrentWorkOrderProgress(TransactionTestCase):
+    def test_concurrent_finishes(self):
+        """Finish two Events of the same item, and repeat each finish, all at once. The item only moves once."""
+        machine = Machine.objects.create(hostname="curing", name="curing", production_step="Curing")
+        operator = Operator.objects.create(code="123", name="operator")
+        work_order = WorkOrder.objects.create(code="E3D-WO-123")
+        item = models.SingleItem.objects.create(
+            sku=Sku.objects.create(code="V7-24V"), uid=UniqueID.objects.create(code="123456789")
+        )
+        events = [
+            models.Event.objects.create(item=item, machine=machine, operator=operator, work_order=work_order)
+            for _ in range(2)
+        ]
+        models.WorkOrderProgress.rebuild()
+
+        thread_count = 4
+        barrier = Barrier(thread_count)
+
+        def finish(i):
+            try:
+                client = APIClient()
+                url = reverse("test:basic_single_finish", pk=events[i % 2].pk)
+                barrier.wait()
+                return client.put(url, {"completed": True}, format="json").status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=thread_count) as executor:
+            self.assertEqual(set(executor.map(finish, range(thread_count))), {200})
+
+        progress = models.WorkOrderProgress.objects.get()
+        self.assertEqual((progress.started, progress.passed, progress.pending), (1, 1, 0))
+        self.assertEqual(models.WorkOrderProgress.rebuild(), [])
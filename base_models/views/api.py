@@ -1,12 +1,43 @@
-import pandas as pd
+import hashlib
+import json
+from datetime import datetime, time, timedelta
 from random import randint
 
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils.dateparse import parse_date, parse_datetime
+
 from rest_framework.authentication import SessionAuthentication, TokenAuthentication
 from rest_framework.generics import RetrieveAPIView, CreateAPIView, UpdateAPIView, get_object_or_404
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from base_models.models import Event, AnyItem
+from base_models.genealogy import get_components, get_where_used
+from base_models.models import (
+    Event, AnyItem, DailyYieldRollup, HourlyMachineRollup, SingleItem, SpcChart, SpcRule, SpcViolation,
+    WorkOrderProgress,
+)
+
+
+def get_date_range_filters(query_params, field):
+    """
+    Return queryset filters on the given date or datetime field, from the optional `from_date` and `to_date` query
+    parameters. Dates are YYYY-MM-DD, and `to_date` is inclusive. Raises ValueError if either date can't be parsed.
+    """
+    filters = {}
+    for param, lookup, offset in [("from_date", "gte", 0), ("to_date", "lt", 1)]:
+        value = query_params.get(param)
+        if not value:
+            continue
+        try:
+            date = parse_date(value)
+        except ValueError:
+            date = None
+        if date is None:
+            raise ValueError(f"Could not parse {param} {value}")
+        filters[f"{field}__{lookup}"] = date + timedelta(days=offset)
+    return filters
 
 
 class GetPastEvents(APIView):
@@ -22,32 +53,368 @@ class GetPastEvents(APIView):
         msg = f"Could not find item id {item_id}"
         if item_id is None:
             return Response({"error": msg}, status=500)
-        item = AnyItem.objects.filter(id=item_id).first()
-        if item is None:
+
+        summaries = Event.summarise_events(AnyItem.objects.filter(id=item_id), production_step)
+        if not summaries:
             return Response({"error": msg}, status=500)
 
-        filters = {'item': item}
-        if production_step is not None:
-            filters['machine__production_step'] = production_step
-
-        events = Event.objects.filter(**filters)
-        completed = events.filter(completed=True)
-        incompleted = events.filter(completed=False)
-        failed = events.filter(failed=True)
-        passed = events.filter(completed=True, failed=False)
-        fail_states_tmp = pd.DataFrame(events.values('fail_state')).value_counts().to_dict()
-        fail_states = {}
-        for key, value in fail_states_tmp.items():
-            key = key[0]
-            fail_states[key] = value
+        return Response(next(iter(summaries.values())))
+
+
+class GetPastEventsBatch(APIView):
+    """
+    POST a list of `item_ids` (and an optional `production_step`), and get the same counts as GetPastEvents for
+    each of them, in a dict keyed on item id. Everything is counted in a single query.
+    """
+
+    def post(self, request, *args, **kwargs):
+        item_ids = request.data.get('item_ids', None)
+        production_step = request.data.get('production_step', None)
+
+        if not isinstance(item_ids, list) or not all(isinstance(item_id, int) for item_id in item_ids):
+            return Response({"error": "item_ids must be a list of item ids"}, status=400)
+        if len(item_ids) > settings.MAX_BATCH_SIZE:
+            return Response({"error": f"Can't look up more than {settings.MAX_BATCH_SIZE} items at once"}, status=400)
+
+        summaries = Event.summarise_events(AnyItem.objects.filter(id__in=item_ids), production_step)
+        missing = [item_id for item_id in item_ids if item_id not in summaries]
+        if missing:
+            return Response({"error": f"Could not find item ids {', '.join(map(str, missing))}"}, status=400)
+
+        return Response(summaries)
+
+
+class GetHourlyRollup(APIView):
+    """
+    GET the precomputed hourly throughput and utilisation figures for each machine, summed across operators.
+
+    Reads from HourlyMachineRollup rather than the raw Event and MachineUsage tables, so it stays fast regardless
+    of how much history there is. Accepts optional `machine`, `production_step`, `from_date` and `to_date`
+    query parameters; dates are YYYY-MM-DD, and `to_date` is inclusive.
+    """
+
+    def get(self, request, *args, **kwargs):
+        filters = {}
+
+        if request.query_params.get("machine"):
+            filters["machine"] = request.query_params["machine"]
+        if request.query_params.get("production_step"):
+            filters["production_step"] = request.query_params["production_step"]
+
+        try:
+            filters.update(get_date_range_filters(request.query_params, "hour"))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        rows = (
+            HourlyMachineRollup.objects.filter(**filters)
+            .order_by("hour", "machine")
+            .values("machine", "production_step", "hour")
+            .annotate(
+                events_started=Sum("events_started"),
+                events_completed=Sum("events_completed"),
+                events_failed=Sum("events_failed"),
+                logged_in_seconds=Sum("logged_in_seconds"),
+            )
+        )
+
+        return Response(list(rows))
+
+
+class GetDailyYieldRollup(APIView):
+    """
+    GET the precomputed first-pass yield figures from DailyYieldRollup.
+
+    Accepts optional `sku`, `work_order`, `production_step`, `from_date` and `to_date` query parameters, like
+    GetHourlyRollup. The figures are added up over whichever of sku, work_order, production_step and day aren't
+    listed in the optional `group_by` parameter - so `?group_by=work_order` gives one row per work order. Each row
+    includes `first_pass_yield` and `final_yield` as fractions.
+    """
+
+    def get(self, request, *args, **kwargs):
+        filters = {}
+
+        for field in ["sku", "work_order", "production_step"]:
+            if request.query_params.get(field):
+                filters[field] = request.query_params[field]
+
+        try:
+            filters.update(get_date_range_filters(request.query_params, "day"))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        group_by = DailyYieldRollup.group_fields
+        if request.query_params.get("group_by") is not None:
+            group_by = [field for field in request.query_params["group_by"].split(",") if field]
+            invalid = [field for field in group_by if field not in DailyYieldRollup.group_fields]
+            if invalid:
+                return Response(
+                    {"error": f"Can't group by {', '.join(invalid)}. "
+                              f"Choose from {', '.join(DailyYieldRollup.group_fields)}"},
+                    status=400,
+                )
+
+        return Response(DailyYieldRollup.summarise(DailyYieldRollup.objects.filter(**filters), group_by))
+
+
+def parse_datetime_param(query_params, param):
+    """
+    Return the given query parameter as a datetime, or None if it's missing. Accepts ISO 8601 datetimes, or dates
+    for midnight at the start of that day. Raises ValueError if it can't be parsed.
+    """
+    value = query_params.get(param)
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value) or parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError(f"Could not parse {param} {value}")
+    if not isinstance(parsed, datetime):
+        parsed = datetime.combine(parsed, time())
+    return parsed
+
+
+class GetFailStatePareto(APIView):
+    """
+    GET the fail states of failed Events ranked from most to least common, with cumulative percentages, for a window
+    of time and a comparison window - by default, the window of the same length just before it. Intended for
+    shift-by-shift quality reviews.
+
+    Takes `start` and `end` query parameters (ISO 8601 datetimes or dates, with `end` exclusive), and optionally
+    `compare_start` and `compare_end`. Events are counted in the window they were started in. Narrow the scope with
+    the optional `machine`, `sku` and `production_step` parameters.
+
+    The counts for both windows come from a single grouped query. Results are cached, along with when they were
+    counted. Before a cached Pareto is served, one cheap query checks whether any Event in scope has been saved since
+    then. It reads the index on `date_updated`, so it only looks at Events saved since the Pareto was counted, rather
+    than every Event in the windows, and Events outside the scope don't affect it.
+
+    Changes that leave no newer `date_updated` behind aren't seen: Events being deleted, and queryset update()s that
+    don't set `date_updated`. A cached Pareto can show those until it times out (see
+    settings.FAIL_STATE_PARETO_CACHE_TIMEOUT).
+    """
+
+    # Events saved this long before a Pareto was counted still make it stale, in case their transactions committed
+    # after the counting query ran.
+    freshness_overlap = timedelta(minutes=1)
+
+    def get(self, request, *args, **kwargs):
+        try:
+            start = parse_datetime_param(request.query_params, "start")
+            end = parse_datetime_param(request.query_params, "end")
+            compare_start = parse_datetime_param(request.query_params, "compare_start")
+            compare_end = parse_datetime_param(request.query_params, "compare_end")
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        if start is None or end is None:
+            return Response({"error": "start and end are required"}, status=400)
+        if compare_start is None and compare_end is None:
+            compare_start, compare_end = start - (end - start), start
+        elif compare_start is None or compare_end is None:
+            return Response({"error": "Give both of compare_start and compare_end, or neither"}, status=400)
+        if start >= end or compare_start >= compare_end:
+            return Response({"error": "Each window must start before it ends"}, status=400)
 
+        scope = Q()
+        if request.query_params.get("machine"):
+            scope &= Q(machine=request.query_params["machine"])
+        if request.query_params.get("sku"):
+            scope &= Q(item__sku=request.query_params["sku"])
+        if request.query_params.get("production_step"):
+            scope &= Q(machine__production_step=request.query_params["production_step"])
+
+        in_window = Q(date_created__gte=start, date_created__lt=end)
+        in_compare_window = Q(date_created__gte=compare_start, date_created__lt=compare_end)
+        events = Event.objects.non_polymorphic().filter(scope).filter(in_window | in_compare_window).order_by()
+
+        key = json.dumps([
+            request.query_params.get("machine"), request.query_params.get("sku"),
+            request.query_params.get("production_step"), start, end, compare_start, compare_end,
+        ], default=str)
+        cache_key = "fail_state_pareto:" + hashlib.sha256(key.encode()).hexdigest()
+
+        cached = cache.get(cache_key)
+        if cached is not None and not events.filter(date_updated__gt=cached["counted_since"]).exists():
+            return Response(cached["data"])
+
+        counted_since = datetime.now() - self.freshness_overlap
+        counts = list(events.filter(failed=True).values("fail_state").annotate(
+            window_count=Count("id", filter=in_window),
+            compare_count=Count("id", filter=in_compare_window),
+        ))
         data = {
-            'events': events.count(),
-            'completed': completed.count(),
-            'incompleted': incompleted.count(),
-            'passed': passed.count(),
-            'failed': failed.count(),
-            'fail_state': fail_states
+            "window": {"start": start, "end": end},
+            "compare_window": {"start": compare_start, "end": compare_end},
+            **self.rank(counts),
         }
+        cache.set(
+            cache_key,
+            {"data": data, "counted_since": counted_since},
+            settings.FAIL_STATE_PARETO_CACHE_TIMEOUT,
+        )
 
         return Response(data)
+
+
+    @staticmethod
+    def rank(counts):
+        """
+        Turn fail state counts for the two windows into a ranked Pareto table. Fail states that only occurred in
+        the comparison window are listed last, with a count of zero.
+        """
+        total = sum(row["window_count"] for row in counts)
+        compare_total = sum(row["compare_count"] for row in counts)
+        compared = sorted(
+            (row for row in counts if row["compare_count"]), key=lambda r: (-r["compare_count"], r["fail_state"])
+        )
+        compare_ranks = {row["fail_state"]: rank for rank, row in enumerate(compared, start=1)}
+
+        fail_states = []
+        cumulative = 0
+        for row in sorted(counts, key=lambda r: (-r["window_count"], -r["compare_count"], r["fail_state"])):
+            cumulative += row["window_count"]
+            fail_states.append({
+                "fail_state": row["fail_state"],
+                "count": row["window_count"],
+                "percentage": 100 * row["window_count"] / total if total else 0,
+                "cumulative_percentage": 100 * cumulative / total if total else 0,
+                "compare_count": row["compare_count"],
+                "compare_percentage": 100 * row["compare_count"] / compare_total if compare_total else 0,
+                "compare_rank": compare_ranks.get(row["fail_state"]),
+            })
+
+        return {"total": total, "compare_total": compare_total, "fail_states": fail_states}
+
+
+def get_spc_chart_filters(query_params, prefix=""):
+    """Return queryset filters on SpcChart from the optional `machine`, `sku` and `metric` query parameters."""
+    filters = {}
+    for field in ["machine", "sku", "metric"]:
+        if query_params.get(field):
+            filters[prefix + field] = query_params[field]
+    return filters
+
+
+class GetSpcCharts(APIView):
+    """
+    GET the current state of the SPC charts (see SpcChart): the control limits of the X̄, R and EWMA charts, the
+    current EWMA, and the rolling window of subgroup means and ranges the limits were calculated from. Accepts
+    optional `machine`, `sku` and `metric` query parameters.
+
+    The charts are kept up to date as Events are completed, so this is a cheap read of one row per chart.
+    """
+
+    def get(self, request, *args, **kwargs):
+        charts = SpcChart.objects.filter(**get_spc_chart_filters(request.query_params))
+        return Response([chart.to_dict() for chart in charts.order_by("machine", "sku", "metric")])
+
+
+class GetSpcViolations(APIView):
+    """
+    GET the signals raised by the SPC charts, most recent first. Accepts the same `machine`, `sku` and `metric`
+    query parameters as GetSpcCharts, plus optional `rule`, `from_date` and `to_date` (YYYY-MM-DD, with `to_date`
+    inclusive). Returns at most `max_results` violations.
+    """
+    max_results = 500
+
+    def get(self, request, *args, **kwargs):
+        filters = get_spc_chart_filters(request.query_params, prefix="chart__")
+
+        rule = request.query_params.get("rule")
+        if rule:
+            if rule not in SpcRule.values:
+                return Response({"error": f"Unknown rule {rule}. Choose from {', '.join(SpcRule.values)}"}, status=400)
+            filters["rule"] = rule
+
+        try:
+            filters.update(get_date_range_filters(request.query_params, "date_created"))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        violations = SpcViolation.objects.filter(**filters).select_related("chart")[:self.max_results]
+        return Response([violation.to_dict() for violation in violations])
+
+
+class GetWorkOrderProgress(APIView):
+    """
+    GET how many of a work order's items have started, passed, failed or are pending at each production step, per
+    SKU, for the work order code in the `work_order` query parameter. See WorkOrderProgress.
+
+    Reads one precomputed row per SKU and step, however many Events the work order has.
+    """
+
+    def get(self, request, *args, **kwargs):
+        work_order = request.query_params.get("work_order")
+        if not work_order:
+            return Response({"error": "work_order is required"}, status=400)
+
+        return Response({"work_order": work_order, "steps": WorkOrderProgress.get_progress(work_order)})
+
+
+def get_genealogy_item(query_params):
+    """
+    Return the ID of the item named by the `item` (an item's pk) or `uid` (a SingleItem's UID code) query parameter.
+    Raises ValueError if neither is given, or the item doesn't exist.
+    """
+    item, uid = query_params.get("item"), query_params.get("uid")
+    if item:
+        items = AnyItem.objects.filter(pk=item) if item.isdigit() else AnyItem.objects.none()
+    elif uid:
+        items = SingleItem.objects.filter(uid=uid)
+    else:
+        raise ValueError("Give an item or a uid")
+
+    item_id = items.non_polymorphic().values_list("pk", flat=True).first()
+    if item_id is None:
+        raise ValueError(f"Could not find item {item or uid}")
+    return item_id
+
+
+class GetItemComponents(APIView):
+    """
+    GET the full bill of materials of an item - everything it contains, and the BulkItems they were made from, all the
+    way down - with a summary of each component's Events. Takes an `item` (pk) or `uid` query parameter.
+
+    The whole tree is read with a single recursive query, however deep it goes. See base_models/genealogy.py for the
+    format of the response.
+    """
+
+    def get(self, request, *args, **kwargs):
+        try:
+            item_id = get_genealogy_item(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        return Response(get_components(item_id))
+
+
+class GetItemWhereUsed(APIView):
+    """
+    GET every item that contains a given component, all the way up to the finished products, with a summary of each
+    one's Events. For recall investigations.
+
+    The component is given by an `item` (pk) or `uid` query parameter. Alternatively, pass a `work_order` code to start
+    from everything produced under it: its BulkItems, and any item with Events in it. Finished products - the ones
+    that aren't part of anything else - are flagged with `finished`. See base_models/genealogy.py.
+    """
+
+    def get(self, request, *args, **kwargs):
+        if request.query_params.get("work_order"):
+            work_order = request.query_params["work_order"]
+            item_ids = list(
+                AnyItem.objects.non_polymorphic()
+                .filter(Q(bulkitem__work_order=work_order) | Q(events__work_order=work_order))
+                .order_by().values_list("pk", flat=True).distinct()
+            )
+            if not item_ids:
+                return Response({"error": f"Could not find any items for work order {work_order}"}, status=400)
+        else:
+            try:
+                item_ids = [get_genealogy_item(request.query_params)]
+            except ValueError as e:
+                return Response({"error": str(e)}, status=400)
+
+        return Response(get_where_used(item_ids))
@@ -0,0 +1,184 @@
+import hashlib
+import json
+
+from django import forms
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.fields import ArrayField
+from django.core.cache import cache
+from django.db import models
+from django.db.models import Aggregate, Count, DurationField, ExpressionWrapper, F, FloatField, Q
+from django.db.models.functions import Extract, Trunc
+from django.http import JsonResponse
+
+from .event_search_view import EventSearchView
+
+
+class PercentileCont(Aggregate):
+    """
+    Postgres' `percentile_cont` ordered-set aggregate. Computes several percentiles of an expression with a single
+    sort, and returns them as a list - one for each of the given fractions.
+    """
+    function = "percentile_cont"
+    template = "%(function)s(ARRAY[%(fractions)s]::double precision[]) WITHIN GROUP (ORDER BY %(expressions)s)"
+
+    def __init__(self, expression, fractions, **extra):
+        super().__init__(
+            expression,
+            fractions=", ".join(str(float(fraction)) for fraction in fractions),
+            output_field=ArrayField(FloatField()),
+            **extra,
+        )
+
+
+def get_project_names():
+    """Return a dict of {Event content type ID: project name}, for every Event class that belongs to a project."""
+    # Imported here, since the projects themselves depend on base_models.
+    from projects.all_projects import PROJECTS
+
+    names = {}
+    for project in PROJECTS:
+        if project.event_class is not None:
+            for ctype_id in project.event_class.get_polymorphic_ctype_ids():
+                names.setdefault(ctype_id, project.name)
+    return names
+
+
+class EventCubeView(EventSearchView):
+    """
+    Count Events grouped by any combination of `dimensions`, and optionally by a time `bucket`, for charts and ad hoc
+    analysis. Takes the same filters as the Event search, as GET query parameters.
+
+    Each row of the result holds its dimensions' values, plus:
+      * events, completed, failed - Event counts.
+      * failure_rate - The fraction of the Events that failed.
+      * duration_p50, duration_p90, duration_p99 - Percentiles of how long the completed Events took, in seconds,
+        from `date_created` to `date_updated`.
+
+    Everything is computed in a single query. Results are cached for settings.EVENT_CUBE_CACHE_TIMEOUT, keyed on
+    the cleaned form data, so equivalent requests share a cache entry however their parameters were written.
+    """
+    http_method_names = ["get"]
+
+    # Each dimension, and the Event field it groups by. They're returned in this order, whatever order they were
+    # requested in.
+    dimensions = {
+        "project": "polymorphic_ctype",
+        "production_step": "machine__production_step",
+        "machine": "machine",
+        "operator": "operator",
+        "sku": "item__sku",
+        "work_order": "work_order",
+        "fail_state": "fail_state",
+    }
+    buckets = ["hour", "day", "week"]
+    duration_percentiles = [50, 90, 99]
+    max_rows = 5000
+
+    def get_form_class(self):
+        view = self
+
+        class Form(self.form_class):
+            dimensions = forms.MultipleChoiceField(
+                choices=[(dimension, dimension) for dimension in view.dimensions],
+                required=False,
+            )
+            bucket = forms.ChoiceField(
+                choices=[("", ""), *((bucket, bucket) for bucket in view.buckets)],
+                required=False,
+            )
+
+        return Form
+
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs.update({"data": self.request.GET})
+        return kwargs
+
+
+    def get(self, request, *args, **kwargs):
+        """Handle every request like a search submission, returning the errors as JSON if it's invalid."""
+        form = self.get_form()
+        if form.is_valid():
+            return self.form_valid(form)
+        return JsonResponse({"errors": form.errors}, status=400)
+
+
+    def get_cache_key(self, data):
+        """Return a cache key for the given cleaned form data, which doesn't depend on how it was submitted."""
+        normalised = {"event_class": self.queryset.model._meta.label}
+        for field, value in data.items():
+            if value in (None, "", []):
+                continue
+            if isinstance(value, models.Model):
+                value = value.pk
+            elif isinstance(value, list):
+                value = sorted(value)
+            normalised[field] = value
+
+        key = json.dumps(normalised, sort_keys=True, default=str)
+        return "event_cube:" + hashlib.sha256(key.encode()).hexdigest()
+
+
+    def form_valid(self, form):
+        data = form.cleaned_data
+        cache_key = self.get_cache_key(data)
+
+        result = cache.get(cache_key)
+        if result is None:
+            dimensions = [dimension for dimension in self.dimensions if dimension in data["dimensions"]]
+            events = self.queryset.filter(self.build_filter(data))
+            result = self.build_cube(events, dimensions, data["bucket"] or None)
+            cache.set(cache_key, result, settings.EVENT_CUBE_CACHE_TIMEOUT)
+
+        return JsonResponse(result)
+
+
+    def build_cube(self, events, dimensions, bucket):
+        """Group the given Events by the given dimensions and bucket, and return a JSON-ready dictionary."""
+        events = events.non_polymorphic().order_by()
+        fields = [self.dimensions[dimension] for dimension in dimensions]
+        if bucket is not None:
+            events = events.annotate(period=Trunc("date_created", bucket))
+            fields.append("period")
+
+        duration = Extract(
+            ExpressionWrapper(F("date_updated") - F("date_created"), output_field=DurationField()), "epoch"
+        )
+        measures = {
+            "event_count": Count("id"),
+            "completed_count": Count("id", filter=Q(completed=True)),
+            "failed_count": Count("id", filter=Q(failed=True)),
+            "durations": PercentileCont(
+                duration, [p / 100 for p in self.duration_percentiles], filter=Q(completed=True)
+            ),
+        }
+
+        if fields:
+            rows = list(events.values(*fields).annotate(**measures).order_by(*fields)[:self.max_rows + 1])
+        else:
+            rows = [events.aggregate(**measures)]
+
+        truncated = len(rows) > self.max_rows
+        project_names = get_project_names() if "project" in dimensions else {}
+
+        results = []
+        for row in rows[:self.max_rows]:
+            result = {dimension: row[self.dimensions[dimension]] for dimension in dimensions}
+            if "project" in result:
+                ctype_id = result["project"]
+                result["project"] = project_names.get(ctype_id) or ContentType.objects.get_for_id(ctype_id).model
+            if bucket is not None:
+                result["period"] = row["period"]
+
+            result["events"] = row["event_count"]
+            result["completed"] = row["completed_count"]
+            result["failed"] = row["failed_count"]
+            result["failure_rate"] = row["failed_count"] / row["event_count"] if row["event_count"] else None
+            durations = row["durations"] or [None] * len(self.duration_percentiles)
+            for percentile, value in zip(self.duration_percentiles, durations):
+                result[F"duration_p{percentile}"] = value
+            results.append(result)
+
+        return {"dimensions": dimensions, "bucket": bucket, "rows": results, "truncated": truncated}
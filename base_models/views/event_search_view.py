@@ -41,6 +41,18 @@ class EventSearchForm(forms.Form):
         input_formats=DATE_INPUT_FORMATS,
         widget=forms.TextInput(attrs={"placeholder": "dd-mm-yyyy"}),
     )
+    built_from_date = forms.DateField(
+        required=False,
+        label="Built from date",
+        input_formats=DATE_INPUT_FORMATS,
+        widget=forms.TextInput(attrs={"placeholder": "dd-mm-yyyy"}),
+    )
+    built_to_date = forms.DateField(
+        required=False,
+        label="Built to date",
+        input_formats=DATE_INPUT_FORMATS,
+        widget=forms.TextInput(attrs={"placeholder": "dd-mm-yyyy"}),
+    )
 
     failed = forms.NullBooleanField(
         required=False,
@@ -115,6 +127,16 @@ class EventSearchView(BaseFormSearchView):
         if data.get("to_date", None):
             full_filter &= Q(date_created__lte=(data["to_date"] + timedelta(days=1)))
 
+        # Build date: The manufacture date decoded from the item's UID. Like the UID field, this has to go via
+        # SingleItem. Both bounds are applied to the same subquery, so it's a single range scan on the date index.
+        build_date_filter = Q()
+        if data.get("built_from_date", None):
+            build_date_filter &= Q(uid__manufacture_date__gte=data["built_from_date"])
+        if data.get("built_to_date", None):
+            build_date_filter &= Q(uid__manufacture_date__lte=data["built_to_date"])
+        if build_date_filter:
+            full_filter &= Q(item__in=SingleItem.objects.filter(build_date_filter))
+
         # Failure status: This is a NullBooleanField, so we need to compare `is not None` explicitly to
         # ensure we don't throw away "False" submissions.
         if data.get("failed", None) is not None:
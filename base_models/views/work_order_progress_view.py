@@ -0,0 +1,28 @@
+from django import forms
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.views.generic import TemplateView
+
+from ..models import WorkOrderProgress
+
+
+class WorkOrderProgressForm(forms.Form):
+    work_order = forms.CharField(max_length=255)
+
+
+class WorkOrderProgressView(LoginRequiredMixin, TemplateView):
+    """
+    A page showing how many of a work order's items have started, passed, failed or are pending at each production
+    step, per SKU. Reads the precomputed WorkOrderProgress counts, so it's cheap enough to be refreshed all day.
+
+    As with the yield report, the form is submitted with GET, so that the page can be bookmarked and refreshed.
+    """
+    template_name = "userside_templates/work_order_progress.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+
+        form = WorkOrderProgressForm(self.request.GET or None)
+        context["form"] = form
+        if form.is_bound and form.is_valid():
+            context["rows"] = WorkOrderProgress.get_progress(form.cleaned_data["work_order"].strip())
+        return context
@@ -0,0 +1,81 @@
+from django import forms
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.views.generic import TemplateView
+
+from core.production_steps import PRODUCTION_STEPS
+from ..base_view_classes.base_form_search_view import DATE_INPUT_FORMATS
+from ..models import DailyYieldRollup
+
+
+class YieldReportForm(forms.Form):
+    sku = forms.CharField(max_length=255, label="SKU", required=False)
+    work_order = forms.CharField(max_length=255, required=False)
+    production_step = forms.ChoiceField(
+        choices=[(None, ""), *PRODUCTION_STEPS.choices],
+        initial=None,
+        required=False,
+    )
+
+    from_date = forms.DateField(
+        required=False,
+        label="From date",
+        input_formats=DATE_INPUT_FORMATS,
+        widget=forms.TextInput(attrs={"placeholder": "dd-mm-yyyy"}),
+    )
+    to_date = forms.DateField(
+        required=False,
+        label="To date",
+        input_formats=DATE_INPUT_FORMATS,
+        widget=forms.TextInput(attrs={"placeholder": "dd-mm-yyyy"}),
+    )
+
+    group_by = forms.MultipleChoiceField(
+        choices=[(field, field.replace("_", " ").capitalize()) for field in DailyYieldRollup.group_fields],
+        initial=["sku", "production_step", "day"],
+        required=False,
+        widget=forms.CheckboxSelectMultiple,
+    )
+
+
+class YieldReportView(LoginRequiredMixin, TemplateView):
+    """
+    A page of first-pass and final yields, read from DailyYieldRollup and grouped however the user chooses.
+
+    Unlike the search views, the form is submitted with GET, so that a report can be bookmarked or shared.
+    """
+    template_name = "userside_templates/yield_report.html"
+    max_results = 500
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+
+        form = YieldReportForm(self.request.GET or None)
+        context["form"] = form
+        if not form.is_bound or not form.is_valid():
+            return context
+
+        data = form.cleaned_data
+        filters = {}
+        # Partial matches on SKU and work order, as on the Event search page.
+        if data["sku"]:
+            filters["sku__code__icontains"] = data["sku"]
+        if data["work_order"]:
+            filters["work_order__code__icontains"] = data["work_order"]
+        if data["production_step"]:
+            filters["production_step"] = data["production_step"]
+        if data["from_date"]:
+            filters["day__gte"] = data["from_date"]
+        if data["to_date"]:
+            filters["day__lte"] = data["to_date"]
+
+        # Keep the columns in their usual order, whatever order they were ticked in.
+        group_by = [field for field in DailyYieldRollup.group_fields if field in data["group_by"]]
+        rows = DailyYieldRollup.summarise(DailyYieldRollup.objects.filter(**filters), group_by)
+        for row in rows:
+            # Templates can't look up a key from a variable, so list each row's grouped values in column order.
+            row["group_values"] = [row[field] for field in group_by]
+
+        context["group_headings"] = [dict(form.fields["group_by"].choices)[field] for field in group_by]
+        context["rows"] = rows[:self.max_results]
+        context["truncated"] = len(rows) > self.max_results
+        return context
@@ -1,6 +1,14 @@
-from django.contrib import admin
+import io
 
-from .models import Sku, WorkOrder, UniqueID, Machine, Operator, ZeroingLog, MachineUsage
+from django import forms
+from django.contrib import admin, messages
+from django.http import HttpResponse
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from .uid_import import import_uid_codes
+from .models import Sku, WorkOrder, UniqueID, Machine, Operator, ZeroingLog, MachineUsage, BarcodeLease
 
 
 class AvailableModelAdmin(admin.ModelAdmin):
@@ -29,10 +37,67 @@ class MachineAdmin(AvailableModelAdmin):
     ordering = ["name"]
 
 
-admin.site.register(UniqueID, AvailableModelAdmin)
+class BarcodeLeaseAdmin(ReadOnlyAdmin):
+    list_display = ["machine", "schema", "serial_date", "date_created", "expires_at", "released_at", "outstanding"]
+    list_filter = ["schema"]
+
+    def outstanding(self, obj):
+        return obj.leased_codes.filter(confirmed_at=None).count()
+    outstanding.short_description = "Unconfirmed codes"
+
+
+class UIDImportForm(forms.Form):
+    codes_file = forms.FileField(label="File of codes", help_text="A CSV or plain text file, one code per line.")
+
+
+class UniqueIDAdmin(AvailableModelAdmin):
+    change_list_template = "admin/core/uniqueid/change_list.html"
+    list_display = ["code", "manufacture_date", "date_created"]
+    list_filter = ["manufacture_date"]
+    search_fields = ["code"]
+
+    def get_urls(self):
+        return [
+            path("import/", self.admin_site.admin_view(self.import_view), name="core_uniqueid_import"),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        """
+        Bulk-import a file of UID codes. See core.uid_import.import_uid_codes(). If any codes are rejected, the response
+        is a CSV of them to download, with the import's summary in its X-Import-Summary header.
+        """
+        form = UIDImportForm(request.POST or None, request.FILES or None)
+
+        if request.method == "POST" and form.is_valid():
+            codes_file = io.TextIOWrapper(form.cleaned_data["codes_file"].file, encoding="utf-8-sig", newline="")
+            report = import_uid_codes(codes_file)
+
+            if not report.invalid:
+                messages.success(request, F"Import finished: {report}.")
+                return redirect("admin:core_uniqueid_changelist")
+
+            # Download the rejected codes, in the same report as the import_uids command writes. The browser stays on
+            # this page, so any message would only turn up on the next one; the summary goes in a header instead.
+            response = HttpResponse(content_type="text/csv")
+            response["Content-Disposition"] = "attachment; filename=rejected_uids.csv"
+            response["X-Import-Summary"] = str(report)
+            report.write_invalid_csv(response)
+            return response
+
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Import unique IDs",
+            "form": form,
+        }
+        return TemplateResponse(request, "admin/core/uniqueid/import.html", context)
+
+
+admin.site.register(UniqueID, UniqueIDAdmin)
 admin.site.register(Machine, MachineAdmin)
 admin.site.register(MachineUsage, AvailableModelAdmin)
 admin.site.register(Operator, AvailableModelAdmin)
 admin.site.register(Sku, AvailableModelAdmin)
 admin.site.register(WorkOrder, AvailableModelAdmin)
-admin.site.register(ZeroingLog, AvailableModelAdmin)
\ No newline at end of file
+admin.site.register(ZeroingLog, AvailableModelAdmin)
+admin.site.register(BarcodeLease, BarcodeLeaseAdmin)
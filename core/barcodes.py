@@ -0,0 +1,79 @@
+import hashlib
+import random
+
+from django.conf import settings
+from django.db import connection
+
+
+# V6 barcodes are 9-digit numbers, so the permutation runs over [0, 10^9). The Feistel network below works on
+# 30-bit values (two 15-bit halves), which covers that range; anything that lands outside it is "cycle-walked"
+# back through the network until it falls inside. This keeps the mapping a bijection on the barcode range.
+V6_BARCODE_RANGE = 10 ** 9
+V6_BARCODE_SEQUENCE = "core_v6_barcode_seq"
+
+_HALF_BITS = 15
+_HALF_MASK = (1 << _HALF_BITS) - 1
+_ROUNDS = 4
+
+
+def _round_function(value, round_index, key):
+    digest = hashlib.blake2b(F"{round_index}:{value}".encode(), key=key, digest_size=4).digest()
+    return int.from_bytes(digest, "big") & _HALF_MASK
+
+
+def _feistel(value, key):
+    left, right = value >> _HALF_BITS, value & _HALF_MASK
+    for round_index in range(_ROUNDS):
+        left, right = right, left ^ _round_function(right, round_index, key)
+    return (left << _HALF_BITS) | right
+
+
+def permute_v6_barcode(sequence_value):
+    """
+    Map a sequence number onto a V6 barcode number, such that every sequence number in [0, 10^9) gives a different
+    barcode. Consecutive sequence numbers produce unrelated-looking barcodes, so codes can't be guessed in order.
+
+    The permutation is keyed on settings.V6_BARCODE_PERMUTATION_KEY. Changing the key doesn't break anything
+    outright, but the new permutation will start colliding with codes issued under the old one.
+    """
+    if not 0 <= sequence_value < V6_BARCODE_RANGE:
+        raise ValueError(F"V6 barcode sequence value {sequence_value} is out of range")
+
+    key = settings.V6_BARCODE_PERMUTATION_KEY.encode()
+    value = _feistel(sequence_value, key)
+    while value >= V6_BARCODE_RANGE:
+        value = _feistel(value, key)
+    return value
+
+
+def format_v6_barcode(value):
+    """Return a V6 barcode number in its printed form: a 9-digit string, left-padded with zeros."""
+    return str(value).zfill(9)
+
+
+def draw_v6_barcodes(count):
+    """
+    Return `count` fresh V6 barcodes from the database sequence. No two calls ever return the same barcode,
+    however many run concurrently, though a barcode may still clash with one created by some other route.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT nextval(%s) FROM generate_series(1, %s)", [V6_BARCODE_SEQUENCE, count])
+        return [format_v6_barcode(permute_v6_barcode(value)) for (value,) in cursor.fetchall()]
+
+
+# The characters allowed in the suffix of a V7 serial number. See UID_SCHEMAS.V7_SERIAL.
+V7_SERIAL_ALPHABET = "0123456789ACDEFGHJKLMNPQRSTUVWXYZ"
+
+_random = random.SystemRandom()
+
+
+def random_v7_serials(serial_date, count):
+    """
+    Return `count` random V7 serial numbers for the given date, in the DDMMYY-XXXX format.
+    These are only candidates - it's up to the caller to check they haven't been used.
+    """
+    prefix = serial_date.strftime("%d%m%y")
+    return [
+        F"{prefix}-{''.join(_random.choices(V7_SERIAL_ALPHABET, k=4))}"
+        for _ in range(count)
+    ]
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.models import UniqueID
+
+
+class Command(BaseCommand):
+    help = "Fill in the manufacture date of existing UniqueIDs from the date embedded in their codes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000, help="How many codes to update per transaction.")
+
+    def handle(self, *args, **options):
+        updated = UniqueID.backfill_manufacture_dates(batch_size=options["batch_size"])
+        self.stdout.write(F"Filled in the manufacture date of {updated} UniqueIDs")
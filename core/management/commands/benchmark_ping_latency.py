@@ -0,0 +1,131 @@
+import asyncio
+import json
+import time
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import HttpResponse
+from django.test.utils import override_settings
+from django.urls import path
+from rest_framework.permissions import AllowAny
+
+from core.models import Machine, Operator
+from core.views.api import MachinePing
+from web_interface.asgi import ThreadSensitiveASGIHandler
+
+
+def slow_export_view(request):
+    """Stands in for a big CSV export: holds its thread and a database connection for a while."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_sleep(%s)", [float(request.GET["seconds"])])
+    return HttpResponse("done")
+
+
+urlpatterns = [
+    path("ping/", MachinePing.as_view(authentication_classes=[], permission_classes=[AllowAny])),
+    path("export/", slow_export_view),
+]
+
+
+async def asgi_request(application, method, path, query_string=b"", body=b""):
+    """Send a request straight to an ASGI application, and return the response status."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "query_string": query_string,
+        "headers": [
+            (b"host", b"localhost"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+        "server": ("localhost", 80),
+    }
+    statuses = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    await application(scope, receive, send)
+    return statuses[0]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure MachinePing latency under ASGI while slow exports are running, using Django's own ASGI handler and "
+        "then the one in web_interface/asgi.py. Creates (and then removes) a benchmark machine and operator."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pings", type=int, default=200, help="How many pings to send.")
+        parser.add_argument("--concurrency", type=int, default=10, help="How many rigs to ping from at once.")
+        parser.add_argument("--exports", type=int, default=2, help="How many slow exports to keep running.")
+        parser.add_argument("--export-seconds", type=float, default=1, help="How long each export takes.")
+
+    def handle(self, *args, **options):
+        # Each rig pings its own machine, so give every concurrent ping a machine of its own as well.
+        machines = [
+            Machine.objects.get_or_create(hostname=F"benchmark-ping-{i}", defaults={"name": F"Benchmark {i}"})[0]
+            for i in range(options["concurrency"])
+        ]
+        operator, _ = Operator.objects.get_or_create(code="benchmark-ping", defaults={"name": "Benchmark"})
+
+        try:
+            with override_settings(ROOT_URLCONF=__name__):
+                for name, handler_class in [
+                    ("Django's ASGI handler", ASGIHandler),
+                    ("Per-request threads", ThreadSensitiveASGIHandler),
+                ]:
+                    latencies = asyncio.run(self.run_scenario(handler_class(), machines, operator, options))
+                    self.report(name, latencies)
+        finally:
+            for machine in machines:
+                machine.delete()  # Along with its MachineUsages.
+            operator.delete()
+
+    async def run_scenario(self, application, machines, operator, options):
+        """Keep the exports running while sending the pings, and return the pings' latencies in seconds."""
+        finished = False
+        export_query = F"seconds={options['export_seconds']}".encode()
+
+        async def keep_exporting():
+            while not finished:
+                await asgi_request(application, "GET", "/export/", query_string=export_query)
+
+        async def keep_pinging(machine, count):
+            body = json.dumps({"hostname": machine.hostname, "operator_id": operator.code}).encode()
+            latencies = []
+            for _ in range(count):
+                start = time.monotonic()
+                status = await asgi_request(application, "POST", "/ping/", body=body)
+                if status != 200:
+                    raise RuntimeError(F"Ping failed with status {status}")
+                latencies.append(time.monotonic() - start)
+            return latencies
+
+        exports = [asyncio.ensure_future(keep_exporting()) for _ in range(options["exports"])]
+        # Give the exports a head start, so they're already running when the pings arrive.
+        await asyncio.sleep(0.1)
+
+        pings_per_machine = max(1, options["pings"] // len(machines))
+        results = await asyncio.gather(*[keep_pinging(machine, pings_per_machine) for machine in machines])
+
+        finished = True
+        await asyncio.gather(*exports)
+        return sorted(latency for latencies in results for latency in latencies)
+
+    def report(self, name, latencies):
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))] * 1000
+
+        self.stdout.write(
+            F"{name}: p50 {percentile(50):.0f}ms, p99 {percentile(99):.0f}ms, max {latencies[-1] * 1000:.0f}ms"
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete every stored idempotency key older than IDEMPOTENCY_KEY_TTL. Intended to be run by a scheduler."
+
+    def handle(self, *args, **options):
+        deleted = IdempotencyKey.delete_expired()
+        self.stdout.write(F"Deleted {deleted} expired idempotency keys")
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.uid_import import import_uid_codes
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-import UniqueIDs from a CSV or newline-separated file of codes (first column only). "
+        "Codes that don't match any UID schema are skipped and can be written to a report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="The file of codes to import.")
+        parser.add_argument("--report", help="Write any rejected codes to this CSV file.")
+        parser.add_argument("--batch-size", type=int, default=100000, help="How many codes to insert per transaction.")
+
+    def handle(self, *args, **options):
+        with open(options["path"], newline="") as codes_file:
+            report = import_uid_codes(codes_file, batch_size=options["batch_size"])
+
+        self.stdout.write(str(report))
+
+        if report.invalid and options["report"]:
+            with open(options["report"], "w", newline="") as report_file:
+                report.write_invalid_csv(report_file)
+            self.stdout.write(F"Rejected codes written to {options['report']}")
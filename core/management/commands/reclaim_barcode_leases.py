@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.models import BarcodeLease
+
+
+class Command(BaseCommand):
+    help = "Release every unconfirmed code held by an expired barcode lease. Intended to be run by a scheduler."
+
+    def handle(self, *args, **options):
+        released = BarcodeLease.reclaim_expired()
+        self.stdout.write(F"Released {released} codes from expired leases")
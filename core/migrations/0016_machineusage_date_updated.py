@@ -0,0 +1,20 @@
+# Generated by Django 3.2.12 on 2026-10-19 09:12
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_alter_uniqueid_matches_schemas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='machineusage',
+            name='date_updated',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
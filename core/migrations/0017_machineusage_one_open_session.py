@@ -0,0 +1,39 @@
+# Generated by Django 3.2.12 on 2026-10-19 02:38
+
+import datetime
+
+from django.db import migrations, models
+
+
+def close_duplicate_sessions(apps, schema_editor):
+    """
+    Before the partial unique index can be added, make sure no machine has more than one open session.
+    Keep the most recent open session on each machine, and log out the rest at the time of their last ping.
+    """
+    MachineUsage = apps.get_model("core", "MachineUsage")
+    db_alias = schema_editor.connection.alias
+
+    open_sessions = MachineUsage.objects.using(db_alias).filter(logged_out_at=None).order_by("machine", "-logged_in_at")
+    seen_machines = set()
+    for session in open_sessions:
+        if session.machine_id not in seen_machines:
+            seen_machines.add(session.machine_id)
+            continue
+
+        session.logged_out_at = min(session.last_ping, datetime.datetime.today())
+        session.save(update_fields=["logged_out_at"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_machineusage_date_updated'),
+    ]
+
+    operations = [
+        migrations.RunPython(close_duplicate_sessions, migrations.RunPython.noop, elidable=True),
+        migrations.AddConstraint(
+            model_name='machineusage',
+            constraint=models.UniqueConstraint(condition=models.Q(('logged_out_at', None)), fields=('machine',), name='core_machineusage_one_open_session'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.12 on 2026-10-19 10:41
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_machineusage_one_open_session'),
+    ]
+
+    operations = [
+        # The source of new V6 barcodes. Each value is scrambled by core.barcodes.permute_v6_barcode(), which is
+        # a bijection on [0, 10^9), so no two values ever produce the same barcode.
+        migrations.RunSQL(
+            "CREATE SEQUENCE core_v6_barcode_seq MINVALUE 0 MAXVALUE 999999999 START 0 NO CYCLE",
+            "DROP SEQUENCE core_v6_barcode_seq",
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.12 on 2026-10-19 02:43
+
+import base_models.generate_serializer_mixin
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_v6_barcode_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BarcodeLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('schema', models.CharField(choices=[('V6_BARCODE', 'V6 Barcode'), ('V7_SERIAL', 'V7 Serial Number')], max_length=255)),
+                ('serial_date', models.DateField(blank=True, null=True)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('released_at', models.DateTimeField(blank=True, null=True)),
+                ('machine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='barcode_leases', to='core.machine')),
+            ],
+            options={
+                'ordering': ['-date_created'],
+            },
+            bases=(base_models.generate_serializer_mixin.GenerateSerializerMixin, models.Model),
+        ),
+        migrations.CreateModel(
+            name='LeasedCode',
+            fields=[
+                ('code', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('lease', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leased_codes', to='core.barcodelease')),
+            ],
+        ),
+    ]
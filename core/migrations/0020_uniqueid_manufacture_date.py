@@ -0,0 +1,18 @@
+# Generated by Django 3.2.12 on 2026-10-19 02:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_barcode_leases'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uniqueid',
+            name='manufacture_date',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.12 on 2026-10-19 04:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leasedcode',
+            name='confirmed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,14 +1,17 @@
 import datetime
 from base_models.generate_serializer_mixin import GenerateSerializerMixin
+from django.conf import settings
 from django.contrib.postgres.fields import ArrayField
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Q
 from django.forms import model_to_dict
 
 
+from .barcodes import draw_v6_barcodes, random_v7_serials
 from .production_steps import PRODUCTION_STEPS
 from .uid_schemas import UID_SCHEMAS
+from .utils import insert_ignoring_conflicts
 
 
 def validate_work_order_code(code):
@@ -41,6 +44,16 @@ class Sku(GenerateSerializerMixin, models.Model):
 
 
 class UniqueID(GenerateSerializerMixin, models.Model):
+    """
+    A unique code that identifies a single item, like a serial number or a QR code.
+
+    Provides the following fields:
+      * code - The code itself.
+      * date_created - When the code was added to the database.
+      * matches_schemas - The names of every UID_SCHEMAS entry the code matches.
+      * manufacture_date - The build date embedded in the code, if it has one (see UIDSchema.parse()). Codes that
+        predate this field are filled in by the `backfill_manufacture_dates` management command.
+    """
     code = models.CharField(max_length=255, primary_key=True)
     date_created = models.DateField(default=datetime.date.today)
 
@@ -48,6 +61,7 @@ class UniqueID(GenerateSerializerMixin, models.Model):
         models.CharField(max_length=255, choices=UID_SCHEMAS.choices()),
         default=list,
     )
+    manufacture_date = models.DateField(null=True, blank=True, db_index=True)
 
     def __str__(self):
         return self.code
@@ -55,13 +69,14 @@ class UniqueID(GenerateSerializerMixin, models.Model):
     def update_schemas(self):
         """
         Ensure the UID's code matches at least one valid schema; raise a ValidationError if it doesn't.
-        Store the matched schemas on the model.
+        Store the matched schemas, and the manufacture date embedded in the code, on the model.
         """
         schemas = UID_SCHEMAS.match_all(self.code)
         if not schemas:
             raise ValidationError(f"UID code {self.code} doesn't match any known schema!")
 
         self.matches_schemas = [s.name for s in schemas]
+        self.manufacture_date = UID_SCHEMAS.manufacture_date(self.code, schemas)
 
     def clean(self):
         """Ensure the model matches at least one valid schema."""
@@ -76,6 +91,71 @@ class UniqueID(GenerateSerializerMixin, models.Model):
         self.update_schemas()
         super().save(*args, **kwargs)
 
+    @classmethod
+    def bulk_create_codes(cls, codes):
+        """
+        Create UniqueIDs for all of the given codes in a single query, skipping any that already exist, and return
+        the codes that were created. Each code's schemas and manufacture date are filled in as usual; any code that
+        doesn't match a schema raises a ValidationError before anything is written.
+        """
+        schemas = UID_SCHEMAS.classify(codes)
+        invalid = [code for code, matched in schemas.items() if not matched]
+        if invalid:
+            raise ValidationError(f"UID codes {invalid} don't match any known schema!")
+
+        today = datetime.date.today()
+        rows = [
+            (code, today, [s.name for s in schemas[code]], UID_SCHEMAS.manufacture_date(code, schemas[code]))
+            for code in schemas
+        ]
+        created = set(insert_ignoring_conflicts(
+            cls, ["code", "date_created", "matches_schemas", "manufacture_date"], rows
+        ))
+        return [code for code in codes if code in created]
+
+    @classmethod
+    def backfill_manufacture_dates(cls, batch_size=5000):
+        """
+        Fill in `manufacture_date` on existing UniqueIDs whose schemas embed a date, one batch per transaction, and
+        return how many were updated. Codes are walked in order, so each batch is a short index range scan and the
+        backfill can be stopped and re-run at any point.
+        """
+        dated_schemas = [entry.name for entry in UID_SCHEMAS if entry.value.date_format]
+        pending = cls.objects.filter(manufacture_date=None, matches_schemas__overlap=dated_schemas).order_by("code")
+
+        updated = 0
+        last_code = ""
+        while True:
+            with transaction.atomic():
+                batch = list(pending.filter(code__gt=last_code)[:batch_size])
+                if not batch:
+                    return updated
+
+                for uid in batch:
+                    uid.manufacture_date = UID_SCHEMAS.manufacture_date(uid.code)
+                changed = [uid for uid in batch if uid.manufacture_date is not None]
+                cls.objects.bulk_update(changed, ["manufacture_date"])
+
+            updated += len(changed)
+            last_code = batch[-1].code
+
+    @classmethod
+    def allocate_v6_barcodes(cls, count):
+        """
+        Create `count` new V6 barcode UniqueIDs in a single transaction, and return their codes.
+
+        Barcodes are drawn from a database sequence and scrambled by a fixed permutation (see core/barcodes.py), so
+        concurrent allocations can never pick the same code. Codes that already exist - older randomly-chosen
+        barcodes, for instance - are skipped over by the insert, and replaced from the sequence.
+        """
+        codes = []
+
+        with transaction.atomic():
+            while len(codes) < count:
+                codes += cls.bulk_create_codes(draw_v6_barcodes(count - len(codes)))
+
+        return codes
+
 
 class Machine(GenerateSerializerMixin, models.Model):
     hostname = models.CharField(max_length=255, primary_key=True)
@@ -116,14 +196,29 @@ class ZeroingLog(GenerateSerializerMixin, models.Model):
 
 
 class MachineUsage(GenerateSerializerMixin, models.Model):
+    """
+    A session of an operator being logged in to a machine.
+
+    A machine can only have one open session (with no `logged_out_at`) at a time. This is enforced by a partial
+    unique index, and every method that opens or closes sessions locks the Machine row first (see lock_machine()),
+    so concurrent pings and event starts from the same rig are applied one after another.
+    """
     machine = models.ForeignKey(Machine, on_delete=models.CASCADE)
     operator = models.ForeignKey(Operator, on_delete=models.CASCADE)
     logged_in_at = models.DateTimeField(default=datetime.datetime.today)
     logged_out_at = models.DateTimeField(null=True)
     last_ping = models.DateTimeField(auto_now_add=True)
+    date_updated = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["-logged_in_at"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["machine"],
+                condition=Q(logged_out_at=None),
+                name="core_machineusage_one_open_session",
+            ),
+        ]
 
     def __str__(self) -> str:
         logged_in_indicator = "*" if self.logged_out_at is None else ""
@@ -140,16 +235,47 @@ class MachineUsage(GenerateSerializerMixin, models.Model):
         results['last_ping'] = self.last_ping
         return results
 
+    @classmethod
+    def lock_machine(cls, machine):
+        """
+        Lock the given Machine's row until the end of the current transaction, and return it.
+        Accepts either a Machine or a hostname. Must be called inside transaction.atomic().
+        """
+        hostname = machine if isinstance(machine, str) else machine.pk
+        return Machine.objects.select_for_update().filter(hostname=hostname).first()
+
     @classmethod
     def log_in(cls, machine, operator):
-        if type(machine) == str:
-            machine = Machine.objects.filter(hostname=machine).first()
-        log_in = MachineUsage.objects.create(
-            machine=machine,
-            operator=operator,
-        )
+        with transaction.atomic():
+            machine = cls.lock_machine(machine)
+
+            # Close anything left open, so the new session is the machine's only open one.
+            for open_session in cls.objects.filter(machine=machine, logged_out_at=None):
+                open_session.log_out()
+
+            log_in = MachineUsage.objects.create(
+                machine=machine,
+                operator=operator,
+            )
         return log_in
 
+    @classmethod
+    def ping_machine(cls, machine, operator, logging_out=False):
+        """
+        Record activity from the given operator on a machine: log them in, keep their session alive, or log them out.
+        Returns the affected MachineUsage, or None if logging out a machine that has never been logged in.
+        """
+        with transaction.atomic():
+            machine = cls.lock_machine(machine)
+            last_login = cls.objects.filter(machine=machine).first()
+
+            if last_login is None:
+                if logging_out:
+                    return None
+                return cls.log_in(machine, operator)
+
+            return last_login.ping(operator, logging_out)
+
     def log_out(self):
         logout_time = min(
             datetime.datetime.today(),
@@ -160,29 +286,33 @@ class MachineUsage(GenerateSerializerMixin, models.Model):
         return self
 
     def ping(self, operator, logging_out=False):
-        ping_time = datetime.datetime.today()
+        with transaction.atomic():
+            # Another request may have changed this session since it was loaded, so re-read it under the lock.
+            MachineUsage.lock_machine(self.machine_id)
+            self.refresh_from_db()
+            ping_time = datetime.datetime.today()
+
+            # if event is already logged out, create a new login event
+            if self.logged_out_at is not None:
+                if logging_out is False:
+                    return MachineUsage.log_in(self.machine, operator)
+                return self
 
-        # if event is already logged out, create a new login event
-        if self.logged_out_at is not None:
-            if logging_out is False:
-                return MachineUsage.log_in(self.machine, operator)
-            return self
+            if logging_out is True:
+                return self.log_out()
 
-        if logging_out is True:
-            return self.log_out()
+            if (ping_time - self.last_ping).total_seconds() < self.machine.required_ping_interval:
+                if operator == self.operator:
+                    self.last_ping = ping_time
+                    self.save()
+                    return self
 
-        if (ping_time - self.last_ping).total_seconds() < self.machine.required_ping_interval:
-            if operator == self.operator:
-                self.last_ping = ping_time
-                self.save()
-                return self
+                self.log_out()
+                return MachineUsage.log_in(self.machine, operator)
 
             self.log_out()
             return MachineUsage.log_in(self.machine, operator)
 
-        self.log_out()
-        return MachineUsage.log_in(self.machine, operator)
-
     @classmethod
     def get_logged_in_machines(cls):
         logins = cls.objects.filter(logged_out_at=None)
@@ -207,3 +337,190 @@ class MachineUsage(GenerateSerializerMixin, models.Model):
         for login in logins:
             duration += login.duration
         return duration
+
+
+class BarcodeLease(GenerateSerializerMixin, models.Model):
+    """
+    A block of barcodes reserved for a label printer, so it can keep printing without asking the server for every
+    label. Leased codes are held in LeasedCode rows, which stop them being leased twice; they only become UniqueIDs
+    once the printer confirms they've been used (see confirm()).
+
+    Leases can be for V6 barcodes, or for V7 serial numbers on a particular date. Anything still unused when the lease
+    is released, or once it expires, goes back into the pool (see release() and reclaim_expired()). V6 barcodes
+    come from a sequence and are never reissued, so in their case "back into the pool" just means they're dropped.
+    """
+    LEASABLE_SCHEMAS = (
+        (UID_SCHEMAS.V6_BARCODE.name, UID_SCHEMAS.V6_BARCODE.value.title),
+        (UID_SCHEMAS.V7_SERIAL.name, UID_SCHEMAS.V7_SERIAL.value.title),
+    )
+
+    # How many times to draw fresh V7 serial candidates before giving up on filling a lease.
+    v7_attempt_limit = 20
+
+    machine = models.ForeignKey(Machine, related_name="barcode_leases", on_delete=models.CASCADE)
+    schema = models.CharField(max_length=255, choices=LEASABLE_SCHEMAS)
+    serial_date = models.DateField(null=True, blank=True)
+
+    date_created = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    released_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-date_created"]
+
+    def __str__(self):
+        return F"{self.get_schema_display()} lease for {self.machine} until {self.expires_at}"
+
+    @property
+    def is_open(self):
+        return self.released_at is None and self.expires_at > datetime.datetime.now()
+
+    @classmethod
+    def create_lease(cls, machine, schema, count, duration, serial_date=None):
+        """
+        Reserve `count` unused codes of the given schema for a machine, for `duration` (a timedelta), and return
+        the lease and its list of codes. V7 serial leases need a `serial_date`.
+        """
+        if schema == UID_SCHEMAS.V7_SERIAL.name and serial_date is None:
+            raise ValidationError("V7 serial number leases need a serial date")
+
+        with transaction.atomic():
+            lease = cls.objects.create(
+                machine=machine,
+                schema=schema,
+                serial_date=serial_date if schema == UID_SCHEMAS.V7_SERIAL.name else None,
+                expires_at=datetime.datetime.now() + duration,
+            )
+
+            codes = []
+            attempts = 0
+            while len(codes) < count:
+                attempts += 1
+                if schema == UID_SCHEMAS.V7_SERIAL.name and attempts > cls.v7_attempt_limit:
+                    raise ValidationError(f"Couldn't find {count} unused V7 serial numbers for {serial_date}")
+
+                codes += lease.reserve(lease.draw_candidates(count - len(codes)))
+
+        return lease, codes
+
+    def draw_candidates(self, count):
+        """Return `count` candidate codes for this lease. They may already be in use."""
+        if self.schema == UID_SCHEMAS.V6_BARCODE.name:
+            return draw_v6_barcodes(count)
+        return random_v7_serials(self.serial_date, count)
+
+    def reserve(self, candidates):
+        """Hold as many of the candidate codes as are free for this lease, and return the ones reserved."""
+        existing = set(UniqueID.objects.filter(code__in=candidates).values_list("code", flat=True))
+        rows = [(code, self.pk) for code in dict.fromkeys(candidates) if code not in existing]
+        reserved = set(insert_ignoring_conflicts(LeasedCode, ["code", "lease"], rows))
+        return [code for code in candidates if code in reserved]
+
+    def confirm(self, codes):
+        """
+        Turn the given leased codes into UniqueIDs, now that they've been printed. Their LeasedCode rows are kept,
+        marked as confirmed, as a record of which lease they came from.
+
+        Returns a tuple of (confirmed, rejected) codes. Codes this lease has already confirmed count as confirmed
+        again, so that a retried request gets the same answer. Anything else this lease doesn't hold is rejected,
+        even if it's a UniqueID already. Raises a ValidationError if the lease has expired or been released, since
+        its codes may have gone back into the pool.
+        """
+        now = datetime.datetime.now()
+        with transaction.atomic():
+            # Locked, so the lease can't be released part way through.
+            lease = BarcodeLease.objects.select_for_update().get(pk=self.pk)
+            if not lease.is_open:
+                raise ValidationError(F"Barcode lease {self.pk} has expired or been released")
+
+            held = set(
+                LeasedCode.objects.select_for_update()
+                .filter(lease=self, code__in=codes, confirmed_at=None)
+                .values_list("code", flat=True)
+            )
+            UniqueID.bulk_create_codes(list(held))
+            LeasedCode.objects.filter(lease=self, code__in=held).update(confirmed_at=now)
+
+            confirmed_codes = set(
+                LeasedCode.objects.filter(lease=self, code__in=codes).exclude(confirmed_at=None)
+                .values_list("code", flat=True)
+            )
+
+        confirmed = [code for code in codes if code in confirmed_codes]
+        rejected = [code for code in codes if code not in confirmed_codes]
+        return confirmed, rejected
+
+    def release(self, codes=None):
+        """
+        Give back unused codes: either the given list, or everything left on the lease (which also closes it).
+        Returns the number of codes released.
+        """
+        leased_codes = LeasedCode.objects.filter(lease=self, confirmed_at=None)
+        if codes is not None:
+            leased_codes = leased_codes.filter(code__in=codes)
+        else:
+            self.released_at = datetime.datetime.now()
+            self.save()
+
+        released, _ = leased_codes.delete()
+        return released
+
+    @classmethod
+    def reclaim_expired(cls):
+        """Release every code still held by an expired lease. Returns the number of codes released."""
+        released, _ = LeasedCode.objects.filter(
+            lease__expires_at__lte=datetime.datetime.now(), confirmed_at=None
+        ).delete()
+        return released
+
+
+class LeasedCode(models.Model):
+    """
+    A code that's been handed out on a BarcodeLease. Until it's confirmed as used, it can be released back into the
+    pool; once it has been, it's a UniqueID, and this row records which lease it came from.
+    """
+    code = models.CharField(max_length=255, primary_key=True)
+    lease = models.ForeignKey(BarcodeLease, related_name="leased_codes", on_delete=models.CASCADE)
+    confirmed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.code
+
+
+class IdempotencyKey(models.Model):
+    """
+    The stored response to an API request that was sent with an Idempotency-Key header. If a rig retries the request
+    with the same key - because its connection dropped before the response arrived, say - it gets this response back,
+    rather than the request being processed again. See IdempotentViewMixin.
+
+    Keys are only kept for settings.IDEMPOTENCY_KEY_TTL; delete_expired() clears out the rest.
+    A key can only be reused by the same user, for the same method and path.
+    """
+    key = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, related_name="+", null=True, blank=True, on_delete=models.CASCADE
+    )
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=255)
+
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    content_type = models.CharField(max_length=255, blank=True)
+    content = models.BinaryField(default=bytes)
+
+    date_created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return F"{self.method} {self.path} ({self.key})"
+
+    @classmethod
+    def delete_expired(cls, batch_size=10000):
+        """Delete every key older than settings.IDEMPOTENCY_KEY_TTL, a batch at a time. Returns the number deleted."""
+        cutoff = datetime.datetime.now() - settings.IDEMPOTENCY_KEY_TTL
+        deleted = 0
+
+        while True:
+            batch = cls.objects.filter(date_created__lt=cutoff).values_list("pk", flat=True)[:batch_size]
+            count, _ = cls.objects.filter(pk__in=list(batch)).delete()
+            deleted += count
+            if count < batch_size:
+                return deleted
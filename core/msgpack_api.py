@@ -0,0 +1,152 @@
+"""
+MessagePack support for the rig APIs.
+
+Rigs can opt in to MessagePack by sending `Content-Type: application/msgpack` (and `Accept: application/msgpack`,
+if they want MessagePack back); everything else carries on using JSON. Long lists of floats - event logs, mostly -
+can also be sent as packed little-endian binary arrays rather than as a list of individual floats, using one of two
+MessagePack extension types:
+  * FLOAT32_ARRAY (ext type 1) - a packed array of 4-byte floats. This is the most compact, and precise enough
+    for any measurement a rig can make.
+  * FLOAT64_ARRAY (ext type 2) - a packed array of 8-byte floats.
+Responses use FLOAT64_ARRAY for any list of floats at least PACK_MIN_LENGTH long, so nothing loses precision on the
+way back out.
+
+msgpack is an optional dependency. If it isn't installed, the parser and renderer aren't registered (see
+REST_FRAMEWORK in settings.py), and the APIs only speak JSON.
+"""
+import math
+
+import numpy
+from django.core.validators import MaxValueValidator, MinValueValidator
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+FLOAT32_ARRAY = 1
+FLOAT64_ARRAY = 2
+
+_EXT_DTYPES = {
+    FLOAT32_ARRAY: numpy.dtype("<f4"),
+    FLOAT64_ARRAY: numpy.dtype("<f8"),
+}
+
+# Shorter lists of floats aren't worth packing, and are easier to read when debugging if they're left alone.
+PACK_MIN_LENGTH = 16
+
+
+class PackedFloatArray(list):
+    """
+    A list of floats that arrived as a packed binary array.
+    Behaves exactly like a list, but keeps hold of the decoded numpy array (as `array`) so that PackedListField can
+    validate the whole thing at once.
+    """
+    def __init__(self, array):
+        super().__init__(array.tolist())
+        self.array = array
+
+
+def _ext_hook(code, data):
+    if code not in _EXT_DTYPES:
+        return msgpack.ExtType(code, data)
+
+    dtype = _EXT_DTYPES[code]
+    if len(data) % dtype.itemsize:
+        raise ParseError(F"Packed float array is {len(data)} bytes long, which isn't a multiple of {dtype.itemsize}")
+    return PackedFloatArray(numpy.frombuffer(data, dtype=dtype).astype(float))
+
+
+def _pack_float_lists(data):
+    """Replace every long enough list of floats in the (JSON-like) data with a FLOAT64_ARRAY."""
+    if isinstance(data, dict):
+        return {key: _pack_float_lists(value) for key, value in data.items()}
+    if isinstance(data, (list, tuple)):
+        if len(data) >= PACK_MIN_LENGTH and all(type(value) is float for value in data):
+            return msgpack.ExtType(FLOAT64_ARRAY, numpy.asarray(data, dtype=_EXT_DTYPES[FLOAT64_ARRAY]).tobytes())
+        return [_pack_float_lists(value) for value in data]
+    return data
+
+
+class MessagePackParser(BaseParser):
+    """Parse a MessagePack request body, decoding any packed float arrays into PackedFloatArrays."""
+    media_type = "application/msgpack"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), ext_hook=_ext_hook, raw=False)
+        except ParseError:
+            raise
+        except Exception as e:
+            raise ParseError(F"MessagePack parse error - {e}")
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Render response data as MessagePack, with long lists of floats packed as FLOAT64_ARRAYs."""
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        # Anything msgpack can't handle itself (dates, decimals, UUIDs...) is converted the same way as for JSON.
+        return msgpack.packb(_pack_float_lists(data), default=JSONEncoder().default, use_bin_type=True)
+
+
+class PackedListField(serializers.ListField):
+    """
+    A ListField that validates PackedFloatArrays in one go, rather than float by float.
+
+    Other data - including every JSON request - is validated as usual. So is a PackedFloatArray for a field with
+    any child validators other than minimum and maximum values, which are the only ones checked here. Either way,
+    lists of floats can't contain NaN or infinity, which would otherwise slip past the minimum and maximum checks.
+    """
+    non_finite_message = "Ensure this value is a finite number."
+
+    def to_internal_value(self, data):
+        if not isinstance(self.child, serializers.FloatField):
+            return super().to_internal_value(data)
+        if not isinstance(data, PackedFloatArray):
+            return self.check_finite(super().to_internal_value(data))
+
+        if not self.allow_empty and len(data) == 0:
+            self.fail("empty")
+
+        # Comparisons with NaN are always false, so non-finite values are checked for first.
+        checks = [(~numpy.isfinite(data.array), self.non_finite_message)]
+        for validator in self.child.validators:
+            if isinstance(validator, MinValueValidator):
+                failed = data.array < validator.limit_value
+            elif isinstance(validator, MaxValueValidator):
+                failed = data.array > validator.limit_value
+            else:
+                return self.check_finite(super().to_internal_value(data))
+            checks.append((failed, validator.message % {"limit_value": validator.limit_value}))
+
+        errors = {}
+        for failed, message in checks:
+            for index in numpy.flatnonzero(failed):
+                errors.setdefault(int(index), message)
+        if errors:
+            raise serializers.ValidationError({index: [message] for index, message in sorted(errors.items())})
+
+        return list(data)
+
+    def check_finite(self, values):
+        """Raise a ValidationError if any of a list of validated floats is NaN or infinite."""
+        errors = {
+            index: [self.non_finite_message]
+            for index, value in enumerate(values)
+            if value is not None and not math.isfinite(value)
+        }
+        if errors:
+            raise serializers.ValidationError(errors)
+        return values
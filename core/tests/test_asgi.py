@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+from django.http import HttpResponse
+from django.test import SimpleTestCase, override_settings
+from django.urls import path
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from base_models.base_view_classes.api import AsyncAPIViewMixin
+from web_interface.asgi import ThreadSensitiveASGIHandler
+
+
+def slow_view(request):
+    time.sleep(0.5)
+    return HttpResponse("slow")
+
+
+class FastView(AsyncAPIViewMixin, APIView):
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        return Response({"fast": True})
+
+
+urlpatterns = [
+    path("slow/", slow_view),
+    path("fast/", FastView.as_view()),
+]
+
+
+async def get(application, path):
+    """Make a GET request straight to an ASGI application, and return the status code and body."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "query_string": b"",
+        "headers": [(b"host", b"testserver")],
+        "server": ("testserver", 80),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await application(scope, receive, send)
+    body = b"".join(m.get("body", b"") for m in messages if m["type"] == "http.response.body")
+    return messages[0]["status"], body
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class TestASGI(SimpleTestCase):
+    def test_async_view_is_a_coroutine_function(self):
+        view = FastView.as_view()
+        self.assertTrue(asyncio.iscoroutinefunction(view))
+        self.assertIs(view.cls, FastView)
+
+
+    def test_slow_sync_view_does_not_block_async_views(self):
+        application = ThreadSensitiveASGIHandler()
+        finish_times = {}
+
+        async def timed_get(path):
+            status, body = await get(application, path)
+            finish_times[path] = time.monotonic()
+            return status, body
+
+        async def run():
+            slow = asyncio.ensure_future(timed_get("/slow/"))
+            await asyncio.sleep(0.05)
+            return await timed_get("/fast/"), await slow
+
+        start = time.monotonic()
+        # Run the event loop directly, as an ASGI server would. (async_to_sync would send thread-sensitive code back
+        # to this thread instead.)
+        fast_result, slow_result = asyncio.run(run())
+
+        self.assertEqual(fast_result, (200, b'{"fast":true}'))
+        self.assertEqual(slow_result, (200, b"slow"))
+        self.assertLess(finish_times["/fast/"] - start, 0.4)
+        self.assertLess(finish_times["/fast/"], finish_times["/slow/"])
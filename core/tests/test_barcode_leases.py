@@ -0,0 +1,99 @@
+from datetime import date, timedelta
+
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory
+
+from core.models import BarcodeLease, LeasedCode, Machine, UniqueID
+from core.uid_schemas import UID_SCHEMAS
+from core.views.api import ConfirmLeasedBarcodes, CreateBarcodeLease, ReleaseBarcodeLease
+
+
+class TestBarcodeLeases(TestCase):
+    def setUp(self):
+        self.machine = Machine.objects.create(hostname="123", name="machine")
+        self.factory = APIRequestFactory()
+
+    def create_lease(self, schema, count, serial_date=None):
+        return BarcodeLease.create_lease(self.machine, schema, count, timedelta(days=1), serial_date=serial_date)
+
+
+    def test_v6_lease(self):
+        lease, codes = self.create_lease("V6_BARCODE", 50)
+
+        self.assertEqual(len(set(codes)), 50)
+        self.assertTrue(all(UID_SCHEMAS.V6_BARCODE.value.match(code) for code in codes))
+        self.assertEqual(lease.leased_codes.count(), 50)
+        self.assertEqual(UniqueID.objects.count(), 0)
+
+
+    def test_v7_lease(self):
+        lease, codes = self.create_lease("V7_SERIAL", 50, serial_date=date(2022, 1, 31))
+
+        self.assertEqual(len(set(codes)), 50)
+        self.assertTrue(all(code.startswith("310122-") for code in codes))
+        self.assertTrue(all(UID_SCHEMAS.V7_SERIAL.value.match(code) for code in codes))
+
+
+    def test_confirm_and_release(self):
+        lease, codes = self.create_lease("V6_BARCODE", 10)
+
+        confirmed, rejected = lease.confirm(codes[:3] + ["111111111"])
+        self.assertEqual(confirmed, codes[:3])
+        self.assertEqual(rejected, ["111111111"])
+        self.assertEqual(UniqueID.objects.filter(code__in=codes).count(), 3)
+
+        # Confirming again gives the same answer.
+        confirmed, rejected = lease.confirm(codes[:3])
+        self.assertEqual(confirmed, codes[:3])
+
+        # Codes that are UniqueIDs already, but weren't confirmed from this lease, are still rejected.
+        other_lease, other_codes = self.create_lease("V6_BARCODE", 1)
+        other_lease.confirm(other_codes)
+        confirmed, rejected = lease.confirm(codes[3:4] + other_codes)
+        self.assertEqual(confirmed, codes[3:4])
+        self.assertEqual(rejected, other_codes)
+
+        self.assertEqual(lease.release(), 6)
+        self.assertFalse(lease.is_open)
+        self.assertEqual(LeasedCode.objects.filter(lease=lease, confirmed_at=None).count(), 0)
+        self.assertEqual(lease.leased_codes.count(), 4)
+
+        # A released lease can't confirm anything more.
+        with self.assertRaises(ValidationError):
+            lease.confirm(codes[3:4])
+
+
+    def test_reclaim_expired(self):
+        lease, codes = self.create_lease("V6_BARCODE", 10)
+        lease.confirm(codes[:1])
+        BarcodeLease.objects.filter(pk=lease.pk).update(expires_at=lease.date_created)
+
+        # Expired leases can't confirm codes, even before they've been reclaimed.
+        with self.assertRaises(ValidationError):
+            lease.confirm(codes[1:2])
+
+        self.assertEqual(BarcodeLease.reclaim_expired(), 9)
+        self.assertEqual(LeasedCode.objects.get().code, codes[0])
+
+
+    def test_views(self):
+        request = self.factory.post("/", {"machine": "123", "schema": "V7_SERIAL", "count": 5}, format="json")
+        response = CreateBarcodeLease.as_view()(request)
+        self.assertEqual(response.status_code, 400)
+
+        data = {"machine": "123", "schema": "V7_SERIAL", "count": 5, "serial_date": "010122"}
+        response = CreateBarcodeLease.as_view()(self.factory.post("/", data, format="json"))
+        self.assertEqual(response.status_code, 201)
+        lease_id, codes = response.data["id"], response.data["codes"]
+
+        request = self.factory.post("/", {"codes": codes[:2]}, format="json")
+        response = ConfirmLeasedBarcodes.as_view()(request, pk=lease_id)
+        self.assertEqual(response.data, {"confirmed": codes[:2], "rejected": []})
+
+        response = ReleaseBarcodeLease.as_view()(self.factory.post("/", {}, format="json"), pk=lease_id)
+        self.assertEqual(response.data, {"released": 3})
+
+        request = self.factory.post("/", {"codes": codes[2:3]}, format="json")
+        response = ConfirmLeasedBarcodes.as_view()(request, pk=lease_id)
+        self.assertEqual(response.status_code, 409)
@@ -0,0 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+
+from asgiref.sync import async_to_sync
+from django.db import IntegrityError, connection, transaction
+from django.test import TransactionTestCase
+from rest_framework.test import APIRequestFactory
+
+from core.models import Machine, MachineUsage, Operator
+from core.views.api import MachinePing
+
+
+class TestMachineUsage(TransactionTestCase):
+    def setUp(self):
+        self.machine = Machine.objects.create(hostname="123", name="machine")
+        self.operator = Operator.objects.create(code="123", name="operator")
+
+
+    def test_single_open_session_constraint(self):
+        MachineUsage.objects.create(machine=self.machine, operator=self.operator)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            MachineUsage.objects.create(machine=self.machine, operator=self.operator)
+
+
+    def test_log_in_closes_open_session(self):
+        first = MachineUsage.log_in(self.machine, self.operator)
+        second = MachineUsage.log_in(self.machine, self.operator)
+
+        first.refresh_from_db()
+        self.assertIsNotNone(first.logged_out_at)
+        self.assertIsNone(second.logged_out_at)
+
+
+    def test_concurrent_pings(self):
+        """Fire a burst of simultaneous pings at the same machine, and check only one session is ever opened."""
+        thread_count = 10
+        barrier = Barrier(thread_count)
+        # MachinePing is an async view, so wrap it up to be called synchronously from each thread.
+        view = async_to_sync(MachinePing.as_view())
+        factory = APIRequestFactory()
+
+        def ping(_):
+            try:
+                request = factory.post("/", {"hostname": "123", "operator_id": "123"}, format="json")
+                barrier.wait()
+                return view(request).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=thread_count) as executor:
+            status_codes = list(executor.map(ping, range(thread_count)))
+
+        self.assertEqual(status_codes, [200] * thread_count)
+        self.assertEqual(MachineUsage.objects.count(), 1)
+        self.assertEqual(MachineUsage.objects.filter(logged_out_at=None).count(), 1)
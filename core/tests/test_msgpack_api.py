@@ -0,0 +1,103 @@
+from unittest import skipUnless
+
+import numpy
+
+from base_models import models
+from core.models import Machine, Operator, Sku, UniqueID, WorkOrder
+from core.msgpack_api import FLOAT32_ARRAY, FLOAT64_ARRAY, msgpack
+from core.tests.api_test_case import APITestCase
+from core.utils import reverse
+
+
+def packed(values, code=FLOAT32_ARRAY):
+    dtype = "<f4" if code == FLOAT32_ARRAY else "<f8"
+    return msgpack.ExtType(code, numpy.asarray(values, dtype=dtype).tobytes())
+
+
+@skipUnless(msgpack, "msgpack isn't installed")
+class TestMessagePackAPI(APITestCase):
+    def setUp(self):
+        self.machine = Machine.objects.create(hostname="123", name="machine")
+        self.operator = Operator.objects.create(code="123", name="operator")
+        self.work_order = WorkOrder.objects.create(code="E3D-WO-123")
+        self.item = models.SingleItem.objects.create(
+            sku=Sku.objects.create(code="123"),
+            uid=UniqueID.objects.create(code="123456789"),
+        )
+        self.event = models.Event.objects.create(
+            machine=self.machine,
+            operator=self.operator,
+            work_order=self.work_order,
+            item=self.item,
+        )
+
+    def put_msgpack(self, data):
+        url = reverse("test:basic_single_finish", pk=self.event.pk)
+        return self.api.put(
+            url,
+            msgpack.packb(data, use_bin_type=True),
+            content_type="application/msgpack",
+            HTTP_ACCEPT="application/msgpack",
+        )
+
+
+    def test_finish_with_packed_floats(self):
+        timepoints = [i / 4 for i in range(100)]
+        response = self.put_msgpack({"completed": True, "log_timepoints": packed(timepoints)})
+        self.assertEqual(response.status_code, 200, response.content)
+
+        self.event.refresh_from_db()
+        self.assertTrue(self.event.completed)
+        self.assertEqual(self.event.log_timepoints, timepoints)
+
+        # The response comes back as MessagePack too, with the floats packed at full precision.
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        response_data = msgpack.unpackb(response.content, raw=False)
+        self.assertEqual(response_data["id"], self.event.pk)
+        self.assertEqual(response_data["log_timepoints"], packed(timepoints, code=FLOAT64_ARRAY))
+
+
+    def test_finish_with_plain_msgpack_lists(self):
+        response = self.put_msgpack({"log_timepoints": [0, 1, 2.5]})
+        self.assertEqual(response.status_code, 200, response.content)
+
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.log_timepoints, [0, 1, 2.5])
+
+
+    def test_packed_floats_are_validated(self):
+        response = self.put_msgpack({"log_timepoints": packed([0, 1, -2, 3, -4])})
+        self.assertEqual(response.status_code, 400)
+
+        errors = msgpack.unpackb(response.content, raw=False, strict_map_key=False)
+        self.assertEqual(list(errors["log_timepoints"]), [2, 4])
+
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.log_timepoints, [])
+
+
+    def test_non_finite_floats_are_rejected(self):
+        # log_timepoints has a minimum, which NaN isn't less than.
+        for values in [
+            packed([0, float("nan"), 2]),
+            packed([0, float("inf"), 2], code=FLOAT64_ARRAY),
+            [0, float("-inf"), 2],
+        ]:
+            response = self.put_msgpack({"log_timepoints": values})
+            self.assertEqual(response.status_code, 400)
+            errors = msgpack.unpackb(response.content, raw=False, strict_map_key=False)
+            self.assertEqual(list(errors["log_timepoints"]), [1])
+
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.log_timepoints, [])
+
+
+    def test_truncated_packed_floats(self):
+        response = self.put_msgpack({"log_timepoints": msgpack.ExtType(FLOAT32_ARRAY, b"\x00\x00\x00")})
+        self.assertEqual(response.status_code, 400)
+
+
+    def test_json_still_works(self):
+        url = reverse("test:basic_single_finish", pk=self.event.pk)
+        response_data = self.putData(url, {"log_timepoints": [0, 1, 2.5]}, status_code_check=200)
+        self.assertEqual(response_data["log_timepoints"], [0, 1, 2.5])
@@ -0,0 +1,65 @@
+import datetime
+import io
+
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+
+from core.models import UniqueID
+from core.uid_import import import_uid_codes
+from core.utils import reverse
+
+
+class TestUIDImport(TestCase):
+    def test_import(self):
+        UniqueID.objects.create(code="123456789")
+
+        codes_file = io.StringIO(
+            "123456789\n"
+            "987654321,extra column\n"
+            "\n"
+            "not a code\n"
+            "010122-AC12\n"
+            "987654321\n"
+        )
+        report = import_uid_codes(codes_file, batch_size=2)
+
+        self.assertEqual(report.imported, 2)
+        self.assertEqual(report.existing, 2)
+        self.assertEqual(report.invalid, [(4, "not a code")])
+
+        self.assertEqual(UniqueID.objects.count(), 3)
+        self.assertEqual(UniqueID.objects.get(code="010122-AC12").matches_schemas, ["V7_SERIAL"])
+        self.assertEqual(UniqueID.objects.get(code="010122-AC12").manufacture_date, datetime.date(2022, 1, 1))
+        self.assertIsNone(UniqueID.objects.get(code="987654321").manufacture_date)
+
+        out = io.StringIO()
+        report.write_invalid_csv(out)
+        self.assertEqual(out.getvalue().splitlines(), ["Line,Code", "4,not a code"])
+
+
+    def test_admin_import(self):
+        self.client.force_login(User.objects.create_superuser("admin"))
+        url = reverse("admin:core_uniqueid_import")
+
+        # Every rejected code is downloaded, however many there are.
+        lines = ["123456789"] + [F"not a code {i}" for i in range(30)]
+        codes_file = SimpleUploadedFile("codes.csv", "\n".join(lines).encode())
+        response = self.client.post(url, {"codes_file": codes_file})
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = response.content.decode().splitlines()
+        self.assertEqual(rows[:2], ["Line,Code", "2,not a code 0"])
+        self.assertEqual(len(rows), 31)
+        self.assertTrue(UniqueID.objects.filter(code="123456789").exists())
+        self.assertEqual(response["X-Import-Summary"], "1 imported, 0 already existed, 30 invalid")
+        # No message is left waiting to appear on the next page.
+        self.assertEqual(list(get_messages(response.wsgi_request)), [])
+
+        codes_file = SimpleUploadedFile("codes.csv", b"987654321\n")
+        response = self.client.post(url, {"codes_file": codes_file})
+        self.assertRedirects(response, reverse("admin:core_uniqueid_changelist"), fetch_redirect_response=False)
+        self.assertEqual(
+            [str(message) for message in get_messages(response.wsgi_request)],
+            ["Import finished: 1 imported, 0 already existed, 0 invalid."],
+        )
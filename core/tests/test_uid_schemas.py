@@ -0,0 +1,86 @@
+from datetime import date
+
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory
+
+from core.models import UniqueID
+from core.uid_schemas import UID_SCHEMAS
+from core.views.api import ValidateUniqueIDs
+
+
+class TestUIDSchemas(TestCase):
+    codes = [
+        "123456789",
+        "010122-AC12",
+        "22010112345",
+        "128-01-220101-1234",
+        "12345678",
+        "123456789\n",
+        "",
+    ]
+
+    def test_match_all_agrees_with_individual_schemas(self):
+        for code in self.codes:
+            expected = [entry for entry in UID_SCHEMAS if entry.value.match(code)]
+            self.assertEqual(UID_SCHEMAS.match_all(code), expected, msg=code)
+
+
+    def test_get_schema(self):
+        self.assertIs(UID_SCHEMAS.get_schema("V7_SERIAL"), UID_SCHEMAS.V7_SERIAL.value)
+        self.assertIsNone(UID_SCHEMAS.get_schema("NOT_A_SCHEMA"))
+
+
+    def test_bulk_validation_view(self):
+        UniqueID.objects.create(code="123456789")
+
+        view = ValidateUniqueIDs.as_view()
+        request = APIRequestFactory().post("/", {"codes": ["123456789", "bad", "010122-AC12"]}, format="json")
+        response = view(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [
+            {"code": "123456789", "valid": True, "schemas": ["V6_BARCODE"], "exists": True},
+            {"code": "bad", "valid": False, "schemas": [], "exists": False},
+            {"code": "010122-AC12", "valid": True, "schemas": ["V7_SERIAL"], "exists": False},
+        ])
+
+
+    def test_bulk_validation_view_bad_input(self):
+        view = ValidateUniqueIDs.as_view()
+        request = APIRequestFactory().post("/", {"codes": "123456789"}, format="json")
+        self.assertEqual(view(request).status_code, 400)
+
+
+    def test_parse_embedded_fields(self):
+        self.assertEqual(UID_SCHEMAS.V7_SERIAL.value.parse("020122-AC12"), {"date": date(2022, 1, 2)})
+        self.assertEqual(UID_SCHEMAS.HEMERA_QR.value.parse("22010212345"), {"date": date(2022, 1, 2)})
+        self.assertEqual(
+            UID_SCHEMAS.ROTO_QR.value.parse("128-07-220102-1234"),
+            {"motor_type": "07", "date": date(2022, 1, 2)},
+        )
+        self.assertEqual(UID_SCHEMAS.V7_SERIAL.value.parse("310222-AC12"), {"date": None})
+        self.assertEqual(UID_SCHEMAS.V6_BARCODE.value.parse("123456789"), {})
+
+
+    def test_manufacture_date_stored(self):
+        self.assertEqual(UniqueID.objects.create(code="020122-AC12").manufacture_date, date(2022, 1, 2))
+        self.assertIsNone(UniqueID.objects.create(code="123456789").manufacture_date)
+
+        UniqueID.bulk_create_codes(["128-07-220102-1234"])
+        self.assertEqual(UniqueID.objects.get(code="128-07-220102-1234").manufacture_date, date(2022, 1, 2))
+
+
+    def test_backfill_manufacture_dates(self):
+        UniqueID.bulk_create_codes(["020122-AC12", "030122-AC12", "22010212345", "123456789"])
+        UniqueID.objects.update(manufacture_date=None)
+
+        self.assertEqual(UniqueID.backfill_manufacture_dates(batch_size=2), 3)
+        self.assertEqual(
+            dict(UniqueID.objects.values_list("code", "manufacture_date")),
+            {
+                "020122-AC12": date(2022, 1, 2),
+                "030122-AC12": date(2022, 1, 3),
+                "22010212345": date(2022, 1, 2),
+                "123456789": None,
+            },
+        )
@@ -0,0 +1,48 @@
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory
+
+from core.barcodes import V6_BARCODE_RANGE, permute_v6_barcode
+from core.models import UniqueID
+from core.uid_schemas import UID_SCHEMAS
+from core.views.api import CreateNewV6Barcode
+
+
+class TestV6Barcodes(TestCase):
+    def test_permutation_is_collision_free(self):
+        values = [permute_v6_barcode(i) for i in range(20000)]
+        self.assertEqual(len(set(values)), len(values))
+        self.assertTrue(all(0 <= v < V6_BARCODE_RANGE for v in values))
+
+        # Consecutive sequence values shouldn't produce consecutive barcodes.
+        self.assertNotEqual(values[:10], sorted(values[:10]))
+
+
+    def test_permutation_range(self):
+        with self.assertRaises(ValueError):
+            permute_v6_barcode(V6_BARCODE_RANGE)
+
+
+    def test_allocate(self):
+        codes = UniqueID.allocate_v6_barcodes(500)
+
+        self.assertEqual(len(set(codes)), 500)
+        self.assertEqual(UniqueID.objects.filter(code__in=codes).count(), 500)
+
+        uid = UniqueID.objects.get(code=codes[0])
+        self.assertEqual(uid.matches_schemas, [UID_SCHEMAS.V6_BARCODE.name])
+
+
+    def test_view(self):
+        view = CreateNewV6Barcode.as_view()
+        factory = APIRequestFactory()
+
+        response = view(factory.get("/"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(UID_SCHEMAS.V6_BARCODE.value.match(response.data["barcode"]))
+
+        response = view(factory.get("/", {"count": 5}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["barcodes"]), 5)
+
+        response = view(factory.get("/", {"count": 0}))
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,118 @@
+import csv
+import datetime
+import io
+
+from django.db import connection, transaction
+
+from .models import UniqueID
+from .uid_schemas import UID_SCHEMAS
+
+
+class UIDImportReport:
+    """
+    The outcome of an import_uid_codes() run.
+      * imported - How many new UniqueIDs were created.
+      * existing - How many valid codes were skipped because they were already in the database (or repeated
+        in the input).
+      * invalid - A list of (line_number, code) tuples for every code that didn't match any UID schema.
+    """
+    def __init__(self):
+        self.imported = 0
+        self.existing = 0
+        self.invalid = []
+
+    def __str__(self):
+        return F"{self.imported} imported, {self.existing} already existed, {len(self.invalid)} invalid"
+
+    def write_invalid_csv(self, file):
+        """Write the rejected codes to a file-like object as a CSV."""
+        writer = csv.writer(file)
+        writer.writerow(["Line", "Code"])
+        writer.writerows(self.invalid)
+
+
+def read_uid_codes(lines):
+    """
+    Yield (line_number, code) for each code in a CSV or newline-separated file.
+    Only the first column of each row is used; blank rows are skipped.
+    """
+    for line_number, row in enumerate(csv.reader(lines), start=1):
+        if row and row[0].strip():
+            yield line_number, row[0].strip()
+
+
+def _copy_batch(cursor, batch, report):
+    """
+    Classify a batch of (line_number, code) tuples, then insert the valid ones by COPYing them into a temporary
+    table and moving them across with a single INSERT ... ON CONFLICT DO NOTHING.
+    """
+    schemas = UID_SCHEMAS.classify(code for _, code in batch)
+
+    rows = []
+    for line_number, code in batch:
+        if schemas[code]:
+            # Valid codes never contain tabs, newlines or backslashes, so they're safe in COPY's text format.
+            manufacture_date = UID_SCHEMAS.manufacture_date(code, schemas[code])
+            rows.append("{}\t{{{}}}\t{}\n".format(
+                code,
+                ",".join(s.name for s in schemas[code]),
+                manufacture_date.isoformat() if manufacture_date else "\\N",
+            ))
+        else:
+            report.invalid.append((line_number, code))
+
+    if not rows:
+        return
+
+    cursor.copy_expert(
+        "COPY uid_import (code, matches_schemas, manufacture_date) FROM STDIN",
+        io.StringIO("".join(rows)),
+    )
+    cursor.execute(
+        F"""
+        INSERT INTO {UniqueID._meta.db_table} (code, date_created, matches_schemas, manufacture_date)
+        SELECT DISTINCT ON (code) code, %s, matches_schemas, manufacture_date FROM uid_import
+        ON CONFLICT (code) DO NOTHING
+        """,
+        [datetime.date.today()],
+    )
+
+    report.imported += cursor.rowcount
+    report.existing += len(rows) - cursor.rowcount
+
+
+def import_uid_codes(lines, batch_size=100000):
+    """
+    Bulk-import UniqueIDs from an iterable of lines (an open file, for instance), and return a UIDImportReport.
+
+    Codes are checked against UID_SCHEMAS and stored with their `matches_schemas` and `manufacture_date` filled in;
+    any that don't match a schema are left out and listed in the report. Codes that already exist are skipped. Each
+    batch of codes is committed in its own transaction, so a large import makes steady progress and can safely be
+    re-run if it fails part of the way through.
+
+    This bypasses UniqueID.save() entirely, which is what makes it fast enough for backfills of millions of codes.
+    """
+    report = UIDImportReport()
+    batch = []
+
+    def flush():
+        with transaction.atomic(), connection.cursor() as cursor:
+            # The table is normally dropped at the end of each batch's transaction, but it can outlive it if the
+            # import is itself run inside a transaction, so make sure it's present and empty either way.
+            cursor.execute(
+                "CREATE TEMPORARY TABLE IF NOT EXISTS uid_import "
+                "(code varchar(255), matches_schemas varchar(255)[], manufacture_date date) ON COMMIT DROP"
+            )
+            cursor.execute("TRUNCATE uid_import")
+            _copy_batch(cursor, batch, report)
+        batch.clear()
+
+    for line_number, code in read_uid_codes(lines):
+        batch.append((line_number, code))
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+
+    return report
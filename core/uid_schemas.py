@@ -1,14 +1,42 @@
 import re
+from datetime import datetime
 from enum import Enum
 
 
 class UIDSchema:
-    def __init__(self, title, regex):
+    """
+    A pattern that some kind of unique ID code follows.
+
+    Some codes have information embedded in them, like the date the part was made. To extract it, pass a
+    `fields_regex`: a version of `regex` with named groups around each embedded field. A group named `date` is
+    converted to a date using `date_format`; any other groups are returned as strings. See parse().
+    """
+    def __init__(self, title, regex, fields_regex=None, date_format=None):
         self.regex = regex
         self.title = title
+        self.pattern = re.compile(regex)
+        self.fields_pattern = re.compile(fields_regex) if fields_regex else None
+        self.date_format = date_format
 
     def match(self, uid_code):
-        return re.fullmatch(self.regex, uid_code)
+        return self.pattern.fullmatch(uid_code)
+
+    def parse(self, uid_code):
+        """
+        Return a dictionary of the fields embedded in the given code, or an empty dictionary if this schema doesn't
+        define any (or the code doesn't match). A `date` field that isn't a real date, like 310222, becomes None.
+        """
+        match = self.fields_pattern.fullmatch(uid_code) if self.fields_pattern else None
+        if match is None:
+            return {}
+
+        fields = match.groupdict()
+        if "date" in fields:
+            try:
+                fields["date"] = datetime.strptime(fields["date"], self.date_format).date()
+            except ValueError:
+                fields["date"] = None
+        return fields
 
 
 class UID_SCHEMAS(Enum):
@@ -16,22 +44,61 @@ class UID_SCHEMAS(Enum):
     V6_BARCODE = UIDSchema("V6 Barcode", r"[0-9]{9}")
 
     # V7 serial numbers follow a DDMMYY-XXXX structure, where the Xs are capitalised alphanumeric.
-    V7_SERIAL = UIDSchema("V7 Serial Number", r"[0-3][0-9][0-1][0-9][0-9][0-9]\-[0-9AC-HJ-NP-Z]{4}")
+    V7_SERIAL = UIDSchema(
+        "V7 Serial Number",
+        r"[0-3][0-9][0-1][0-9][0-9][0-9]\-[0-9AC-HJ-NP-Z]{4}",
+        fields_regex=r"(?P<date>[0-9]{6})\-[0-9AC-HJ-NP-Z]{4}",
+        date_format="%d%m%y",
+    )
 
     # Hemera QR codes are YYMMDDXXXXX, where the Xs are numeric.
-    HEMERA_QR = UIDSchema("Hemera QR Code", r"[0-9][0-9][0-1][0-9][0-3][0-9][0-9]{5}")
+    HEMERA_QR = UIDSchema(
+        "Hemera QR Code",
+        r"[0-9][0-9][0-1][0-9][0-3][0-9][0-9]{5}",
+        fields_regex=r"(?P<date>[0-9]{6})[0-9]{5}",
+        date_format="%y%m%d",
+    )
 
     # Revo Roto QR codes are 128-QQ-YYMMDD-XXXX, where the Qs are numeric for motor type and Xs are numeric.
-    ROTO_QR = UIDSchema("Revo Roto QR Code", r"128-[0-9]{2}-[0-9][0-9][0-1][0-9][0-3][0-9]-[0-9]{4}")
+    ROTO_QR = UIDSchema(
+        "Revo Roto QR Code",
+        r"128-[0-9]{2}-[0-9][0-9][0-1][0-9][0-3][0-9]-[0-9]{4}",
+        fields_regex=r"128-(?P<motor_type>[0-9]{2})-(?P<date>[0-9]{6})-[0-9]{4}",
+        date_format="%y%m%d",
+    )
 
     @classmethod
     def match_all(cls, uid_code):
-        """Return a list of all schemas that match the given UID."""
-        matched = []
-        for schema_entry in cls:
-            if schema_entry.value.match(uid_code):
-                matched.append(schema_entry)
-        return matched
+        """
+        Return a list of all schemas that match the given UID.
+
+        All the schemas are checked in a single pass over the code, using the combined pattern built below.
+        """
+        match = _ALL_SCHEMAS_PATTERN.match(uid_code)
+        return [cls[name] for name, value in match.groupdict().items() if value is not None]
+
+    @classmethod
+    def classify(cls, uid_codes):
+        """
+        Return a dictionary mapping each of the given UID codes to a list of the schemas it matches.
+        Repeated codes are only matched once.
+        """
+        return {code: cls.match_all(code) for code in set(uid_codes)}
+
+    @classmethod
+    def manufacture_date(cls, uid_code, schemas=None):
+        """
+        Return the manufacture date embedded in the given code by the first matching schema that has one, or None.
+        Pass in the already-matched `schemas` to avoid matching the code again.
+        """
+        if schemas is None:
+            schemas = cls.match_all(uid_code)
+
+        for schema_entry in schemas:
+            date = schema_entry.value.parse(uid_code).get("date", None)
+            if date is not None:
+                return date
+        return None
 
     @classmethod
     def choices(cls):
@@ -47,7 +114,14 @@ class UID_SCHEMAS(Enum):
         Helper method. Convert the name of a schema entry into the actual UIDSchema object.
         Return None if the entry name doesn't exist on this enum.
         """
-        for schema_entry in cls:
-            if schema_entry.name == schema_entry_name:
-                return schema_entry.value
-        return None
+        schema_entry = cls.__members__.get(schema_entry_name, None)
+        return schema_entry.value if schema_entry is not None else None
+
+
+# Every schema, compiled into one pattern. Each schema becomes an optional lookahead that must reach the end of the
+# code, capturing into a group named after the schema; since lookaheads don't consume anything, every schema is
+# tried from the start of the code, and the groups that captured tell us which ones matched.
+_ALL_SCHEMAS_PATTERN = re.compile("".join(
+    F"(?:(?=(?P<{schema_entry.name}>{schema_entry.value.regex})\\Z))?"
+    for schema_entry in UID_SCHEMAS
+))
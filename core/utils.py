@@ -3,7 +3,10 @@ import re
 from datetime import datetime
 
 from django.core.exceptions import FieldDoesNotExist
+from django.db import IntegrityError, connection, transaction
+from django.db.models import UniqueConstraint
 from django.urls import reverse as base_reverse
+from psycopg2.extras import execute_values
 
 
 def get_past_date():
@@ -32,6 +35,175 @@ def readable_field_name(obj, field_name):
     return readable_name
 
 
+def insert_ignoring_conflicts(model, fields, rows):
+    """
+    Insert `rows` (a list of tuples, in the same order as `fields`) into the model's table with a single
+    INSERT ... ON CONFLICT DO NOTHING, and return the primary keys of the rows that were actually inserted.
+
+    Rows that clash with an existing row on any unique constraint are silently skipped. Like bulk_create(),
+    this bypasses save() and any signals.
+    """
+    if not rows:
+        return []
+
+    meta = model._meta
+    columns = ", ".join(meta.get_field(f).column for f in fields)
+
+    with connection.cursor() as cursor:
+        inserted = execute_values(
+            cursor.cursor,
+            F"INSERT INTO {meta.db_table} ({columns}) VALUES %s ON CONFLICT DO NOTHING RETURNING {meta.pk.column}",
+            rows,
+            page_size=len(rows),
+            fetch=True,
+        )
+
+    return [pk for (pk,) in inserted]
+
+
+def has_unique_constraint(model, field_names):
+    """
+    Return whether the database enforces uniqueness on these fields of the model, or on some subset of them.
+    A constraint can only cover fields in a single table, so for inherited models, each table is checked separately.
+    """
+    names = set(field_names)
+    if any(model._meta.get_field(name).unique for name in names):
+        return True
+
+    for table_model in [model, *model._meta.get_parent_list()]:
+        opts = table_model._meta
+        if any(set(unique) <= names for unique in opts.unique_together):
+            return True
+        if any(
+            isinstance(constraint, UniqueConstraint) and constraint.condition is None and set(constraint.fields) <= names
+            for constraint in opts.constraints
+        ):
+            return True
+
+    return False
+
+
+def advisory_xact_lock(keys, shared_keys=()):
+    """
+    Take a transaction-level advisory lock on each of a list of string keys, and a shared one on each of
+    `shared_keys`. Shared locks on a key only block exclusive ones, so many transactions can hold them at once.
+
+    The locks are all taken in a single query, in a consistent order, so two transactions locking overlapping keys
+    can't deadlock.
+    """
+    keys = list(keys)
+    shared_keys = list(shared_keys)
+    if not keys and not shared_keys:
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT CASE WHEN shared THEN pg_advisory_xact_lock_shared(lock_id) ELSE pg_advisory_xact_lock(lock_id) END "
+            "FROM (SELECT DISTINCT hashtext(key) AS lock_id, shared FROM unnest(%s::text[], %s::boolean[]) "
+            "AS keys(key, shared) ORDER BY lock_id, shared) AS locks",
+            [keys + shared_keys, [False] * len(keys) + [True] * len(shared_keys)],
+        )
+
+
+def lock_lookups(model, lookups):
+    """
+    Take a transaction-level advisory lock on each of a list of lookups (dicts of field name to value or object) for
+    the model, for creating rows that no unique constraint covers. Everything that creates a row for the same lookup
+    takes the same lock, so only one can check whether it exists and create it at a time. See advisory_xact_lock().
+    """
+    advisory_xact_lock({
+        F"{model._meta.db_table}:" + repr(sorted((k, str(getattr(v, "pk", v))) for k, v in lookup.items()))
+        for lookup in lookups
+    })
+
+
+def get_or_create_on_conflict(model, lookup, defaults=None):
+    """
+    A race-free replacement for `model.objects.get_or_create(**lookup, defaults=defaults)`. Returns (obj, created).
+
+    Django's get_or_create() does a SELECT, then an INSERT, and if another request inserted the same row in between,
+    catches the IntegrityError and SELECTs again - which fails outright inside a transaction. Instead, this tries
+    the INSERT first with ON CONFLICT DO NOTHING, so creating a new row is a single statement. If nothing was
+    inserted, the existing row is fetched with a normal query.
+
+    Multi-table-inherited models (e.g. SingleItem) are inserted one table at a time in the same statement, with each
+    child row only inserted if its parent row was. If a child row clashes, the parent rows inserted for it are
+    deleted again, all inside one transaction.
+
+    This relies on a unique constraint covering the `lookup` fields (or some of them, like a SingleItem's UID). When
+    there isn't one - for instance, BulkItem's work order and SKU live in different tables, so only UniqueTogetherMixin
+    checks them - a transaction-level advisory lock on the lookup values is taken instead (see lock_lookups()), and
+    Django's get_or_create() is run under it.
+
+    save() isn't called, so models that fill in fields in save() should do the same in clean(), which is called
+    before inserting.
+    """
+    if not has_unique_constraint(model, lookup):
+        with transaction.atomic():
+            lock_lookups(model, [lookup])
+            return model.objects.get_or_create(**lookup, defaults=defaults or {})
+
+    obj = model(**lookup, **(defaults or {}))
+    obj.clean()
+    if hasattr(obj, "pre_save_polymorphic"):
+        obj.pre_save_polymorphic()
+
+    # Ancestors come back closest-first, so reverse them to insert from the root table down.
+    chain = [*reversed(model._meta.get_parent_list()), model]
+    quote = connection.ops.quote_name
+
+    ctes = []
+    params = []
+    for i, table_model in enumerate(chain):
+        opts = table_model._meta
+        fields = [field for field in opts.local_concrete_fields if field is not opts.auto_field]
+        parent_link = opts.parents.get(chain[i - 1]) if i > 0 else None
+
+        values = []
+        for field in fields:
+            if field is parent_link:
+                values.append(F"t{i - 1}.{quote(chain[i - 1]._meta.pk.column)}")
+            else:
+                # The values are SELECTed rather than inserted with VALUES, so they need explicit types.
+                values.append(F"CAST(%s AS {field.db_type(connection)})")
+                params.append(field.get_db_prep_save(field.pre_save(obj, add=True), connection))
+
+        ctes.append(
+            F"t{i} AS (INSERT INTO {quote(opts.db_table)} ({', '.join(quote(f.column) for f in fields)}) "
+            F"SELECT {', '.join(values)}{F' FROM t{i - 1}' if i > 0 else ''} "
+            F"ON CONFLICT DO NOTHING RETURNING {quote(opts.pk.column)})"
+        )
+
+    sql = "WITH {} SELECT {}".format(
+        ", ".join(ctes),
+        ", ".join(F"(SELECT {quote(table_model._meta.pk.column)} FROM t{i})" for i, table_model in enumerate(chain)),
+    )
+
+    # Several INSERTs need a transaction, so nobody sees an orphaned parent row. Even a single one gets a savepoint,
+    # so that if it fails (a DataError, say), a surrounding transaction can carry on.
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        pks = cursor.fetchone()
+
+        if pks[-1] is not None:
+            for table_model, pk in zip(chain, pks):
+                setattr(obj, table_model._meta.pk.attname, pk)
+            obj._state.adding = False
+            obj._state.db = connection.alias
+            return obj, True
+
+        # Clean up any parent rows that were inserted before the clash, then fetch the row that's already there.
+        for table_model, pk in reversed(list(zip(chain, pks))):
+            if pk is not None:
+                table = quote(table_model._meta.db_table)
+                cursor.execute(F"DELETE FROM {table} WHERE {quote(table_model._meta.pk.column)} = %s", [pk])
+
+    try:
+        return model.objects.get(**lookup), False
+    except model.DoesNotExist:
+        raise IntegrityError(F"Couldn't create {model._meta.verbose_name} {lookup}: it clashes with an existing one")
+
+
 @contextlib.contextmanager
 def suppress_autotime(model, fields):
     _original_values = {}
@@ -1,39 +1,155 @@
 from datetime import datetime
-from random import randint
 
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
 from rest_framework.authentication import SessionAuthentication, TokenAuthentication
 from rest_framework.generics import RetrieveAPIView, CreateAPIView, UpdateAPIView, get_object_or_404
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from base_models.base_view_classes.api import GetOrCreateView, SearchView
-from ..models import Machine, Operator, Sku, UniqueID, WorkOrder, ZeroingLog, MachineUsage
+from base_models.base_view_classes.api import AsyncAPIViewMixin, GetOrCreateView, SearchView
+from ..models import BarcodeLease, Machine, Operator, Sku, UniqueID, WorkOrder, ZeroingLog, MachineUsage
+from ..uid_schemas import UID_SCHEMAS
 
 
 class CreateNewV6Barcode(APIView):
-    iteration_limit = 200
+    """
+    GET one or more new, unused V6 barcodes. Each is saved as an empty UniqueID before being returned.
+
+    Without parameters, returns {"barcode": code}. Pass a `count` query parameter (up to
+    settings.MAX_V6_BARCODE_ALLOCATION) to allocate a whole print run at once; this returns {"barcodes": [...]}.
+    """
 
     def get(self, request, *args, **kwargs):
-        for i in range(self.iteration_limit):
-            # Generate a random 9-digit number in string form, left-padded with zeros.
-            code_value = randint(0, 999999999)
-            code = str(code_value).zfill(9)
+        count = request.query_params.get("count", None)
+
+        if count is None:
+            return Response({"barcode": UniqueID.allocate_v6_barcodes(1)[0]})
+
+        try:
+            count = int(count)
+        except ValueError:
+            return Response({"error": f"Invalid barcode count {count}"}, status=400)
+        if not 1 <= count <= settings.MAX_V6_BARCODE_ALLOCATION:
+            msg = f"Barcode count must be between 1 and {settings.MAX_V6_BARCODE_ALLOCATION}"
+            return Response({"error": msg}, status=400)
+
+        return Response({"barcodes": UniqueID.allocate_v6_barcodes(count)})
+
+
+class ValidateUniqueIDs(APIView):
+    """
+    POST a list of scanned UID codes under `codes`, and get back the schemas each one matches, whether it's valid,
+    and whether it's already registered as a UniqueID. Results are returned in the same order as the input.
+
+    Designed for tray scanners, which submit a whole tray of codes at once. Every code is classified in memory, and
+    the existence check is a single query, however many codes are sent (up to settings.MAX_UID_VALIDATION_COUNT).
+    """
+
+    def post(self, request, *args, **kwargs):
+        codes = request.data.get("codes", None)
+
+        if not isinstance(codes, list) or not all(isinstance(code, str) for code in codes):
+            return Response({"error": "Expected a list of UID codes under `codes`"}, status=400)
+        if len(codes) > settings.MAX_UID_VALIDATION_COUNT:
+            msg = f"Can't validate more than {settings.MAX_UID_VALIDATION_COUNT} codes at once"
+            return Response({"error": msg}, status=400)
+
+        schemas = UID_SCHEMAS.classify(codes)
+        existing = set(UniqueID.objects.filter(code__in=set(codes)).values_list("code", flat=True))
+
+        results = []
+        for code in codes:
+            results.append({
+                "code": code,
+                "valid": bool(schemas[code]),
+                "schemas": [s.name for s in schemas[code]],
+                "exists": code in existing,
+            })
+
+        return Response(results)
+
+
+class CreateBarcodeLease(APIView):
+    """
+    POST to reserve a block of codes for a label printer, so it can keep printing offline.
+
+    Expects `machine` (hostname), `schema` ("V6_BARCODE" or "V7_SERIAL") and `count`. V7 serial leases also need a
+    `serial_date` in DDMMYY form. Returns the lease's `id`, when it `expires_at`, and the list of `codes`.
+    Printed codes must be confirmed with ConfirmLeasedBarcodes before the lease expires.
+    """
+
+    def post(self, request, *args, **kwargs):
+        machine = Machine.objects.filter(hostname=request.data.get("machine", None)).first()
+        if machine is None:
+            return Response({"error": f"Could not find machine {request.data.get('machine', None)}"}, status=400)
+
+        schema = request.data.get("schema", None)
+        if schema not in dict(BarcodeLease.LEASABLE_SCHEMAS):
+            return Response({"error": f"Can't lease codes of schema {schema}"}, status=400)
 
-            # Check if this barcode has already been used.
-            # Iterate again if so.
-            if UniqueID.objects.filter(code=code).exists():
-                continue
+        try:
+            count = int(request.data.get("count", 0))
+        except (TypeError, ValueError):
+            count = 0
+        if not 1 <= count <= settings.MAX_BARCODE_LEASE_SIZE:
+            msg = f"Lease size must be between 1 and {settings.MAX_BARCODE_LEASE_SIZE}"
+            return Response({"error": msg}, status=400)
 
-            # Otherwise, save a new empty UniqueID object to store the new barcode, and
-            # send the barcode to the user.
-            UniqueID.objects.create(code=code)
+        serial_date = request.data.get("serial_date", None)
+        if serial_date is not None:
+            try:
+                serial_date = datetime.strptime(serial_date, "%d%m%y").date()
+            except (TypeError, ValueError):
+                return Response({"error": f"Invalid serial date {serial_date}; expected DDMMYY"}, status=400)
 
-            return Response({"barcode": code})
+        BarcodeLease.reclaim_expired()
 
-        # If the loop ends, send the user a timeout error. They're welcome to try again,
-        # but this helps avoid infinite loops due to bugs or the barcode selection filling up.
-        msg = "Tried {} barcodes and couldn't find any unique ones!".format(self.iteration_limit)
-        return Response({"error": msg}, status=500)
+        try:
+            lease, codes = BarcodeLease.create_lease(
+                machine, schema, count, settings.BARCODE_LEASE_DURATION, serial_date=serial_date
+            )
+        except DjangoValidationError as e:
+            return Response({"error": e.messages}, status=400)
+
+        return Response({"id": lease.pk, "expires_at": lease.expires_at, "codes": codes}, status=201)
+
+
+class ConfirmLeasedBarcodes(APIView):
+    """
+    POST the `codes` that have been printed from a lease (given by the `pk` URL kwarg). They're saved as UniqueIDs.
+    Returns the lists of `confirmed` and `rejected` codes, or a 409 if the lease has expired or been released.
+    """
+
+    def post(self, request, pk, *args, **kwargs):
+        lease = get_object_or_404(BarcodeLease, pk=pk)
+
+        codes = request.data.get("codes", None)
+        if not isinstance(codes, list) or not all(isinstance(code, str) for code in codes):
+            return Response({"error": "Expected a list of codes under `codes`"}, status=400)
+
+        try:
+            confirmed, rejected = lease.confirm(codes)
+        except DjangoValidationError as e:
+            return Response({"error": e.messages}, status=409)
+        return Response({"confirmed": confirmed, "rejected": rejected})
+
+
+class ReleaseBarcodeLease(APIView):
+    """
+    POST to give back unused codes from a lease (given by the `pk` URL kwarg). Send a list of `codes` to release
+    just those, or nothing to release everything left and close the lease. Returns the number `released`.
+    """
+
+    def post(self, request, pk, *args, **kwargs):
+        lease = get_object_or_404(BarcodeLease, pk=pk)
+
+        codes = request.data.get("codes", None)
+        if codes is not None and (not isinstance(codes, list) or not all(isinstance(code, str) for code in codes)):
+            return Response({"error": "Expected a list of codes under `codes`"}, status=400)
+
+        return Response({"released": lease.release(codes)})
 
 
 class GetOrCreateUniqueID(GetOrCreateView):
@@ -68,9 +184,22 @@ class GetOrCreateWorkOrder(GetOrCreateView):
 
 
 class CreateZeroingLog(CreateAPIView):
+    """
+    POST a new ZeroingLog. Its resistance is also tracked on the machine's "zeroing_resistance" SPC chart, which
+    isn't specific to any SKU.
+    """
     queryset = ZeroingLog.objects.all()
     serializer_class = ZeroingLog.generate_serializer_class()
 
+    def perform_create(self, serializer):
+        # Imported here, since base_models depends on these views.
+        from base_models.models import SpcChart
+
+        with transaction.atomic():
+            super().perform_create(serializer)
+            log = serializer.instance
+            SpcChart.record_observations([(log.machine_id, None, "zeroing_resistance", log.resistance, None)])
+
 
 class SearchSku(SearchView):
     """
@@ -108,7 +237,7 @@ class SearchMachine(SearchView):
     order_results_by = ["name"]
 
 
-class MachinePing(APIView):
+class MachinePing(AsyncAPIViewMixin, APIView):
     def post(self, request, *args, **kwargs):
         hostname = request.data.get('hostname', None)
         operator_id = request.data.get('operator_id', None)
@@ -124,24 +253,28 @@ class MachinePing(APIView):
         if machine is None:
             return Response({"error": msg}, status=500)
 
-        last_login = MachineUsage.objects.filter(machine=machine).first()
-
-        # edge case log out if operator not provided
-        if logging_out:
-            if last_login is not None and last_login.logged_out_at is None:
-                return Response(last_login.log_out().to_dict())
-            return Response({"error": "Machine not logged in"}, status=400)
-
-        msg = f"Could not find machine {operator_id}"
-        if operator_id is None:
-            return Response({"error": msg}, status=500)
-        operator = Operator.objects.filter(code=operator_id).first()
-        if operator is None:
-            return Response({"error": msg}, status=500)
-
-        # if no last_login
-        if last_login is None:
-            return Response(MachineUsage.log_in(machine, operator).to_dict())
-
-        # ping machine
-        return Response(last_login.ping(operator, logging_out).to_dict())
+        # Lock the machine while its sessions are inspected and changed, so that concurrent pings and event starts
+        # from the same rig can't each decide to open a new session.
+        with transaction.atomic():
+            MachineUsage.lock_machine(machine)
+            last_login = MachineUsage.objects.filter(machine=machine).first()
+
+            # edge case log out if operator not provided
+            if logging_out:
+                if last_login is not None and last_login.logged_out_at is None:
+                    return Response(last_login.log_out().to_dict())
+                return Response({"error": "Machine not logged in"}, status=400)
+
+            msg = f"Could not find machine {operator_id}"
+            if operator_id is None:
+                return Response({"error": msg}, status=500)
+            operator = Operator.objects.filter(code=operator_id).first()
+            if operator is None:
+                return Response({"error": msg}, status=500)
+
+            # if no last_login
+            if last_login is None:
+                return Response(MachineUsage.log_in(machine, operator).to_dict())
+
+            # ping machine
+            return Response(last_login.ping(operator, logging_out).to_dict())
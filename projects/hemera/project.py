@@ -3,7 +3,7 @@ from django.urls import path
 from base_models.models import SingleItem
 from base_models.project import Project
 from . import models
-from .views.api import GetPastEvents
+from .views.api import GetPastEvents, GetPastEventsBatch
 
 
 hemera_grease_dispenser_project = Project(
@@ -13,6 +13,11 @@ hemera_grease_dispenser_project = Project(
     configuration_class=models.HemeraGreaseConfig,
     event_class=models.HemeraGreaseEvent,
     additional_api_urls=[
+        path(
+            "past_events/batch/",
+            GetPastEventsBatch.as_view(),
+            name="hemera_grease_dispenser_past_events_batch"
+        ),
         path(
             "past_events/<int:uid>/",
             GetPastEvents.as_view(),
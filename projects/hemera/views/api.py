@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
@@ -5,21 +6,39 @@ from ..models import HemeraGreaseEvent
 from base_models.models import SingleItem
 
 
+def summarise_hemera_events(uids):
+    """
+    Count each item's HemeraGreaseEvents in a single query, and return a dict of summaries keyed on UID.
+    UIDs without an item just get zero counts, and every fail state seen on any HemeraGreaseEvent is listed.
+    """
+    summaries = HemeraGreaseEvent.summarise_events(SingleItem.objects.filter(uid__in=uids), key="uid")
+    fail_states = HemeraGreaseEvent.get_fail_state_counts()
+
+    data = {}
+    for uid in uids:
+        summary = summaries.get(str(uid), {"events": 0, "completed": 0, "failed": 0, "fail_state": {}})
+        data[str(uid)] = {
+            'events': summary['events'],
+            'completed': summary['completed'],
+            'failed': summary['failed'],
+            'fail_state': {**dict.fromkeys(fail_states, 0), **summary['fail_state']},
+        }
+    return data
+
+
 class GetPastEvents(APIView):
     def get(self, request, uid, *args, **kwargs):
-        item = SingleItem.objects.filter(uid=uid).first()
-        events = HemeraGreaseEvent.objects.filter(item=item)
-        completed = events.filter(completed=True)
-        failed = events.filter(failed=True)
-
-        data = {
-            'events': events.count(),
-            'completed': completed.count(),
-            'failed': failed.count(),
-            'fail_state': {},
-        }
+        return Response(summarise_hemera_events([uid])[str(uid)])
+
+
+class GetPastEventsBatch(APIView):
+    """POST a list of `uids`, and get the same counts as GetPastEvents for each of them, keyed on UID."""
+    def post(self, request, *args, **kwargs):
+        uids = request.data.get('uids', None)
 
-        for failure in HemeraGreaseEvent.get_fail_states():
-            data['fail_state'][failure[0]] = events.filter(fail_state=failure[0]).count()
+        if not isinstance(uids, list) or not all(isinstance(uid, (int, str)) for uid in uids):
+            return Response({"error": "uids must be a list of UID codes"}, status=400)
+        if len(uids) > settings.MAX_BATCH_SIZE:
+            return Response({"error": f"Can't look up more than {settings.MAX_BATCH_SIZE} items at once"}, status=400)
 
-        return Response(data)
+        return Response(summarise_hemera_events(uids))
@@ -67,5 +67,28 @@ class V7CuringQCEvent(Event):
 
     _log_fields = ["log_temperatures"]
 
+    _spc_metrics = {
+        **Event._spc_metrics,
+        "successful_thermal_cycles": "successful_thermal_cycles",
+        "heatup_time": "get_heatup_time",
+    }
+
+    # The fraction of the peak logged temperature that counts as heated up.
+    _heatup_fraction = 0.95
+
     def __str__(self):
         return F"V7 post-curing QC result from {self.date_created}"
+
+    def get_heatup_time(self):
+        """
+        Return how many seconds the heater took to first reach 95% of the peak temperature in its log, or None if
+        thermal cycling wasn't tested or nothing was logged.
+        """
+        if not self.tested_thermal_cycling or not self.log_temperatures:
+            return None
+
+        threshold = self._heatup_fraction * max(self.log_temperatures)
+        for timepoint, temperature in zip(self.log_timepoints, self.log_temperatures):
+            if temperature >= threshold:
+                return timepoint - self.log_timepoints[0]
+        return None
@@ -0,0 +1,24 @@
+import os
+
+import django
+from asgiref.sync import ThreadSensitiveContext
+from django.core.handlers.asgi import ASGIHandler
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "web_interface.settings")
+# Tells settings.py to turn off persistent database connections - see the comment there.
+os.environ["DJANGO_ASGI"] = "1"
+
+
+class ThreadSensitiveASGIHandler(ASGIHandler):
+    """
+    Django 3.2's ASGI handler runs every request's synchronous code - sync views, and the parts of the middleware
+    that touch the database - in one shared thread, so a single slow view (a big CSV export, say) holds up every
+    other request until it's finished. Give each request a thread of its own instead, as later versions of Django do.
+    """
+    async def __call__(self, scope, receive, send):
+        async with ThreadSensitiveContext():
+            await super().__call__(scope, receive, send)
+
+
+django.setup(set_prefix=False)
+application = ThreadSensitiveASGIHandler()
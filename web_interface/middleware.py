@@ -0,0 +1,37 @@
+import asyncio
+
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise's middleware, but able to run without switching to a thread under ASGI.
+
+    Django has to run any synchronous-only middleware - and so everything inside it - in a thread, which would stop
+    async views running on the event loop at all. Static files are looked up in memory, so this is safe to do
+    directly in async mode.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if asyncio.iscoroutinefunction(get_response):
+            # Mark this instance as a coroutine function, the same way Django's MiddlewareMixin does.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            # Only used with DEBUG on. This can hit the disk, but that doesn't matter in development.
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
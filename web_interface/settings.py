@@ -1,4 +1,6 @@
 import os
+from importlib.util import find_spec
+from datetime import timedelta
 from dotenv import load_dotenv
 import django_heroku
 import dj_database_url
@@ -62,6 +64,20 @@ REST_FRAMEWORK = {
     ],
 }
 
+if find_spec("msgpack"):
+    # Let API clients opt in to MessagePack (see core/msgpack_api.py) when it's installed. JSON stays the default.
+    REST_FRAMEWORK["DEFAULT_PARSER_CLASSES"] = [
+        "rest_framework.parsers.JSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+        "core.msgpack_api.MessagePackParser",
+    ]
+    REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"] = [
+        "rest_framework.renderers.JSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+        "core.msgpack_api.MessagePackRenderer",
+    ]
+
 if DEBUG:
     # For local development, enable SessionAuthentication.
     # This allows users to log in (via the admin) to use the browsable API, without disabling authentication
@@ -173,8 +189,59 @@ DEBUG_PROPAGATE_EXCEPTIONS = True
 # The maximum number of Events that can be turned into a CSV - either of event data or of logs.
 MAX_CSV_EVENT_COUNT = 100000
 
+# How long a serialized Configuration stays in the cache. Entries are thrown away whenever the Configuration is
+# saved, and checked against its version on every request, so this only limits memory use.
+CONFIGURATION_CACHE_TIMEOUT = 60 * 60 * 24
+
+# How long the response to a request sent with an Idempotency-Key header is kept, so that retries of it can be
+# answered without processing the request again.
+IDEMPOTENCY_KEY_TTL = timedelta(hours=int(os.environ.get("IDEMPOTENCY_KEY_HOURS", 24)))
+
+# How long the results of an Event cube query (see base_models/views/event_cube_view.py) are cached for. Cached
+# results don't include Events written since, so this is how out of date a chart can be.
+EVENT_CUBE_CACHE_TIMEOUT = 60 * 5
+
+# How long a fail state Pareto (see GetFailStatePareto) stays in the cache. Entries are checked for newly saved Events
+# before they're served; this limits memory use, and how long a deleted Event can still be counted.
+FAIL_STATE_PARETO_CACHE_TIMEOUT = 60 * 60 * 24
+
+# The most assembly links followed when looking up an item's genealogy (see base_models/genealogy.py), to bound the
+# cost of a lookup on a huge graph - for instance, everything made from a widely-used BulkItem.
+MAX_GENEALOGY_EDGES = 10000
+
+# The largest number of objects that can be sent to a batch endpoint (e.g. a project's start/batch/) at once.
+MAX_BATCH_SIZE = 1000
+
+# The key for the permutation that turns the V6 barcode sequence into non-sequential barcodes (see core/barcodes.py).
+# This must stay the same once barcodes have been issued from it.
+V6_BARCODE_PERMUTATION_KEY = os.environ.get("V6_BARCODE_PERMUTATION_KEY", "e3d-v6-barcodes")
+
+# The largest number of barcodes that can be allocated in a single request.
+MAX_V6_BARCODE_ALLOCATION = 1000
+
+# The largest number of UID codes that can be checked in a single bulk validation request.
+MAX_UID_VALIDATION_COUNT = 10000
+
+# Barcode leases let label printers work offline. These limit the size of a single lease, and set how long
+# a lease lasts before its unused codes are reclaimed.
+MAX_BARCODE_LEASE_SIZE = 5000
+BARCODE_LEASE_DURATION = timedelta(hours=int(os.environ.get("BARCODE_LEASE_HOURS", 72)))
+
 # Activate Django-Heroku.
 django_heroku.settings(locals())
 
+# Django-Heroku adds WhiteNoise's middleware, which can only run synchronously. Swap it for a version that can also
+# run asynchronously, so that async views really are async under ASGI.
+MIDDLEWARE = [
+    "web_interface.middleware.AsyncWhiteNoiseMiddleware" if m == "whitenoise.middleware.WhiteNoiseMiddleware" else m
+    for m in MIDDLEWARE
+]
+
+if os.environ.get("DJANGO_ASGI"):
+    # Under ASGI (see web_interface/asgi.py), each request runs its database queries in a thread of its own, so
+    # persistent connections would never be reused - they'd just be left open until they timed out.
+    for database in DATABASES.values():
+        database["CONN_MAX_AGE"] = 0
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -1,5 +1,7 @@
 from django.contrib import admin
 from django.urls import path
+from base_models.views.work_order_progress_view import WorkOrderProgressView
+from base_models.views.yield_report_view import YieldReportView
 from . import views
 
 # Assign the app name for this Django app
@@ -21,4 +23,10 @@ urlpatterns = [
     # Connect the 'event/' URL followed by an integer (event_id) with the event_detail_view
     # function in views and give it a name 'event_detail_view' for easy reference
     path('event/<int:event_id>/', views.event_detail_view, name='event_detail_view'),
+
+    # Connect the 'yield/' URL with the first-pass yield report, for logged-in users
+    path('yield/', YieldReportView.as_view(), name='yield_report'),
+
+    # Connect the 'work-orders/progress/' URL with the work order progress page, for logged-in users
+    path('work-orders/progress/', WorkOrderProgressView.as_view(), name='work_order_progress'),
 ]